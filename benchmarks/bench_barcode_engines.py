@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the CodeElement barcode engines.
+
+Renders a run of serialized asset tags (ASSET-000000, ASSET-000001, ...) onto a label image with the native
+in-process engine and with treepoem/Ghostscript. The barcode cache is cleared before every run, so each code is
+generated once, as when printing a run of new tags. treepoem is skipped if Ghostscript is not installed.
+
+Run from the repository root:
+    python benchmarks/bench_barcode_engines.py [--codes 1000] [--code-type code128] [--ghostscript-workers 0]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from elements import ElementBase
+from elements.Barcode import BARCODE_CACHE
+
+
+def render_codes(engine, code_type, count):
+    im = Image.new('RGB', (800, 200), 'white')
+    for serial in range(count):
+        data = f'{serial:012d}' if code_type in ('ean13', 'upca') else f'ASSET-{serial:06d}'
+        element = {'type': 'code', 'code_type': code_type, 'engine': engine, 'data': data,
+                   'horizontal_offset': 10, 'vertical_offset': 10}
+        ElementBase.process_with_plugins(element, im, [0, 0, 0, 0], im.size, {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--codes', type=int, default=1000, help='number of different codes to render')
+    parser.add_argument('--code-type', default='code128', help='code_type of the rendered codes')
+    parser.add_argument('--ghostscript-workers', type=int, default=0,
+                        help='render treepoem codes on this many warm Ghostscript workers (0: one process per code)')
+    args = parser.parse_args()
+
+    ElementBase.configure({'BARCODE': {'GHOSTSCRIPT_WORKERS': args.ghostscript_workers}})
+    engines = ['native']
+    if shutil.which('gs'):
+        engines.append('treepoem')
+    else:
+        print('Ghostscript (gs) not found, skipping the treepoem engine')
+
+    print(f"{args.codes} {args.code_type} codes")
+    for engine in engines:
+        BARCODE_CACHE.invalidate()
+        start = time.perf_counter()
+        render_codes(engine, args.code_type, args.codes)
+        seconds = time.perf_counter() - start
+        print(f"{engine:9s} {seconds:8.2f} s total {seconds / args.codes * 1000:8.3f} ms/code")
+
+
+if __name__ == '__main__':
+    main()
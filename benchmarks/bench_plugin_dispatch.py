@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark for element plugin dispatch.
+
+Renders a template of nested passthrough/basic elements (which do no drawing) so the time measured is the
+dispatch itself. Compares the type-indexed dispatch of ElementBase.process_with_plugins with the previous
+linear scan that called can_process on every plugin and created a new handler for every element.
+
+Run from the repository root:
+    python benchmarks/bench_plugin_dispatch.py [--elements 60] [--rounds 2000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from elements import ElementBase
+
+
+def linear_scan_dispatch(element, im, margins, dimensions, payload, **kwargs):
+    """The dispatch used before the type index, kept here for comparison."""
+    for handler in ElementBase.plugins:
+        if handler.can_process(element):
+            instance = handler()
+            # Recurse here rather than in the passthrough plugin, which would use the new dispatch for its children
+            if element.get('type') == 'passthrough':
+                for sub_element in element.get('elements', []):
+                    linear_scan_dispatch(sub_element, im, margins, dimensions, payload, **kwargs)
+            else:
+                instance.process_element(element, im, margins, dimensions, payload, **kwargs)
+
+
+def build_template(element_count, fan_out=4):
+    """Build a tree of passthrough containers with basic leaves containing element_count elements in total."""
+    count = 0
+
+    def build(depth):
+        nonlocal count
+        count += 1
+        if depth == 0 or count >= element_count:
+            return {'type': 'basic'}
+        children = []
+        for _ in range(fan_out):
+            if count >= element_count:
+                break
+            children.append(build(depth - 1))
+        return {'type': 'passthrough', 'elements': children}
+
+    elements = []
+    while count < element_count:
+        elements.append(build(3))
+    return ElementBase.compile_template({'elements': elements}), count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--elements', type=int, default=60, help='number of (nested) elements in the template')
+    parser.add_argument('--rounds', type=int, default=2000, help='number of renders per measurement')
+    args = parser.parse_args()
+
+    template, count = build_template(args.elements)
+    im = Image.new('RGB', (1, 1))
+    margins = [0, 0, 0, 0]
+
+    def render(dispatch):
+        for element in template['elements']:
+            dispatch(element, im, margins, (1, 1), {})
+
+    print(f"{len(ElementBase.plugins)} plugins registered, template with {count} nested elements")
+    for name, dispatch in (('linear scan', linear_scan_dispatch), ('type index', ElementBase.process_with_plugins)):
+        seconds = min(timeit.repeat(lambda: render(dispatch), number=args.rounds, repeat=3))
+        per_render = seconds / args.rounds * 1e6
+        print(f"{name:12s} {per_render:8.1f} us/render  {per_render / count * 1000:8.1f} ns/element")
+
+
+if __name__ == '__main__':
+    main()
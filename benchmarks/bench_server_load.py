@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Load test for the threaded server backend.
+
+Serves a stand-in for a label preview (waits --io-ms like a Grocy request or a Ghostscript barcode would, then
+renders and PNG-encodes a label image) from ThreadPoolWSGIServer with an increasing number of worker threads,
+and reports the throughput of --clients concurrent clients. With 1 thread this matches the single-threaded
+wsgiref server.
+
+To load test a running instance instead, pass the URL of a preview:
+    python benchmarks/bench_server_load.py --url "http://localhost:8013/api/preview/text?text=Test"
+
+Run from the repository root:
+    python benchmarks/bench_server_load.py [--threads 1 2 4 8] [--clients 16] [--requests 200] [--io-ms 20]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from server_helpers import ThreadPoolWSGIServer
+
+
+def preview_app(io_seconds):
+    def app(environ, start_response):
+        time.sleep(io_seconds)
+        im = Image.new('RGB', (696, 271), 'white')
+        ImageDraw.Draw(im).text((20, 20), 'Load test', fill='black')
+        buffer = BytesIO()
+        im.save(buffer, format='PNG')
+        start_response('200 OK', [('Content-Type', 'image/png')])
+        return [buffer.getvalue()]
+    return app
+
+
+def load(url, clients, requests):
+    """Fetch url requests times from clients concurrent clients and return the requests per second."""
+    def fetch(_):
+        with urllib.request.urlopen(url, timeout=60) as reply:
+            reply.read()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(fetch, range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help='worker thread counts to test')
+    parser.add_argument('--clients', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='number of requests per measurement')
+    parser.add_argument('--io-ms', type=float, default=20, help='simulated I/O wait per preview in milliseconds')
+    parser.add_argument('--url', help='load test a running server at this URL instead')
+    args = parser.parse_args()
+
+    if args.url:
+        print(f"{load(args.url, args.clients, args.requests):8.1f} req/s  {args.url}")
+        return
+
+    baseline = None
+    for threads in args.threads:
+        server = ThreadPoolWSGIServer(('127.0.0.1', 0), preview_app(args.io_ms / 1000), threads=threads)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        try:
+            rate = load(f'http://127.0.0.1:{server.server_port}/', args.clients, args.requests)
+        finally:
+            server.shutdown()
+            server.server_close()
+        baseline = baseline or rate
+        print(f"{threads:3d} threads {rate:8.1f} req/s  {rate / baseline:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
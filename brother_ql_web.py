@@ -4,23 +4,37 @@
 """
 This is a web service to print labels on label printers via CUPS.
 """
+import base64
 import copy
+import csv
+import io
 import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 import sys, logging, random, json, argparse, requests, yaml
 from io import BytesIO
 
-from bottle import run, route, get, post, response, request, jinja2_view as view, static_file, redirect
-from PIL import Image, ImageDraw, ImageFont
+from bottle import default_app, route, get, post, response, request, jinja2_view as view, static_file, redirect
+from PIL import Image, ImageDraw
 
 import glob
 import os
+import threading
 
 from elements import ElementBase
 
 from implementation_cups import implementation
 
-from font_helpers import get_fonts
+from font_helpers import SYSTEM_FONT_DIRS, FontWatcher, apply_font_changes, configure_font_index, get_fonts, get_font
+
+from cache_helpers import LRUCache, cache_stats, configure_caches
+
+from server_helpers import get_server_settings, run_server
+
+from print_jobs import PrintJobQueue, FAILED, PENDING_STATES, SUBMITTED
+
+from implementation_cups import CONNECTION_POOL
 
 from configuration_management import (
     label_sizes_list_to_dict,
@@ -94,6 +108,32 @@ except Exception as e:
 PRINTERS = None
 LABEL_SIZES = None
 FONTS = {}  # Will be populated during initialization
+# Serializes changes to CONFIG, FONTS and the printer settings when requests are handled concurrently.
+# Readers do not take the lock: FONTS is only ever replaced by a fully built dict, never modified in place.
+SETTINGS_LOCK = threading.RLock()
+# Font folders watched for changes besides SERVER.ADDITIONAL_FONT_FOLDER, e.g. the --font-folder argument
+FONT_FOLDERS = []
+# Longest time a font reload request with ?wait= blocks until the font folders were scanned
+MAX_FONT_RELOAD_WAIT = 30
+
+TEMPLATE_FOLDER = '/appconfig'
+# Parsed templates keyed by (path, mtime, size) so an edited file is parsed again
+TEMPLATE_CACHE = LRUCache('templates', maxsize=64)
+# Remember which parser succeeded for each template path, so YAML files skip the JSON attempt
+TEMPLATE_FORMATS = {}
+# Printer/label size combinations resolved to dimensions, kind, DPI and fill color, see get_media_profile()
+MEDIA_PROFILES = LRUCache('media_profiles', maxsize=64)
+# Rendering and submission of print jobs, see print_jobs.py
+PRINT_JOBS = PrintJobQueue()
+# Longest time a print request with ?wait= blocks until its job was submitted
+MAX_PRINT_WAIT = 60
+# Largest number of labels accepted by one batch print request
+MAX_BATCH_ITEMS = 1000
+# Labels rendered at the same time by a streaming batch preview, unless SERVER.PREVIEW_WORKERS is set
+DEFAULT_PREVIEW_WORKERS = 4
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+# Key under which get_label_context() keeps its result in the WSGI environ of the current request
+LABEL_CONTEXT_ENVIRON_KEY = 'label_web.label_context'
 
 
 # the decorator
@@ -116,8 +156,10 @@ def save_config_with_global_update(new_config):
     """Save configuration to file and update global CONFIG."""
     global CONFIG
     if save_config(new_config):
-        CONFIG.clear()
+        # Update in place without clearing first, so concurrent requests never see an empty CONFIG
         CONFIG.update(new_config)
+        for section in [section for section in CONFIG if section not in new_config]:
+            del CONFIG[section]
         return True
     return False
 
@@ -252,6 +294,9 @@ def printtemplate(templatefile):
     return_dict = {'Success': False}
 
     template_data = get_template_data(templatefile)
+    if not template_data:
+        response.status = 404
+        return {'success': False, 'error': 'Template not found'}
 
     try:
         context = get_label_context(request)
@@ -264,11 +309,154 @@ def printtemplate(templatefile):
     except json.JSONDecodeError as e:
         payload = {}
 
-    im = create_label_from_template(template_data, payload, **context)
-    if DEBUG:
-        im.save('sample-out.png')
+    def render():
+        im = create_label_from_template(template_data, payload, **context)
+        if DEBUG:
+            im.save('sample-out.png')
+        return im
+
+    return enqueue_print_job(render, context)
+
 
-    return instance.print_label(im, **context)
+def finish_print_jobs(timeout):
+    """Stop accepting print jobs and give the queued ones up to timeout seconds to be sent to CUPS."""
+    if not PRINT_JOBS.close(timeout):
+        logger.warning(f"{PRINT_JOBS.pending()} print jobs were not sent to the printer before shutting down")
+
+
+def enqueue_print_job(render, context):
+    """
+    Queue a print job for the label returned by render() and report its state.
+
+    The response is sent as soon as the job is queued, unless the request has a wait parameter: then it waits up to
+    that many seconds (at most MAX_PRINT_WAIT) for the job to be submitted to CUPS or fail. success is only true once
+    the job was submitted; a job that is still pending is answered with status 202.
+    """
+    job = PRINT_JOBS.submit(render, lambda im: instance.print_label(im, **context),
+                            printer=context.get('printer'), label_size=context.get('label_size'),
+                            quantity=context.get('quantity', 1))
+    try:
+        wait_seconds = min(float(request.query.get('wait', 0)), MAX_PRINT_WAIT)
+    except ValueError:
+        wait_seconds = 0
+    if wait_seconds > 0:
+        job.wait(wait_seconds)
+
+    result = job.as_dict()
+    result['success'] = job.state == SUBMITTED
+    result['status_url'] = f'/api/jobs/{job.id}'
+    if job.state == FAILED:
+        result['message'] = job.error
+    response.status = 202 if job.state in PENDING_STATES else 200
+    return result
+
+
+def parse_batch_payloads(body, content_type):
+    """
+    Return the payloads of a batch request body.
+
+    The body is CSV with a header row (text/csv), NDJSON with one JSON payload per line (application/x-ndjson) or
+    otherwise a JSON array. Raises ValueError if the body cannot be parsed.
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    text = body.decode('utf-8-sig')
+    if content_type == 'text/csv':
+        try:
+            return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+        except csv.Error as e:
+            raise ValueError(f'Invalid CSV: {e}')
+    if content_type in NDJSON_CONTENT_TYPES:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    payloads = json.loads(text)
+    if not isinstance(payloads, list):
+        raise ValueError('Expected a JSON array of payloads')
+    return payloads
+
+
+def get_payload_quantity(payload, default):
+    """Return the number of copies for a batch payload: its quantity field, or default."""
+    quantity = payload.get('quantity', default) if isinstance(payload, dict) else default
+    # CSV values and query parameters are strings
+    quantity = int(quantity)
+    if quantity < 1:
+        raise ValueError(f'Invalid quantity {quantity}')
+    return quantity
+
+
+@route('/api/print/template/<templatefile>/batch', method=['POST', 'OPTIONS'])
+@enable_cors
+def printtemplate_batch(templatefile):
+    """
+    Print a label for every payload in the request body with one template.
+
+    The body is a JSON array, NDJSON or CSV (see parse_batch_payloads); the query parameters are those of
+    /api/print/template/<templatefile>. Every label is printed quantity times (from the payload, or the quantity
+    query parameter), reusing the rendered image. The labels are sent as one CUPS job with a document per label, or
+    a few jobs for large batches. Returns a result per payload.
+    """
+    template_data = get_template_data(templatefile)
+    if not template_data:
+        response.status = 404
+        return {'success': False, 'error': 'Template not found'}
+
+    try:
+        context = get_label_context(request)
+        payloads = parse_batch_payloads(request.body.read(), request.content_type)
+    except (LookupError, ValueError) as e:
+        response.status = 400
+        return {'success': False, 'error': str(e)}
+    if not payloads:
+        response.status = 400
+        return {'success': False, 'error': 'The batch contains no labels'}
+    if len(payloads) > MAX_BATCH_ITEMS:
+        response.status = 413
+        return {'success': False, 'error': f'A batch may contain at most {MAX_BATCH_ITEMS} labels'}
+
+    items = []
+    labels = []
+    rendered_items = []
+    for index, payload in enumerate(payloads):
+        item = {'index': index, 'success': False}
+        items.append(item)
+        try:
+            copies = get_payload_quantity(payload, context.get('quantity', 1))
+            im = create_label_from_template(template_data, payload, **context)
+        except Exception as e:
+            item['error'] = str(e)
+            continue
+        item['copies'] = copies
+        # Keep the encoded label rather than the image, so large batches do not hold every bitmap in memory
+        labels.append((image_to_png_bytes(im), copies))
+        rendered_items.append(item)
+
+    if labels:
+        for item, result in zip(rendered_items, instance.print_labels(labels, **context)):
+            item['success'] = result['success']
+            if result['success']:
+                item['cups_job_id'] = result['job_id']
+            else:
+                item['error'] = result['message']
+
+    printed = [item for item in items if item['success']]
+    return {
+        'success': len(printed) == len(items),
+        'printed': len(printed),
+        'failed': len(items) - len(printed),
+        'jobs': list(dict.fromkeys(item['cups_job_id'] for item in printed)),
+        'items': items,
+    }
+
+
+@route('/api/jobs/<job_id>', method=['GET', 'OPTIONS'])
+@enable_cors
+def get_print_job(job_id):
+    """Report the state of a print job, including the state of its CUPS job once it was submitted."""
+    job = PRINT_JOBS.get(job_id)
+    if job is None:
+        response.status = 404
+        return {'success': False, 'error': f'Unknown print job {job_id}'}
+    job.refresh_cups_state(instance.get_job_state)
+    return job.as_dict()
 
 @route('/health', method=['GET', 'POST'])
 @enable_cors
@@ -280,6 +468,13 @@ def health():
         response.status = '500 Internal Server Error'
 
 
+@route('/api/metrics', method=['GET', 'OPTIONS'])
+@enable_cors
+def metrics():
+    """Report hit/miss statistics of the in-process caches and the number of print jobs waiting."""
+    return {'caches': cache_stats(), 'print_jobs': {'pending': PRINT_JOBS.pending()}}
+
+
 @route('/api/template/<templatefile>/raw', method=['GET', 'OPTIONS'])
 @enable_cors
 def get_template_raw(templatefile):
@@ -406,27 +601,42 @@ def list_templates():
         logger.error(f"Error listing templates: {e}")
         return json.dumps({'success': False, 'error': str(e)})
 
+def _parse_template_file(path):
+    """Parse a template file as JSON or YAML, trying the format that worked last time first."""
+    with open(path, 'r') as file:
+        if TEMPLATE_FORMATS.get(path) != 'yaml':
+            # Try to parse the file as JSON
+            try:
+                data = json.load(file)
+                TEMPLATE_FORMATS[path] = 'json'
+                return data
+            except json.JSONDecodeError:
+                # If JSON parsing fails, attempt YAML parsing
+                file.seek(0)  # Reset file pointer to the beginning
+        data = yaml.safe_load(file)
+        TEMPLATE_FORMATS[path] = 'yaml'
+        return data
+
+
 def get_template_data(templatefile):
     """
     Deserialize data from a template file that may contain either JSON or YAML content.
 
+    Parsed templates are compiled into read-only render plans and cached by path, modification
+    time and size, so the file is only parsed again after it changes. The same compiled plan is
+    shared by every request.
+
     Parameters:
         templatefile (str): Path to the file.
 
     Returns:
-        data (dict): Deserialized data structure.
+        data (dict): Deserialized, read-only data structure.
     """
     try:
-        with open('/appconfig/' + templatefile, 'r') as file:
-            # Try to parse the file as JSON
-            try:
-                data = json.load(file)
-                return data
-            except json.JSONDecodeError:
-                # If JSON parsing fails, attempt YAML parsing
-                file.seek(0)  # Reset file pointer to the beginning
-                data = yaml.safe_load(file)
-                return data
+        path = os.path.join(TEMPLATE_FOLDER, templatefile)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        return TEMPLATE_CACHE.get_or_create(key, lambda: ElementBase.compile_template(_parse_template_file(path)))
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
@@ -448,13 +658,53 @@ def create_label_from_template(template, payload, **kwargs):
 
     elements = template.get('elements', [])
 
+    # Start the requests of data source elements concurrently instead of one after the other while drawing
+    kwargs.update(ElementBase.start_prefetch(elements, payload, **kwargs))
+
     for element in elements:
         ElementBase.process_with_plugins(element, im, margins, dimensions, payload, **kwargs)
 
     return im
 
+def get_media_profile(printer_name, label_size):
+    """
+    Return the printer-specific properties of a label size, shared by previews and print jobs.
+
+    The profile holds the label kind, the fill color, the effective DPI and the unrotated dimensions (width >= height).
+    Profiles are cached for PRINTER.ATTRIBUTE_CACHE_TTL seconds, like the printer attributes they are derived from,
+    and dropped when the settings are saved.
+    """
+    key = (printer_name, label_size)
+    profile = MEDIA_PROFILES.get(key)
+    if profile is not None:
+        return profile
+
+    width, height = instance.get_label_dimensions(label_size, printer_name)
+    if height > width: width, height = height, width
+    profile = {
+        'label_size': label_size,
+        'kind': instance.get_label_kind(label_size, printer_name),
+        'width': width,
+        'height': height,
+        'dpi': get_effective_printer_dpi(printer_name),
+        'fill_color': (255, 0, 0) if 'red' in label_size else (0, 0, 0),
+    }
+    ttl = CONFIG.get('PRINTER', {}).get('ATTRIBUTE_CACHE_TTL', 60)
+    # A TTL of 0 disables the printer attribute cache, so the profile must not outlive the request either
+    if isinstance(ttl, (int, float)) and not isinstance(ttl, bool) and ttl > 0:
+        MEDIA_PROFILES.put(key, profile, ttl=ttl)
+    return profile
+
+
 def get_label_context(request):
-    """ might raise LookupError() """
+    """
+    might raise LookupError()
+
+    The context is computed once per request; calling this again while handling the same request returns it again.
+    """
+    context = request.environ.get(LABEL_CONTEXT_ENVIRON_KEY)
+    if context is not None:
+        return context
 
     d = request.params.decode()  # UTF-8 decoded form data
 
@@ -471,13 +721,18 @@ def get_label_context(request):
         font_family = default_fonts_cfg.get('family')
         font_style = default_fonts_cfg.get('style')
 
+    label_size = d.get('label_size')
+    if label_size is None:
+        label_size = instance.get_default_label_size(printer_name)
+    profile = get_media_profile(printer_name, label_size)
+
     context = {
         'text': d.get('text', None),
         'font_size': int(d.get('font_size', 40)),
         'font_family': font_family,
         'font_style': font_style,
-        'label_size': d.get('label_size', instance.get_default_label_size(printer_name)),
-        'kind': instance.get_label_kind(d.get('label_size', instance.get_default_label_size(printer_name)), printer_name),
+        'label_size': label_size,
+        'kind': profile['kind'],
         'margin': int(d.get('margin', 10)),
         'threshold': int(d.get('threshold', 70)),
         'align': d.get('align', 'left'),
@@ -497,7 +752,9 @@ def get_label_context(request):
     context['margin_left'] = int(context['font_size'] * context['margin_left'])
     context['margin_right'] = int(context['font_size'] * context['margin_right'])
 
-    context['fill_color'] = (255, 0, 0) if 'red' in context['label_size'] else (0, 0, 0)
+    context['fill_color'] = profile['fill_color']
+    # Kept apart from 'dpi', which callers may send with the request like any other extra parameter
+    context['media_dpi'] = profile['dpi']
 
     def get_font_path(font_family_name, font_style_name):
         try:
@@ -515,11 +772,8 @@ def get_label_context(request):
 
     context['font_path'] = get_font_path(context['font_family'], context['font_style'])
 
-    # Get label dimensions for the specific printer
-    printer_name = context.get('printer')
-    width, height = instance.get_label_dimensions(context['label_size'], printer_name)
-    #print(width, ' ', height)
-    if height > width: width, height = height, width
+    # Label dimensions for the specific printer
+    width, height = profile['width'], profile['height']
     if context['orientation'] == 'rotated': height, width = width, height
     context['width'], context['height'] = width, height
 
@@ -528,10 +782,11 @@ def get_label_context(request):
         if param_name not in context:
             context[param_name] = param_value
 
+    request.environ[LABEL_CONTEXT_ENVIRON_KEY] = context
     return context
 
 def create_label_im(text, **kwargs):
-    im_font = ImageFont.truetype(kwargs['font_path'], kwargs['font_size'])
+    im_font = get_font(kwargs['font_path'], kwargs['font_size'])
     im = Image.new('L', (20, 20), 'white')
     draw = ImageDraw.Draw(im)
     # workaround for a bug in multiline_textsize()
@@ -550,7 +805,7 @@ def create_label_im(text, **kwargs):
                                             kwargs['margin_top'] + kwargs['margin_bottom'],
                                             kwargs['align'])
     if adjusted_text_size != textsize:
-        im_font = ImageFont.truetype(kwargs['font_path'], adjusted_text_size)
+        im_font = get_font(kwargs['font_path'], adjusted_text_size)
     im = Image.new('RGB', (width, height), 'white')
     draw = ImageDraw.Draw(im)
     offset = instance.get_label_offset(width, height, textsize, **kwargs)
@@ -578,7 +833,8 @@ def get_effective_printer_dpi(printer_name=None):
 
 def set_preview_metadata_headers(context):
     """Attach preview metadata headers consumed by the UI."""
-    response.set_header('X-Label-DPI', str(get_effective_printer_dpi(context.get('printer'))))
+    dpi = context.get('media_dpi') or get_effective_printer_dpi(context.get('printer'))
+    response.set_header('X-Label-DPI', str(dpi))
     response.set_header('Access-Control-Expose-Headers', 'X-Label-DPI')
 
 @get('/api/preview/text')
@@ -620,6 +876,78 @@ def get_preview_template_image(templatefile):
         response.set_header('Content-type', 'image/png')
         return image_to_png_bytes(im)
 
+@route('/api/preview/template/<templatefile>/stream', method=['POST', 'OPTIONS'])
+@enable_cors
+def stream_preview_template_images(templatefile):
+    """
+    Render a preview for every payload in the request body and stream them back as NDJSON.
+
+    The body is a JSON array, NDJSON or CSV of payloads like for the batch print endpoint. Each line of the response
+    is sent as soon as its label is rendered, so lines arrive in the order the renders finish:
+    {"index": 0, "image": "<base64 PNG>", "width": 696, "height": 271, "render_ms": 12.3}, or
+    {"index": 1, "error": "...", "render_ms": 0.4} if the label could not be rendered.
+    """
+    template_data = get_template_data(templatefile)
+    if not template_data:
+        response.status = 404
+        return {'success': False, 'error': 'Template not found'}
+
+    try:
+        context = get_label_context(request)
+        payloads = parse_batch_payloads(request.body.read(), request.content_type)
+    except (LookupError, ValueError) as e:
+        response.status = 400
+        return {'success': False, 'error': str(e)}
+    if len(payloads) > MAX_BATCH_ITEMS:
+        response.status = 413
+        return {'success': False, 'error': f'A batch may contain at most {MAX_BATCH_ITEMS} labels'}
+
+    workers = CONFIG.get('SERVER', {}).get('PREVIEW_WORKERS', DEFAULT_PREVIEW_WORKERS)
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        workers = DEFAULT_PREVIEW_WORKERS
+    set_preview_metadata_headers(context)
+    response.set_header('Content-type', 'application/x-ndjson')
+    return stream_previews(template_data, payloads, context, workers)
+
+
+def render_preview_line(template_data, payload, context, index):
+    """Render one label of a streaming preview and return its NDJSON line."""
+    start = time.perf_counter()
+    try:
+        im = create_label_from_template(template_data, payload, **context)
+        line = {'index': index, 'image': base64.b64encode(image_to_png_bytes(im)).decode('ascii'),
+                'width': im.width, 'height': im.height}
+    except Exception as e:
+        line = {'index': index, 'error': str(e)}
+    line['render_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return json.dumps(line) + '\n'
+
+
+def stream_previews(template_data, payloads, context, workers):
+    """
+    Yield an NDJSON line per payload as the renders finish.
+
+    At most workers labels are rendered, or waiting to be sent, at a time, so memory use does not grow with the
+    size of the batch. Renders that have not started are cancelled if the client goes away.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='preview')
+    try:
+        remaining = iter(enumerate(payloads))
+        running = set()
+        while True:
+            for index, payload in remaining:
+                running.add(executor.submit(render_preview_line, template_data, payload, context, index))
+                if len(running) >= workers:
+                    break
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 @route('/api/template/<templatefile>/fields', method=['GET', 'OPTIONS'])
 @enable_cors
 def get_template_fields(templatefile):
@@ -679,10 +1007,12 @@ def print_text():
         return_dict['error'] = 'Please provide the text for the label'
         return return_dict
 
-    im = create_label_im(**context)
-    if DEBUG: im.save('sample-out.png')
+    def render():
+        im = create_label_im(**context)
+        if DEBUG: im.save('sample-out.png')
+        return im
 
-    return instance.print_label(im, **context)
+    return enqueue_print_job(render, context)
 
 
 
@@ -762,10 +1092,7 @@ def validate_settings_api():
             combined_label_sizes.update(printer_sizes)
 
         # Get fonts for validation
-        temp_fonts = get_fonts()
-        additional_folder = new_config.get('SERVER', {}).get('ADDITIONAL_FONT_FOLDER', False)
-        if additional_folder:
-            temp_fonts.update(get_fonts(additional_folder))
+        temp_fonts = load_fonts(new_config)
 
         # Run configuration validation with new_config
         validation_errors = validate_configuration(temp_fonts, combined_label_sizes, temp_printers, new_config)
@@ -815,41 +1142,47 @@ def save_settings_api():
             else:
                 merged_config[section] = values
 
-        if save_config_with_global_update(merged_config):
-            # Apply new settings at runtime and revalidate
-            global PRINTERS, LABEL_SIZES, CONFIG_ERRORS, FONTS
-            instance.CONFIG = CONFIG
-            instance.initialize(CONFIG)
-            PRINTERS = instance.get_printers()
-            default_printer = instance.selected_printer if instance.selected_printer else (PRINTERS[0] if PRINTERS else None)
-            label_sizes_list = instance.get_label_sizes(default_printer)
-            label_sizes_list = filter_label_sizes_for_printer(label_sizes_list, default_printer, CONFIG)
-            LABEL_SIZES = label_sizes_list_to_dict(label_sizes_list, logger)
-
-            # Reload fonts in case the font folder changed
-            FONTS = get_fonts()
-            additional_folder = CONFIG.get('SERVER', {}).get('ADDITIONAL_FONT_FOLDER', False)
-            if additional_folder:
-                FONTS.update(get_fonts(additional_folder))
-
-            # Re-run configuration validation
-            CONFIG_ERRORS = []
-            validation_errors = validate_configuration(FONTS, LABEL_SIZES, PRINTERS, CONFIG)
-            CONFIG_ERRORS.extend(validation_errors)
-
-            # Append initialization errors to the configuration errors
-            if instance.initialization_errors:
-                CONFIG_ERRORS.extend(instance.initialization_errors)
-
-            return {
-                'success': True,
-                'message': 'Settings saved. Some changes may require app restart.',
-                'has_errors': len(CONFIG_ERRORS) > 0,
-                'errors': CONFIG_ERRORS
-            }
-        else:
-            response.status = 500
-            return {'success': False, 'error': 'Failed to save settings'}
+        with SETTINGS_LOCK:
+            if save_config_with_global_update(merged_config):
+                # Apply new settings at runtime and revalidate
+                global PRINTERS, LABEL_SIZES, CONFIG_ERRORS, FONTS
+                instance.CONFIG = CONFIG
+                # Printer media and resolution may have changed along with the settings
+                instance.invalidate_printer_attributes()
+                MEDIA_PROFILES.invalidate()
+                instance.initialize(CONFIG)
+                configure_caches(CONFIG)
+                ElementBase.configure(CONFIG)
+                PRINT_JOBS.configure(CONFIG)
+                configure_font_index(CONFIG)
+                FONT_WATCHER.configure(CONFIG)
+                PRINTERS = instance.get_printers()
+                default_printer = instance.selected_printer if instance.selected_printer else (PRINTERS[0] if PRINTERS else None)
+                label_sizes_list = instance.get_label_sizes(default_printer)
+                label_sizes_list = filter_label_sizes_for_printer(label_sizes_list, default_printer, CONFIG)
+                LABEL_SIZES = label_sizes_list_to_dict(label_sizes_list, logger)
+
+                # Reload fonts in case the font folder changed
+                FONTS = load_fonts()
+
+                # Re-run configuration validation
+                CONFIG_ERRORS = []
+                validation_errors = validate_configuration(FONTS, LABEL_SIZES, PRINTERS, CONFIG)
+                CONFIG_ERRORS.extend(validation_errors)
+
+                # Append initialization errors to the configuration errors
+                if instance.initialization_errors:
+                    CONFIG_ERRORS.extend(instance.initialization_errors)
+
+                return {
+                    'success': True,
+                    'message': 'Settings saved. Some changes may require app restart.',
+                    'has_errors': len(CONFIG_ERRORS) > 0,
+                    'errors': CONFIG_ERRORS
+                }
+            else:
+                response.status = 500
+                return {'success': False, 'error': 'Failed to save settings'}
     except Exception as e:
         response.status = 400
         logger.error(f"Error saving settings: {e}")
@@ -970,32 +1303,70 @@ def get_settings_fonts():
         return {'success': False, 'error': str(e)}
 
 
-@route('/api/settings/fonts/reload', method=['POST', 'OPTIONS'])
-@enable_cors
-def reload_fonts_api():
-    """Reload fonts from the system."""
-    try:
-        global FONTS
+def load_fonts(config=None):
+    """Return a new FONTS dict with the fonts of the folders FONT_WATCHER watches, see get_watched_font_folders."""
+    return get_fonts(get_watched_font_folders(config))
 
-        # Reload fonts from system
-        FONTS = get_fonts()
 
-        # Also reload from additional font folder if configured
-        additional_folder = CONFIG.get('SERVER', {}).get('ADDITIONAL_FONT_FOLDER', False)
-        if additional_folder:
-            FONTS.update(get_fonts(additional_folder))
+def get_watched_font_folders(config=None):
+    """
+    Return the font folders whose changes are applied to FONTS while the server runs: the system font folders
+    followed by the additional font folders, whose fonts take precedence. config defaults to CONFIG.
+    """
+    folders = list(SYSTEM_FONT_DIRS) + FONT_FOLDERS
+    additional_folder = (CONFIG if config is None else config).get('SERVER', {}).get('ADDITIONAL_FONT_FOLDER', False)
+    if additional_folder and additional_folder not in folders:
+        folders.append(additional_folder)
+    return folders
+
+
+def apply_font_folder_changes(removed, added):
+    """Swap in a FONTS dict with the font files FONT_WATCHER found removed and added."""
+    global FONTS
+    with SETTINGS_LOCK:
+        FONTS = apply_font_changes(FONTS, removed, added)
+    logger.info(f"Fonts updated. Found {len(FONTS)} font families.")
 
-        logger.info(f"Fonts reloaded. Found {len(FONTS)} font families.")
 
-        # Return the updated fonts list
+# Applies changes of the system and additional font folders to FONTS in the background, see font_helpers.FontWatcher
+FONT_WATCHER = FontWatcher(get_watched_font_folders, apply_font_folder_changes)
+
+
+@route('/api/settings/fonts/reload', method=['POST', 'OPTIONS'])
+@enable_cors
+def reload_fonts_api():
+    """
+    Rescan the system and additional font folders in the background and return the fonts known now.
+
+    Only new, changed and removed font files are applied to FONTS, which is swapped atomically like for changes the
+    watcher finds by itself. The response is sent right away, unless the
+    request has a wait parameter: then it waits up to that many seconds (at most MAX_FONT_RELOAD_WAIT) for the
+    scan to finish and returns the updated fonts.
+    """
+    try:
+        done = FONT_WATCHER.request_scan()
+        try:
+            wait_seconds = min(float(request.query.get('wait', 0)), MAX_FONT_RELOAD_WAIT)
+        except ValueError:
+            wait_seconds = 0
+        if wait_seconds > 0:
+            done.wait(wait_seconds)
+
+        # FONTS may be replaced by the watcher at any time, so read it once
+        fonts = FONTS
         fonts_dict = {}
-        for family, styles in FONTS.items():
+        for family, styles in fonts.items():
             fonts_dict[family] = list(styles.keys())
 
+        if done.is_set():
+            message = f'Successfully reloaded {len(fonts)} font families.'
+        else:
+            message = f'Scanning font folders for changes. {len(fonts)} font families are available now.'
         return {
             'success': True,
+            'scanning': not done.is_set(),
             'fonts': fonts_dict,
-            'message': f'Successfully reloaded {len(FONTS)} font families.'
+            'message': message
         }
     except Exception as e:
         response.status = 500
@@ -1032,10 +1403,16 @@ def main():
         ADDITIONAL_FONT_FOLDER = args.font_folder
     else:
         ADDITIONAL_FONT_FOLDER = '/fonts_folder'
+    FONT_FOLDERS[:] = [ADDITIONAL_FONT_FOLDER]
 
     logging.basicConfig(level=LOGLEVEL)
     instance.logger = logger
     instance.CONFIG = CONFIG
+    configure_caches(CONFIG)
+    ElementBase.configure(CONFIG)
+    PRINT_JOBS.configure(CONFIG)
+    configure_font_index(CONFIG)
+    FONT_WATCHER.configure(CONFIG)
 
     try:
         initialization_errors = instance.initialize(CONFIG)
@@ -1063,8 +1440,7 @@ def main():
             CONFIG_ERRORS.append(error_msg)
             logger.warning(error_msg)
 
-        FONTS = get_fonts()
-        FONTS.update(get_fonts(ADDITIONAL_FONT_FOLDER))
+        FONTS = load_fonts()
 
         if not FONTS:
             error_msg = f"Not a single font was found on your system. Please install some fonts to the system or configure additional font folder ('{ADDITIONAL_FONT_FOLDER}')."
@@ -1144,7 +1520,13 @@ def main():
         if not FONTS:
             FONTS = {}
 
-    run(host=CONFIG['SERVER'].get('HOST', '0.0.0.0'), port=PORT, debug=DEBUG)
+    server_settings = get_server_settings(CONFIG)
+    # A thread started before forking would not run in the worker processes, which start their own watcher
+    if server_settings['BACKEND'] not in ('prefork', 'gunicorn'):
+        FONT_WATCHER.start()
+    # Worker processes must open their own CUPS connections instead of sharing the parent's sockets
+    run_server(default_app(), CONFIG['SERVER'].get('HOST', '0.0.0.0'), int(PORT), server_settings,
+               debug=DEBUG, after_fork=[CONNECTION_POOL.clear, FONT_WATCHER.start], on_shutdown=[finish_print_jobs])
 
 
 if __name__ == "__main__":
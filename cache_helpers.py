@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+"""
+Small in-process caching utilities shared by the web service and the element plugins.
+
+Every cache created through this module registers itself under a name so that its
+hit/miss counters can be reported by the /api/metrics endpoint.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_CACHES = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class LRUCache:
+    """
+    Thread-safe, bounded least-recently-used cache with hit/miss counters.
+
+    Args:
+        name: Name used to report the cache statistics, or None for a private cache that is not reported
+        maxsize: Maximum total size of the cache. Each entry counts as 1 unless sizeof is given.
+        ttl: Optional time-to-live in seconds; expired entries are treated as misses
+        sizeof: Optional callable returning the size of a value (e.g. its size in bytes)
+    """
+
+    def __init__(self, name, maxsize=128, ttl=None, sizeof=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._currsize = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if name is not None:
+            with _REGISTRY_LOCK:
+                _CACHES[name] = self
+
+    def _entry_size(self, value):
+        return self.sizeof(value) if self.sizeof else 1
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._currsize -= size
+
+    def get(self, key, default=None, count=True):
+        """Return the cached value for key (counting a hit), or default (counting a miss).
+
+        With count=False the lookup is not counted; the caller decides with record() whether it was a hit.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, _, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return value
+                self._remove(key)
+            if count:
+                self.misses += 1
+            return default
+
+    def record(self, hit):
+        """Count a lookup made with get(..., count=False) as a hit or a miss."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, value, ttl=None):
+        """Store value under key, evicting least recently used entries as needed."""
+        size = self._entry_size(value)
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.maxsize <= 0 or size > self.maxsize:
+                return value
+            self._data[key] = (value, size, expires)
+            self._currsize += size
+            while self._currsize > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key, factory):
+        """Return the cached value for key, calling factory() and caching its result on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, factory())
+        return value
+
+    def invalidate(self, key=None):
+        """Drop a single key, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+                self._currsize = 0
+            elif key in self._data:
+                self._remove(key)
+
+    def resize(self, maxsize):
+        """Change the capacity of the cache, evicting entries if it shrank."""
+        with self._lock:
+            self.maxsize = maxsize
+            while self._data and self._currsize > max(maxsize, 0):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._data),
+                'size': self._currsize,
+                'maxsize': self.maxsize,
+            }
+
+
+def configure_caches(config):
+    """
+    Apply cache capacities from the CACHE section of the configuration.
+
+    Each registered cache is resized if the section contains its upper-cased name, e.g.
+    {"CACHE": {"FONTS": 64, "TEMPLATES": 32}}.
+    """
+    settings = (config or {}).get('CACHE') or {}
+    with _REGISTRY_LOCK:
+        caches = list(_CACHES.items())
+    for name, cache in caches:
+        size = settings.get(name.upper())
+        if isinstance(size, int) and not isinstance(size, bool) and size >= 0:
+            cache.resize(size)
+        elif size is not None:
+            logger.warning(f"Ignoring invalid size {size!r} for cache '{name}'")
+
+
+def get_cache(name):
+    """Return the registered cache with the given name, or None."""
+    with _REGISTRY_LOCK:
+        return _CACHES.get(name)
+
+
+def cache_stats():
+    """Return a dict of cache name -> statistics for every registered cache."""
+    with _REGISTRY_LOCK:
+        caches = list(_CACHES.items())
+    return {name: cache.stats() for name, cache in caches}
@@ -0,0 +1,83 @@
+"""
+Content-addressed cache for rendered barcode images.
+
+Generating a barcode with treepoem runs Ghostscript, which is by far the slowest part of rendering a label.
+Rendered barcodes are kept in an in-memory LRU cache and, if CACHE.BARCODE_CACHE_DIR is configured, as PNG
+files in that directory so they survive restarts and can be shared between worker processes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from PIL import Image
+
+import elements
+from cache_helpers import LRUCache
+
+logger = logging.getLogger(__name__)
+
+BARCODE_CACHE = LRUCache('barcodes', maxsize=256)
+# DataMatrix symbols, keyed by (data, symbol size, img_size), as L mode images at their final size
+DATAMATRIX_CACHE = LRUCache('datamatrix', maxsize=256)
+
+
+def barcode_cache_key(code_type, data, options, img_size):
+    """Return a stable digest identifying a barcode rendering."""
+    payload = json.dumps([str(code_type), str(data), options or {}, img_size], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_cache_dir():
+    """Return the configured on-disk barcode cache directory, or None if the disk tier is disabled."""
+    return (elements.ElementBase.config.get('CACHE') or {}).get('BARCODE_CACHE_DIR')
+
+
+def _load_from_disk(cache_dir, key):
+    path = os.path.join(cache_dir, key + '.png')
+    try:
+        with Image.open(path) as cached:
+            return cached.convert('RGB')
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        logger.warning(f"Ignoring unreadable barcode cache file {path}: {exc}")
+        return None
+
+
+def _save_to_disk(cache_dir, key, image):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial PNG
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                image.save(fh, format='PNG')
+            os.replace(tmp_path, os.path.join(cache_dir, key + '.png'))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as exc:
+        logger.warning(f"Could not write barcode cache file to {cache_dir}: {exc}")
+
+
+def get_barcode(code_type, data, options, img_size, render):
+    """
+    Return the barcode image for the given parameters, calling render() only if it is in neither cache tier.
+
+    The returned image is shared between callers and must not be modified.
+    """
+    key = barcode_cache_key(code_type, data, options, img_size)
+    image = BARCODE_CACHE.get(key)
+    if image is not None:
+        return image
+
+    cache_dir = get_cache_dir()
+    image = _load_from_disk(cache_dir, key) if cache_dir else None
+    if image is None:
+        image = render()
+        if cache_dir:
+            _save_to_disk(cache_dir, key, image)
+    return BARCODE_CACHE.put(key, image)
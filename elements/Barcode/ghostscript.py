@@ -0,0 +1,361 @@
+"""
+Pool of long-lived Ghostscript processes with BWIPP preloaded.
+
+treepoem.generate_barcode starts two Ghostscript processes for every barcode and makes each of them parse the
+whole BWIPP library again. A worker of this pool keeps two interpreters running instead (one on the bbox device
+to measure the symbol, one on the png16m device to rasterize it), loads BWIPP into them once and then feeds them
+one job at a time over stdin. Each job is wrapped in save/restore so jobs cannot affect each other, and ends by
+writing a marker to stderr so the worker knows when the interpreter is done.
+
+The output is the same as that of treepoem.generate_barcode; the PostScript is built from treepoem's own helpers.
+Workers that crash, time out or have served max_jobs jobs are replaced by fresh ones.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import selectors
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from textwrap import indent
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DONE_MARKER = 'LABEL_WEB_JOB_DONE'
+PAGE_OFFSET = 3000
+
+# Ends every job: print the marker on stderr and flush it so the worker can stop reading
+_END_OF_JOB = f"""
+(%stderr) (w) file dup (\\n{DONE_MARKER}\\n) writestring flushfile
+"""
+
+BBOX_JOB_TEMPLATE = """\
+save
+erasepage
+/Helvetica findfont 10 scalefont setfont
+{{
+  0 0 moveto
+  {data_options_encoder}
+  /uk.co.terryburton.bwipp findresource exec
+  showpage
+}} stopped {{
+  (%stderr) (w) file
+  dup (\\nBWIPP ERROR: ) writestring
+  dup $error /errorname get dup length string cvs writestring
+  dup ( ) writestring
+  dup $error /errorinfo get dup length string cvs writestring
+  dup (\\n) writestring
+  flushfile
+}} if
+clear cleardictstack
+restore
+"""
+
+RENDER_JOB_TEMPLATE = """\
+save
+{{
+  << /PageSize [{width} {height}] >> setpagedevice
+  /Helvetica findfont 10 scalefont setfont
+  {translate_x} {translate_y} moveto
+  {data_options_encoder} /uk.co.terryburton.bwipp findresource exec
+  showpage
+}} stopped pop
+clear cleardictstack
+restore
+"""
+
+
+# Seconds before starting a worker is tried again after it failed, doubled with every further failure
+START_RETRY_DELAY = 1
+MAX_START_RETRY_DELAY = 300
+
+
+class GhostscriptError(RuntimeError):
+    """Raised when a worker process fails; the worker is discarded and the job may be retried elsewhere."""
+
+
+class PoolUnavailableError(GhostscriptError):
+    """Raised instead of starting a worker while the pool waits to retry after workers failed to start."""
+
+
+def _spawn(args):
+    # stdout is not used: the bbox device reports on stderr and the png16m device writes files
+    return subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+class GhostscriptWorker:
+    """
+    A pair of persistent Ghostscript interpreters with BWIPP loaded.
+
+    Args:
+        scale: Raster scale, as in treepoem.generate_barcode (scale 2 renders at 144 dpi)
+        timeout: Seconds to wait for a job before the worker is considered hung
+    """
+
+    def __init__(self, scale=2, timeout=10):
+        import treepoem
+
+        self.scale = scale
+        self.timeout = timeout
+        self.jobs = 0
+        self._bbox = self._render = None
+        self._tmpdir = tempfile.mkdtemp(prefix='label_web_gs_')
+        try:
+            # Private treepoem helpers (see the version pinned in requirements.txt). If a treepoem release changes
+            # them, starting the worker fails with a GhostscriptError and barcodes fall back to treepoem itself.
+            self._format_data_options_encoder = treepoem._format_data_options_encoder
+            common = [treepoem._ghostscript_binary(), '-dSAFER', '-dQUIET', '-dNOPAUSE', '-dNOPROMPT']
+            self._bbox = _spawn(common + [
+                '-sDEVICE=bbox',
+                '-c', f'<</PageOffset [{PAGE_OFFSET} {PAGE_OFFSET}]>> setpagedevice',
+                '-f', '-',
+            ])
+            self._render = _spawn(common + [
+                '-sDEVICE=png16m',
+                f'-r{72 * scale}',
+                '-dTextAlphaBits=4',
+                '-dGraphicsAlphaBits=1',
+                '-sOutputFile=' + os.path.join(self._tmpdir, '%d.png'),
+                '-',
+            ])
+            bwipp = treepoem.load_bwipp()
+            for process in (self._bbox, self._render):
+                self._run(process, bwipp)
+        except Exception as exc:
+            self.close()
+            if isinstance(exc, GhostscriptError):
+                raise
+            raise GhostscriptError(f'Could not start Ghostscript worker: {exc!r}') from exc
+
+    def _run(self, process, code):
+        """Send code to an interpreter and return what it wrote to stderr up to the end-of-job marker."""
+        try:
+            process.stdin.write((code + _END_OF_JOB).encode('utf-8'))
+            process.stdin.flush()
+        except (BrokenPipeError, OSError) as exc:
+            raise GhostscriptError(f'Ghostscript worker is gone: {exc}') from exc
+
+        output = b''
+        deadline = time.monotonic() + self.timeout
+        fd = process.stderr.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while f'\n{DONE_MARKER}\n'.encode() not in output:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    raise GhostscriptError(f'Ghostscript worker did not answer within {self.timeout}s')
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise GhostscriptError(f'Ghostscript worker exited with code {process.poll()}')
+                output += chunk
+        return output.decode('utf-8', 'replace').split(f'\n{DONE_MARKER}\n', 1)[0]
+
+    def generate_barcode(self, barcode_type, data, options=None):
+        """Render a barcode like treepoem.generate_barcode, raising treepoem.TreepoemError for BWIPP errors."""
+        import treepoem
+
+        if barcode_type not in treepoem.barcode_types:
+            raise NotImplementedError(f"unsupported barcode type {barcode_type!r}")
+        data_options_encoder = self._format_data_options_encoder(data, options or {}, barcode_type)
+        self.jobs += 1
+
+        err_output = self._run(self._bbox, BBOX_JOB_TEMPLATE.format(
+            data_options_encoder=indent(data_options_encoder, '  '))).strip()
+        if 'BWIPP ERROR:' in err_output:
+            raise treepoem.TreepoemError(err_output.split('BWIPP ERROR: ', 1)[-1].strip())
+        bbx1, bby1, bbx2, bby2 = parse_hires_bbox(err_output)
+
+        self._run(self._render, RENDER_JOB_TEMPLATE.format(
+            width=bbx2 - bbx1,
+            height=bby2 - bby1,
+            translate_x=PAGE_OFFSET - bbx1,
+            translate_y=PAGE_OFFSET - bby1,
+            data_options_encoder=indent(data_options_encoder, '  '),
+        ))
+        # The page number in the file name keeps counting up, the directory only ever holds the latest page
+        pages = [os.path.join(self._tmpdir, name) for name in os.listdir(self._tmpdir)]
+        try:
+            if len(pages) != 1:
+                raise GhostscriptError(f'Ghostscript worker produced {len(pages)} pages instead of one')
+            with Image.open(pages[0]) as barcode:
+                barcode.load()
+        except OSError as exc:
+            raise GhostscriptError(f'Ghostscript worker produced no image: {exc}') from exc
+        finally:
+            for path in pages:
+                os.unlink(path)
+        return barcode
+
+    def close(self):
+        for process in (self._bbox, self._render):
+            if process is None:
+                continue
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            process.stderr.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+def parse_hires_bbox(err_output):
+    """Return the (x1, y1, x2, y2) HiResBoundingBox reported by the bbox device."""
+    for line in err_output.splitlines():
+        if line.startswith('%%HiResBoundingBox: '):
+            numbers = line[len('%%HiResBoundingBox: '):].split()
+            if len(numbers) == 4:
+                return tuple(float(n) for n in numbers)
+    raise GhostscriptError(f'Ghostscript did not report a bounding box: {err_output!r}')
+
+
+class GhostscriptPool:
+    """
+    Fixed-size pool of GhostscriptWorkers, safe to use from several threads.
+
+    Workers are started lazily. A worker that fails is closed and its slot is refilled on the next job. If a worker
+    cannot be started, e.g. because Ghostscript is missing, no worker is started for START_RETRY_DELAY seconds,
+    doubling up to MAX_START_RETRY_DELAY with every further failure; jobs raise PoolUnavailableError meanwhile.
+
+    Args:
+        size: Number of workers, i.e. barcodes that can be rendered concurrently
+        timeout: Seconds a single job may take before its worker is recycled
+        max_jobs: Number of jobs after which a worker is replaced, to bound interpreter memory growth
+        worker_factory: Callable creating a worker, GhostscriptWorker by default
+    """
+
+    def __init__(self, size, timeout=10, max_jobs=500, worker_factory=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.worker_factory = worker_factory or (lambda: GhostscriptWorker(timeout=timeout))
+        self.recycled = 0
+        self.start_failures = 0
+        self._retry_at = 0
+        self._start_lock = threading.Lock()
+        # LIFO, so the most recently used (warm) worker is picked before an idle slot starts a new one
+        self._slots = queue.LifoQueue()
+        self._closed = False
+        for _ in range(size):
+            self._slots.put(None)
+
+    def generate_barcode(self, barcode_type, data, options=None):
+        """Render a barcode on the next free worker, blocking while all workers are busy."""
+        worker = self._slots.get()
+        try:
+            if worker is not None and worker.jobs >= self.max_jobs:
+                self._discard(worker)
+                worker = None
+            if worker is None:
+                worker = self._start_worker()
+            return worker.generate_barcode(barcode_type, data, options)
+        except GhostscriptError:
+            if worker is not None:
+                self._discard(worker)
+                worker = None
+            raise
+        finally:
+            # Errors in the data (e.g. BWIPP errors) leave the worker in a usable state
+            if self._closed and worker is not None:
+                worker.close()
+                worker = None
+            self._slots.put(worker)
+
+    def _start_worker(self):
+        with self._start_lock:
+            if time.monotonic() < self._retry_at:
+                raise PoolUnavailableError(f'Ghostscript workers failed to start {self.start_failures} times, '
+                                           f'not retrying yet')
+        try:
+            worker = self.worker_factory()
+        except GhostscriptError:
+            with self._start_lock:
+                self.start_failures += 1
+                delay = min(START_RETRY_DELAY * 2 ** (self.start_failures - 1), MAX_START_RETRY_DELAY)
+                self._retry_at = time.monotonic() + delay
+            raise
+        with self._start_lock:
+            self.start_failures = 0
+            self._retry_at = 0
+        return worker
+
+    def _discard(self, worker):
+        self.recycled += 1
+        if worker is not None:
+            try:
+                worker.close()
+            except Exception:
+                logger.exception('Error while closing Ghostscript worker')
+
+    def close(self):
+        """Stop all idle workers; workers busy with a job are stopped when they are returned."""
+        self._closed = True
+        idle = []
+        while True:
+            try:
+                idle.append(self._slots.get_nowait())
+            except queue.Empty:
+                break
+        for worker in idle:
+            if worker is not None:
+                worker.close()
+            self._slots.put(None)
+
+
+_POOL = None
+_POOL_SETTINGS = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool(config):
+    """
+    Return the shared pool for the BARCODE section of config, or None if the pool is disabled.
+
+    The pool is rebuilt when GHOSTSCRIPT_WORKERS or GHOSTSCRIPT_TIMEOUT change.
+    """
+    global _POOL, _POOL_SETTINGS
+    settings = (config or {}).get('BARCODE') or {}
+    key = (settings.get('GHOSTSCRIPT_WORKERS', 0), settings.get('GHOSTSCRIPT_TIMEOUT', 10))
+    with _POOL_LOCK:
+        if key != _POOL_SETTINGS:
+            if _POOL is not None:
+                _POOL.close()
+            size, timeout = key
+            _POOL = GhostscriptPool(size, timeout=timeout) if isinstance(size, int) and size > 0 else None
+            _POOL_SETTINGS = key
+        return _POOL
+
+
+@atexit.register
+def _close_pool():
+    if _POOL is not None:
+        _POOL.close()
+
+
+def generate_barcode(barcode_type, data, options=None, config=None):
+    """
+    Render a barcode on the warm worker pool if it is enabled, otherwise (or if a worker fails) with treepoem.
+    """
+    import treepoem
+
+    pool = get_pool(config)
+    if pool is not None:
+        try:
+            return pool.generate_barcode(barcode_type, data, options)
+        except PoolUnavailableError as exc:
+            logger.debug(f'{exc}, using treepoem')
+        except GhostscriptError as exc:
+            # Also raised if a worker cannot be started, e.g. Ghostscript is not installed; treepoem reports this
+            # with a clear message
+            logger.warning(f'Ghostscript worker failed, falling back to treepoem: {exc}')
+    return treepoem.generate_barcode(barcode_type=barcode_type, data=data, options=options)
@@ -3,13 +3,11 @@ import elements
 
 class BasicElement(elements.ElementBase):
 
+    element_type = 'basic'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'basic'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         # Do Stuff here to add visual elements to the im object
 
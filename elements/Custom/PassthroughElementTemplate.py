@@ -3,13 +3,11 @@ import elements
 
 class PassthroughElement(elements.ElementBase):
 
+    element_type = 'passthrough'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'passthrough'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         # Do some sort of transformation on the elements object
 
@@ -23,13 +21,15 @@ class PassthroughElement(elements.ElementBase):
         # return updated image object
         return im
 
+    def get_prefetches(self, element, payload, **kwargs):
+        # The sub-elements are processed unchanged, so they make the same requests
+        return self.collect_prefetches(element.get('elements', []), payload, **kwargs)
+
     def get_form_elements(self, element):
         form_elements = []
         sub_elements = element.get('elements', [])
         for sub_element in sub_elements:
-            for plugin in elements.ElementBase.plugins:
-                if plugin.can_process(sub_element):
-                    if hasattr(plugin, 'get_form_elements'):
-                        form_elements.extend(plugin.get_form_elements(sub_element))
-                    break
+            sub_form_elements = self.get_form_elements_with_plugins(sub_element)
+            if sub_form_elements is not None:
+                form_elements.extend(sub_form_elements)
         return form_elements
@@ -3,21 +3,19 @@ import elements
 
 class DataDictItemElement(elements.ElementBase):
 
+    element_type = 'data_dict_item'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'data_dict_item'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         data = element.get('data')
         key = element.get('key')
         sub_elements = element.get('elements', [])
 
-        if type(data) is dict and key in data:
+        if isinstance(data, dict) and key in data:
             for sub_element in sub_elements:
-                sub_element['data'] = data[key]
+                sub_element = self.derive_element(sub_element, data=data[key])
                 im = self.process_with_plugins(sub_element, im, margins, dimensions, payload, **kwargs)
 
         return im
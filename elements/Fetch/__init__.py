@@ -0,0 +1,73 @@
+"""
+Concurrent prefetching of the external data a template needs.
+
+Rendering walks the element tree in order, so a template with several json_api, grocy_entry or image_url elements
+used to wait for each request in turn. Before drawing, create_label_from_template asks the plugins for the
+requests they are going to make (ElementBase.get_prefetches) and starts them all at once on a shared thread pool.
+While drawing, the plugins ask for the same requests again through ElementBase.fetch and get the prefetched
+result, or perform the request themselves if it was not prefetched.
+
+Only requests without side effects (GET) are prefetched, and a request is only matched to a prefetched one if it
+has the same key, so prefetching never changes what a template renders.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Keyword argument under which the Prefetcher of the current render is passed to the plugins
+PREFETCH_KWARG = 'prefetched_fetches'
+PREFETCH_WORKERS = 8
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor():
+    """Return the thread pool shared by all prefetches, creating it on first use."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+        return _EXECUTOR
+
+
+class Prefetch:
+    """
+    A request a plugin is going to make while rendering.
+
+    Args:
+        key: Hashable identification of the request; the plugin must build the same key while drawing
+        fetch: Callable performing the request and returning its result
+    """
+
+    def __init__(self, key, fetch):
+        self.key = key
+        self.fetch = fetch
+
+
+class Prefetcher:
+    """The prefetched requests of a single render, started concurrently and consumed while drawing."""
+
+    def __init__(self, prefetches, executor=None):
+        executor = executor or get_executor()
+        self._futures = {}
+        for prefetch in prefetches:
+            # Identical requests of several elements are made once
+            if prefetch.key not in self._futures:
+                self._futures[prefetch.key] = executor.submit(prefetch.fetch)
+
+    def __len__(self):
+        return len(self._futures)
+
+    def take(self, key, fetch):
+        """Return the result of the prefetched request with this key, or of fetch() if there is none.
+
+        Errors of a prefetched request are raised here, as if the request was made now.
+        """
+        future = self._futures.get(key)
+        if future is None:
+            return fetch()
+        return future.result()
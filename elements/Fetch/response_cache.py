@@ -0,0 +1,105 @@
+"""
+Cache of API responses for elements that opt in with cache_ttl.
+
+Printing a batch of labels for the same product makes the same json_api (or grocy_entry) request for every label.
+With "cache_ttl" set on the element, the response body is kept for that many seconds and reused. Afterwards it is
+revalidated with If-None-Match / If-Modified-Since when the server sent an ETag or Last-Modified header, so an
+unchanged response is not downloaded again.
+
+Only GET requests are cached; requests that change data on the server are always sent. Responses are keyed by
+method, URL, request body and request headers, so requests with different API keys never share a response. The
+cache is bounded by the total size of the cached bodies (CACHE.API_RESPONSES, in bytes) and its hit/miss counters
+are reported by /api/metrics.
+"""
+
+import time
+
+from cache_helpers import LRUCache
+
+CACHEABLE_METHODS = ('get',)
+
+# Approximate per-entry overhead in bytes, so many tiny responses are bounded too
+ENTRY_OVERHEAD = 256
+
+RESPONSE_CACHE = LRUCache('api_responses', maxsize=4 * 1024 * 1024, sizeof=lambda entry: entry.size)
+
+
+class CachedResponse:
+    """The body of a cached response, its validators and how long it may be used without revalidation."""
+
+    def __init__(self, content, etag, last_modified, fresh_until):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh_until = fresh_until
+        self.size = len(content) + ENTRY_OVERHEAD
+
+    def is_fresh(self):
+        return time.monotonic() < self.fresh_until
+
+    def validators(self):
+        """Return the conditional request headers that revalidate this response."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def get_cache_ttl(element):
+    """Return the element's cache_ttl in seconds, or 0 if it is missing or invalid."""
+    ttl = element.get('cache_ttl')
+    if isinstance(ttl, (int, float)) and not isinstance(ttl, bool) and ttl > 0:
+        return ttl
+    return 0
+
+
+def get_cache_key(method, url, data, headers, vary=None):
+    """
+    Return the cache key of a request.
+
+    All request headers are part of the key, unless vary names the headers that select the response.
+    """
+    if vary is not None:
+        names = {name.lower() for name in vary}
+        headers = {name: value for name, value in headers.items() if name.lower() in names}
+    return method, url, data, tuple(sorted((str(name).lower(), str(value)) for name, value in headers.items()))
+
+
+def _is_storable(response):
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    return response.status_code == 200 and 'no-store' not in cache_control
+
+
+def cached_request(send, method, url, data=None, headers=None, ttl=0, vary=None, cache=RESPONSE_CACHE):
+    """
+    Return the response body of a request, from the cache if possible.
+
+    send(method, url, data=..., headers=...) makes the request and returns a requests.Response. Without a ttl, or
+    for methods other than GET, the request is always sent and nothing is cached.
+    """
+    headers = dict(headers or {})
+    if not ttl or method not in CACHEABLE_METHODS or cache.maxsize <= 0:
+        return send(method, url, data=data, headers=headers).content
+
+    key = get_cache_key(method, url, data, headers, vary)
+    entry = cache.get(key, count=False)
+    if entry is not None and entry.is_fresh():
+        cache.record(hit=True)
+        return entry.content
+
+    validators = entry.validators() if entry is not None else {}
+    response = send(method, url, data=data, headers=headers | validators)
+    if entry is not None and validators and response.status_code == 304:
+        cache.record(hit=True)
+        entry.fresh_until = time.monotonic() + ttl
+        return entry.content
+
+    cache.record(hit=False)
+    if _is_storable(response):
+        cache.put(key, CachedResponse(response.content, response.headers.get('ETag'),
+                                      response.headers.get('Last-Modified'), time.monotonic() + ttl))
+    else:
+        cache.invalidate(key)
+    return response.content
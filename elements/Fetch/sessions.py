@@ -0,0 +1,152 @@
+"""
+Shared HTTP sessions for the plugins that fetch external data.
+
+Module-level requests.get() opens a new connection (and TLS handshake) for every call and waits forever for a server
+that does not answer. Plugins make their requests through ElementBase.http_request instead, which uses one
+requests.Session per host so connections are kept alive between labels, and applies the timeouts and retries of
+the HTTP section of the configuration.
+
+Sessions are shared by all threads. They are only used for stateless API requests, so the cookies they collect are
+not relied upon.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_SETTINGS = {
+    'CONNECT_TIMEOUT': 5,
+    'READ_TIMEOUT': 30,
+    'RETRIES': 2,
+    'MAX_CONNECTIONS': 10,
+}
+
+# Sessions of the least recently used hosts beyond this many are closed
+MAX_HOSTS = 32
+RETRY_BACKOFF_FACTOR = 0.2
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+_VALID_SETTINGS = {
+    'CONNECT_TIMEOUT': lambda value: _is_number(value) and value > 0,
+    'READ_TIMEOUT': lambda value: _is_number(value) and value > 0,
+    'RETRIES': lambda value: isinstance(value, int) and not isinstance(value, bool) and value >= 0,
+    'MAX_CONNECTIONS': lambda value: isinstance(value, int) and not isinstance(value, bool) and value > 0,
+}
+
+
+def get_http_settings(config):
+    """
+    Return the settings from the HTTP section of config, with defaults for missing or invalid values.
+
+    Invalid values are logged as a warning.
+    """
+    section = (config or {}).get('HTTP') or {}
+    settings = dict(DEFAULT_HTTP_SETTINGS)
+    for key, is_valid in _VALID_SETTINGS.items():
+        value = section.get(key)
+        if value is None:
+            continue
+        if is_valid(value):
+            settings[key] = value
+        else:
+            logger.warning(f"Ignoring invalid HTTP.{key} {value!r}, using {settings[key]!r}")
+    return settings
+
+
+class SessionPool:
+    """
+    One keep-alive requests.Session per host, with timeouts and retries applied to every request.
+
+    Args:
+        connect_timeout: Seconds to wait for a connection to the server
+        read_timeout: Seconds to wait for the server to send data
+        retries: Number of retries of failed connections, and of idempotent requests answered with 502, 503 or 504
+        max_connections: Number of connections kept alive per host
+        max_hosts: Number of hosts whose sessions are kept
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, retries=2, max_connections=10, max_hosts=MAX_HOSTS):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.max_connections = max_connections
+        self.max_hosts = max_hosts
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        retry = Retry(total=self.retries, backoff_factor=RETRY_BACKOFF_FACTOR, status_forcelist=RETRY_STATUS_CODES,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def get_session(self, url):
+        """Return the session for the host of url."""
+        parts = urlsplit(url)
+        key = (parts.scheme.lower(), parts.netloc.lower())
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._create_session()
+                while len(self._sessions) > self.max_hosts:
+                    _, evicted = self._sessions.popitem(last=False)
+                    evicted.close()
+            else:
+                self._sessions.move_to_end(key)
+            return session
+
+    def request(self, method, url, **kwargs):
+        """Make a request like requests.request, on the session of the url's host and with the pool's timeout."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.get_session(url).request(method.upper(), url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_POOL = None
+_POOL_SETTINGS = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool(config):
+    """
+    Return the shared session pool for the HTTP section of config.
+
+    The pool is rebuilt when the settings change.
+    """
+    global _POOL, _POOL_SETTINGS
+    section = (config or {}).get('HTTP') or {}
+    key = tuple(section.get(name) for name in DEFAULT_HTTP_SETTINGS)
+    with _POOL_LOCK:
+        if _POOL is None or key != _POOL_SETTINGS:
+            if _POOL is not None:
+                _POOL.close()
+            settings = get_http_settings(config)
+            _POOL = SessionPool(settings['CONNECT_TIMEOUT'], settings['READ_TIMEOUT'], settings['RETRIES'],
+                                settings['MAX_CONNECTIONS'])
+            _POOL_SETTINGS = key
+        return _POOL
+
+
+def request(method, url, config=None, **kwargs):
+    """Make a request through the shared session pool configured by the HTTP section of config."""
+    return get_pool(config).request(method, url, **kwargs)
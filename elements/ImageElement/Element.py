@@ -1,44 +1,88 @@
-def element_image_base(image_to_add, element, im, margins, dimensions, **kwargs):
-    try:
-        image_to_add = image_to_add.convert('RGBA')
+import os
+
+from PIL import Image
+
+from cache_helpers import LRUCache
+
+# Final RGBA tiles of image files with their paste position, keyed by file, modification time and placement
+IMAGE_TILE_CACHE = LRUCache('image_tiles', maxsize=32 * 1024 * 1024,
+                            sizeof=lambda entry: entry[0].width * entry[0].height * 4)
+
 
-        position = element.get('position', None)
+def get_placement(image_to_add, element):
+    """Return the paste position of the image and the size to resize it to, or None to keep its size."""
+    position = element.get('position', None)
 
-        width = element.get('width', None)
-        height = element.get('height', None)
-        maintain_ar = element.get('maintainAR', True)
+    width = element.get('width', None)
+    height = element.get('height', None)
+    maintain_ar = element.get('maintainAR', True)
 
-        if position is not None and len(position) == 4:
-            width = position[2] - position[0]
-            height = position[3] - position[1]
+    if position is not None and len(position) == 4:
+        width = position[2] - position[0]
+        height = position[3] - position[1]
+        if maintain_ar:
+            width, height = constrain_width_height(image_to_add, width, height)
+            position = (position[0], position[1], position[0] + width, position[1] + height)
+    else:
+        if width is not None and height is None:
+            # "Width specified, but no height."
             if maintain_ar:
-                width, height = constrain_width_height(image_to_add, width, height)
-                position[2] = position[0] + width
-                position[3] = position[1] + height
-        else:
-            if width is not None and height is None:
-                # "Width specified, but no height."
-                if maintain_ar:
-                    scale = width / image_to_add.width
-                    height = int(image_to_add.height * scale)
-                    # Maintaining AR, resizing to fit.
-                else:
-                    height = image_to_add.height
-                    # Changing width only.
-            elif height is not None and width is None:
-                # height specified, but no width.
-                if maintain_ar:
-                    scale = height / image_to_add.height
-                    width = int(image_to_add.width * scale)
-                    # Maintaining AR, resizing to fit
-                else:
-                    width = image_to_add.width
-                    # Changing height only.
-
-        if width is not None and height is not None:
-            image_to_add = image_to_add.resize((int(width), int(height)))
-
-        im.paste(image_to_add, position)
+                scale = width / image_to_add.width
+                height = int(image_to_add.height * scale)
+                # Maintaining AR, resizing to fit.
+            else:
+                height = image_to_add.height
+                # Changing width only.
+        elif height is not None and width is None:
+            # height specified, but no width.
+            if maintain_ar:
+                scale = height / image_to_add.height
+                width = int(image_to_add.width * scale)
+                # Maintaining AR, resizing to fit
+            else:
+                width = image_to_add.width
+                # Changing height only.
+
+    if width is not None and height is not None:
+        return position, (int(width), int(height))
+    return position, None
+
+
+def get_image_tile(image_to_add, element):
+    """Return the image converted to RGBA and resized for the element, and the position to paste it at."""
+    position, size = get_placement(image_to_add, element)
+    if size is not None and getattr(image_to_add, 'format', None) == 'JPEG':
+        # Let the JPEG decoder scale down while decoding; the result is at least the requested size
+        image_to_add.draft(None, size)
+    tile = image_to_add.convert('RGBA')
+    if size is not None and tile.size != size:
+        tile = tile.resize(size)
+    return tile, position
+
+
+def get_file_tile(file_path, element):
+    """
+    Return the RGBA tile and paste position of an image file for the element, from the cache if possible.
+
+    The tile is keyed by the file's modification time and the element's placement properties, so changing either
+    loads the file again. The returned tile is shared and must not be modified.
+    """
+    position = element.get('position', None)
+    key = (file_path, os.stat(file_path).st_mtime_ns, tuple(position) if position is not None else None,
+           element.get('width', None), element.get('height', None), element.get('maintainAR', True))
+
+    def load():
+        print('loading image from ' + str(file_path))
+        with Image.open(file_path) as image_to_add:
+            return get_image_tile(image_to_add, element)
+
+    return IMAGE_TILE_CACHE.get_or_create(key, load)
+
+
+def element_image_base(image_to_add, element, im, margins, dimensions, **kwargs):
+    try:
+        tile, position = get_image_tile(image_to_add, element)
+        im.paste(tile, position)
     except Exception as e:
         if hasattr(e, 'message'):
             print(e.message)
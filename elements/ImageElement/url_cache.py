@@ -0,0 +1,216 @@
+"""
+Two-tier cache for images downloaded by image_url elements.
+
+Decoded RGBA images are kept in memory, bounded by their size in bytes (CACHE.IMAGE_URLS), so a repeated render of
+the same logo costs a dictionary lookup. Within CACHE.IMAGE_URL_TTL seconds the server is not asked at all;
+afterwards the image is revalidated with If-None-Match / If-Modified-Since and only downloaded again if it changed.
+
+If CACHE.IMAGE_URL_CACHE_DIR is configured, the downloaded bytes and their validators are also stored there, so
+after a restart, or in another worker process, an unchanged image is revalidated instead of downloaded. The
+directory is bounded by CACHE.IMAGE_URL_CACHE_DIR_SIZE bytes; the least recently used files are removed first.
+
+When the server cannot be reached, a stale copy is used rather than failing the label.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image
+
+import elements
+from cache_helpers import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+DEFAULT_DISK_CACHE_SIZE = 64 * 1024 * 1024
+
+IMAGE_URL_CACHE = LRUCache('image_urls', maxsize=32 * 1024 * 1024, sizeof=lambda entry: entry.size)
+
+
+class CachedImage:
+    """A decoded image, the validators of its response and how long it may be used without revalidation."""
+
+    def __init__(self, image, etag=None, last_modified=None, fresh_until=0):
+        self.image = image
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh_until = fresh_until
+        self.size = image.width * image.height * 4
+
+    def is_fresh(self):
+        return time.monotonic() < self.fresh_until
+
+
+def _settings():
+    return elements.ElementBase.config.get('CACHE') or {}
+
+
+def get_ttl(element):
+    """Return the seconds an image may be used without revalidation: the element's cache_ttl or CACHE.IMAGE_URL_TTL."""
+    for ttl in (element.get('cache_ttl'), _settings().get('IMAGE_URL_TTL')):
+        if isinstance(ttl, (int, float)) and not isinstance(ttl, bool) and ttl >= 0:
+            return ttl
+    return DEFAULT_TTL
+
+
+def get_cache_dir():
+    """Return the configured on-disk image cache directory, or None if the disk tier is disabled."""
+    return _settings().get('IMAGE_URL_CACHE_DIR')
+
+
+def _get_disk_cache_size():
+    size = _settings().get('IMAGE_URL_CACHE_DIR_SIZE')
+    if isinstance(size, int) and not isinstance(size, bool) and size >= 0:
+        return size
+    return DEFAULT_DISK_CACHE_SIZE
+
+
+def _disk_paths(cache_dir, url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + '.bin'), os.path.join(cache_dir, key + '.json')
+
+
+def _load_from_disk(cache_dir, url):
+    """Return (content, metadata) of the stored download of url, or None."""
+    content_path, meta_path = _disk_paths(cache_dir, url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as fh:
+            metadata = json.load(fh)
+        with open(content_path, 'rb') as fh:
+            content = fh.read()
+        # Mark the file as recently used for eviction
+        os.utime(content_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning(f"Ignoring unreadable image cache entry for {url}: {exc}")
+        return None
+    if metadata.get('url') != url:
+        return None
+    return content, metadata
+
+
+def _write_atomically(cache_dir, path, data):
+    # Write to a temporary file first so concurrent readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _save_to_disk(cache_dir, url, content, etag, last_modified):
+    content_path, meta_path = _disk_paths(cache_dir, url)
+    metadata = {'url': url, 'etag': etag, 'last_modified': last_modified}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomically(cache_dir, content_path, content)
+        _write_atomically(cache_dir, meta_path, json.dumps(metadata).encode('utf-8'))
+        _evict_from_disk(cache_dir, _get_disk_cache_size())
+    except OSError as exc:
+        logger.warning(f"Could not write image cache file to {cache_dir}: {exc}")
+
+
+def _evict_from_disk(cache_dir, maxsize):
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= maxsize:
+            break
+        for stale in (path, path[:-len('.bin')] + '.json'):
+            try:
+                os.unlink(stale)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def _decode(content):
+    with Image.open(BytesIO(content)) as image:
+        return image.convert('RGBA')
+
+
+def _validators(etag, last_modified):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def is_fresh(url):
+    """Return True if the image of url is in memory and needs no revalidation."""
+    entry = IMAGE_URL_CACHE.get(url, count=False)
+    return entry is not None and entry.is_fresh()
+
+
+def get_image(url, request, ttl=DEFAULT_TTL):
+    """
+    Return the decoded RGBA image at url, from the cache if possible.
+
+    request(method, url, headers=...) makes the HTTP request and returns a requests.Response. The returned image is
+    shared between callers and must not be modified.
+    """
+    entry = IMAGE_URL_CACHE.get(url, count=False)
+    if entry is not None and entry.is_fresh():
+        IMAGE_URL_CACHE.record(hit=True)
+        return entry.image
+
+    cache_dir = get_cache_dir()
+    stored = _load_from_disk(cache_dir, url) if cache_dir and entry is None else None
+    if entry is not None:
+        validators = _validators(entry.etag, entry.last_modified)
+    elif stored is not None:
+        validators = _validators(stored[1].get('etag'), stored[1].get('last_modified'))
+    else:
+        validators = {}
+
+    try:
+        response = request('get', url, headers=validators)
+        if response.status_code == 304 and not validators:
+            # Nothing was cached to be "not modified", e.g. a proxy answered from its own cache: ask the server
+            response = request('get', url, headers={'Cache-Control': 'no-cache'})
+            if response.status_code == 304:
+                raise ValueError(f"Got 304 Not Modified for {url} without a cached copy to revalidate")
+        if response.status_code != 304:
+            response.raise_for_status()
+    except Exception as exc:
+        if entry is None and stored is None:
+            raise
+        logger.warning(f"Could not revalidate image {url}, using the cached copy: {exc}")
+        IMAGE_URL_CACHE.record(hit=entry is not None)
+        return entry.image if entry is not None else _decode(stored[0])
+
+    fresh_until = time.monotonic() + ttl
+    if response.status_code == 304 and validators:
+        if entry is not None:
+            IMAGE_URL_CACHE.record(hit=True)
+            entry.fresh_until = fresh_until
+            return entry.image
+        content, metadata = stored
+        etag, last_modified = metadata.get('etag'), metadata.get('last_modified')
+    else:
+        content = response.content
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if cache_dir:
+            _save_to_disk(cache_dir, url, content, etag, last_modified)
+
+    IMAGE_URL_CACHE.record(hit=False)
+    image = _decode(content)
+    IMAGE_URL_CACHE.put(url, CachedImage(image, etag, last_modified, fresh_until))
+    return image
@@ -1,28 +1,22 @@
 import elements
 
-from PIL import Image
-from elements.ImageElement.Element import element_image_base
+from elements.ImageElement.Element import get_file_tile
 
 
 class ImageFileElement(elements.ElementBase):
 
+    element_type = 'image_file'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'image_file'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         try:
             file_path = element.get('file')
 
-            print('loading image from ' + str(file_path))
-
-            image = Image.open(file_path)
-            if image is None:
-                print("Error reading file!")
-            im = element_image_base(image, element, im, margins, dimensions, **kwargs)
+            # The file is only decoded and resized the first time; afterwards drawing it is a single paste
+            tile, position = get_file_tile(file_path, element)
+            im.paste(tile, position)
         except Exception as e:
             if hasattr(e, 'message'):
                 print(e.message)
@@ -1,23 +1,31 @@
 import elements
 
-from PIL import Image
+from elements.Fetch import Prefetch
+from elements.ImageElement import url_cache
 from elements.ImageElement.Element import element_image_base
-import requests
 
 
 class ImageUrlElement(elements.ElementBase):
 
+    element_type = 'image_url'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'image_url'
+    def get_image(self, element, url):
+        return url_cache.get_image(url, self.http_request, ttl=url_cache.get_ttl(element))
+
+    def get_prefetches(self, element, payload, **kwargs):
+        url = element.get('url')
+        # Images in the memory cache are drawn without asking the server
+        if not url or url_cache.is_fresh(url):
+            return []
+        return [Prefetch(('image_url', url), lambda: self.get_image(element, url))]
 
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         try:
             url = element.get('url')
-            image = Image.open(requests.get(url, stream=True).raw)
+            image = self.fetch(kwargs, ('image_url', url), lambda: self.get_image(element, url))
             im = element_image_base(image, element, im, margins, dimensions, **kwargs)
         except Exception as e:
             if hasattr(e, 'message'):
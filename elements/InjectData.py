@@ -14,16 +14,15 @@ class InjectData(elements.ElementBase):
         - key: Optional. If provided, retrieves the value from kwargs or payload using this key.
         - datakey: Optional. If provided and data is a dict, retrieves the value at data[datakey].
         - target_key: The key in the target (payload, kwargs, or child element) to inject into.
-        - target: 'payload', 'kwargs', or 'children' (default: 'payload').
+        - target: 'payload', 'kwargs', or 'children' (default: 'payload'). Children receive copies of their
+          definitions with the value injected; the template itself is never modified.
         - override: Boolean, whether to override existing data (default: False).
     """
+    element_type = 'inject_data'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element.get('type') == 'inject_data'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         target_key = element.get('target_key')
         # Use resolve_data to retrieve the value with data/key/datakey semantics
@@ -39,16 +38,12 @@ class InjectData(elements.ElementBase):
                 if override or target_key not in payload:
                     payload[target_key] = value
             elif target == 'children':
-                # Inject into child element definitions within this element's 'elements' list
-                for i, sub_el in enumerate(sub_elements):
-                    # Only operate on dict-like child definitions
-                    if isinstance(sub_el, dict):
-                        if override or target_key not in sub_el:
-                            sub_el[target_key] = value
-                    # Assign back in case the list needs explicit update (dicts are mutable but keep consistency)
-                    sub_elements[i] = sub_el
-                # Ensure updated list is written back
-                element['elements'] = sub_elements
+                # Inject into copies of the child element definitions; the template itself is left untouched
+                sub_elements = [
+                    self.derive_element(sub_el, **{target_key: value})
+                    if isinstance(sub_el, dict) and (override or target_key not in sub_el) else sub_el
+                    for sub_el in sub_elements
+                ]
             else:
                 print("Inject Data: Unknown target specified:", target)
 
@@ -1,8 +1,47 @@
+import itertools
 import os
 import traceback
 from importlib import util
 
-from PIL import Image, ImageFont
+from PIL import Image
+
+import font_helpers
+from cache_helpers import LRUCache
+from elements.Fetch import PREFETCH_KWARG, Prefetcher, sessions
+
+# Text bounding boxes keyed by (font, size, text, align, font mode)
+TEXT_METRICS_CACHE = LRUCache('text_metrics', maxsize=4096)
+# Results of adjust_font_to_fit, so re-rendering the same text skips the search entirely
+FONT_FIT_CACHE = LRUCache('font_fit', maxsize=1024)
+
+
+class FrozenDict(dict):
+    """Read-only dict used for the element definitions of a compiled template.
+
+    Compiled templates are shared between requests, so plugins must never write into them.
+    Use ElementBase.derive_element() to build a modified copy of an element instead.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Compiled template elements are read-only, use ElementBase.derive_element() to modify a copy')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """Recursively convert dicts to FrozenDicts and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
 
 
 class ElementBase:
@@ -10,47 +49,179 @@ class ElementBase:
     """
     plugins = []
 
+    # Plugins that only handle one element type declare it here and are dispatched through a lookup table.
+    # Plugins that need more than a type check override can_process instead.
+    element_type = None
+
+    _handlers_by_type = {}
+    _predicate_handlers = []
+    _handler_instances = {}
+    # Position of every handler in registration order, so both tables can be merged back into that order
+    _registration_order = {}
+    _registration_counter = itertools.count()
+
+    # Application configuration, made available to plugins through ElementBase.configure()
+    config = {}
+
     # For every class that inherits from the current,
     # the class name will be added to plugins
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls.plugins.append(cls)
+        ElementBase.register_handler(cls)
+
+    @classmethod
+    def can_process(cls, element):
+        return cls.element_type is not None and element.get('type') == cls.element_type
+
+    @staticmethod
+    def register_handler(handler):
+        """Add a plugin class to the dispatch tables.
+
+        Plugins that declare element_type and keep the default can_process are looked up by type.
+        All other plugins are asked through can_process for every element.
+        """
+        ElementBase._registration_order.setdefault(handler, next(ElementBase._registration_counter))
+        if handler.element_type is not None and \
+                getattr(handler.can_process, '__func__', None) is ElementBase.can_process.__func__:
+            ElementBase._handlers_by_type.setdefault(handler.element_type, []).append(handler)
+        else:
+            ElementBase._predicate_handlers.append(handler)
+
+    @staticmethod
+    def unregister_handler(handler):
+        """Remove a plugin class from the dispatch tables."""
+        for handlers in ElementBase._handlers_by_type.values():
+            if handler in handlers:
+                handlers.remove(handler)
+        if handler in ElementBase._predicate_handlers:
+            ElementBase._predicate_handlers.remove(handler)
+        if handler in ElementBase.plugins:
+            ElementBase.plugins.remove(handler)
+        ElementBase._handler_instances.pop(handler, None)
+        ElementBase._registration_order.pop(handler, None)
+
+    @staticmethod
+    def get_handlers(element):
+        """Return the shared plugin instances that process the given element, in registration order."""
+        handlers = ElementBase._handlers_by_type.get(element.get('type'), [])
+        if ElementBase._predicate_handlers:
+            matching = [handler for handler in ElementBase._predicate_handlers if handler.can_process(element)]
+            if matching:
+                # A predicate plugin registered before a typed one still runs first
+                handlers = sorted(handlers + matching, key=ElementBase._registration_order.__getitem__)
+
+        # Plugins are stateless, so a single instance of each is shared by all elements and requests
+        instances = []
+        for handler in handlers:
+            instance = ElementBase._handler_instances.get(handler)
+            if instance is None:
+                instance = ElementBase._handler_instances.setdefault(handler, handler())
+            instances.append(instance)
+        return instances
 
     @staticmethod
     def process_with_plugins(element, im: Image, margins, dimensions, payload, **kwargs):
-        element_type = element['type']
-        # print('Attempting to process element with type {}'.format(element_type))
-        for handler in ElementBase.plugins:
-            if handler.can_process(element):
-                instance = handler()
-                # print('Processing element with handler {}'.format(type(instance).__name__))
-                instance.process_element(element, im, margins, dimensions, payload, **kwargs)
+        for instance in ElementBase.get_handlers(element):
+            # print('Processing element with handler {}'.format(type(instance).__name__))
+            instance.process_element(element, im, margins, dimensions, payload, **kwargs)
+        return im
+
+    def get_prefetches(self, element, payload, **kwargs):
+        """Return the external requests this element will make while rendering, as a list of Fetch.Prefetch.
+
+        They are started concurrently before the template is drawn; see elements/Fetch. Plugins that fetch data
+        override this and get the results through fetch(). Containers that pass their children on unchanged can
+        return collect_prefetches() of their children.
+        """
+        return []
+
+    @staticmethod
+    def collect_prefetches(elements, payload, **kwargs):
+        """Return the prefetchable requests of the given elements."""
+        prefetches = []
+        for element in elements:
+            if not isinstance(element, dict):
+                continue
+            for instance in ElementBase.get_handlers(element):
+                try:
+                    prefetches.extend(instance.get_prefetches(element, payload, **kwargs) or [])
+                except Exception:
+                    # The element then fetches its data while drawing, as without prefetching
+                    traceback.print_exc()
+        return prefetches
+
+    @staticmethod
+    def start_prefetch(elements, payload, **kwargs):
+        """Start the requests of the given elements concurrently and return the kwargs that make them available.
+
+        Pass the returned dict along with the other kwargs when rendering the elements.
+        """
+        prefetches = ElementBase.collect_prefetches(elements, payload, **kwargs)
+        if not prefetches:
+            return {}
+        return {PREFETCH_KWARG: Prefetcher(prefetches)}
+
+    @staticmethod
+    def fetch(kwargs, key, fetch):
+        """Return the prefetched result of the request with this key, or call fetch() to make it now."""
+        prefetcher = kwargs.get(PREFETCH_KWARG)
+        if prefetcher is None:
+            return fetch()
+        return prefetcher.take(key, fetch)
+
+    @staticmethod
+    def http_request(method, url, **kwargs):
+        """Make an HTTP request like requests.request, with keep-alive connections and the configured timeouts.
+
+        Plugins fetching external data should use this instead of requests.get() and friends; see
+        elements/Fetch/sessions.py and the HTTP section of the configuration.
+        """
+        return sessions.request(method, url, config=ElementBase.config, **kwargs)
+
+    @staticmethod
+    def configure(config):
+        """Make the application configuration available to all plugins as ElementBase.config."""
+        ElementBase.config = config or {}
+
+    @staticmethod
+    def compile_template(template):
+        """Compile a parsed template into a read-only render plan.
+
+        The compiled plan can be cached and shared by concurrent renders. Everything that varies per
+        request travels in the render context instead: the payload and the kwargs passed to
+        process_element.
+        """
+        return freeze(template)
+
+    @staticmethod
+    def derive_element(element, **overrides):
+        """Return a shallow copy of element with the given keys replaced, leaving element untouched."""
+        derived = dict(element)
+        derived.update(overrides)
+        return derived
 
     @staticmethod
     def get_form_elements_with_plugins(element):
-        element_type = element['type']
-        # print('Attempting to process element with type {}'.format(element_type))
-        for handler in ElementBase.plugins:
-            if handler.can_process(element):
-                instance = handler()
-                if hasattr(instance, 'get_form_elements'):
-                    form_elements = instance.get_form_elements(element)
-                else:
-                    form_elements = ElementBase.get_default_form_elements(element)
-
-                # Each plugin is responsible for returning a list of fields
-                # If no fields, return empty list
-                if form_elements is None:
-                    return None
-
-                # Plugins are expected to return a list of form elements.
-                # For backward compatibility, if a plugin returns a single item (not a list),
-                # it will be wrapped in a list here. Plugin authors should prefer returning a list,
-                # even if it contains only one element.
-                if not isinstance(form_elements, list):
-                    return [form_elements]
-
-                return form_elements
+        for instance in ElementBase.get_handlers(element):
+            if hasattr(instance, 'get_form_elements'):
+                form_elements = instance.get_form_elements(element)
+            else:
+                form_elements = ElementBase.get_default_form_elements(element)
+
+            # Each plugin is responsible for returning a list of fields
+            # If no fields, return empty list
+            if form_elements is None:
+                return None
+
+            # Plugins are expected to return a list of form elements.
+            # For backward compatibility, if a plugin returns a single item (not a list),
+            # it will be wrapped in a list here. Plugin authors should prefer returning a list,
+            # even if it contains only one element.
+            if not isinstance(form_elements, list):
+                return [form_elements]
+
+            return form_elements
         # If no plugin found, return default form elements
         return ElementBase.get_default_form_elements(element)
 
@@ -84,33 +255,80 @@ class ElementBase:
     @staticmethod
     def adjust_font_to_fit(draw, font, max_font_size, text, label_size, min_size=2, horizontal_offset=0,
                            vertical_offset=0, align='left'):
-        if min_size >= max_font_size or ElementBase.font_fits(draw, font, max_font_size, text, label_size, horizontal_offset,
-                                                  vertical_offset, align):
-            return max_font_size
-        high = max_font_size
-        low = min_size
+        """Return the largest font size up to max_font_size at which text fits into label_size.
 
-        while low < high:
-            available_range = high - low
-            mid = (available_range // 2) + low
-            # print('Finding Largest Possible Font between [', low, ',', high, '] with offset of [', horizontal_offset, ',', vertical_offset, '] - Trying: ', mid)
-            fits = ElementBase.font_fits(draw, font, mid, text, label_size, horizontal_offset, vertical_offset, align)
+        Results are cached, so repeated previews of the same text do not measure it again.
+        Returns min_size - 1 if the text does not even fit at min_size.
+        """
+        key = (font, max_font_size, text, tuple(label_size), min_size, horizontal_offset, vertical_offset, align,
+               draw.fontmode)
+        font_size = FONT_FIT_CACHE.get(key)
+        if font_size is None:
+            font_size = FONT_FIT_CACHE.put(key, ElementBase._solve_font_size(
+                draw, font, max_font_size, text, label_size, min_size, horizontal_offset, vertical_offset, align))
+        return font_size
 
-            if fits:
-                low = mid + 1
+    @staticmethod
+    def _solve_font_size(draw, font, max_font_size, text, label_size, min_size, horizontal_offset, vertical_offset,
+                         align):
+        def fits(size):
+            return ElementBase.font_fits(draw, font, size, text, label_size, horizontal_offset, vertical_offset, align)
+
+        if min_size >= max_font_size or fits(max_font_size):
+            return max_font_size
+
+        # Text extents grow almost linearly with the font size, so scale the measurement at the maximum size
+        # to estimate the answer. Usually only the estimate and the size above it need to be measured.
+        bbox = ElementBase.measure_text(draw, font, max_font_size, text, align)
+        scale = min((label_size[0] - horizontal_offset) / max(bbox[2], 1),
+                    (label_size[1] - vertical_offset) / max(bbox[3], 1))
+        guess = min(max(int(max_font_size * scale), min_size), max_font_size - 1)
+
+        # Search outwards from the estimate with growing steps until the answer is bracketed:
+        # low is the largest size known to fit (min_size - 1 if none), high the smallest known not to fit.
+        step = 1
+        if fits(guess):
+            low, high = guess, max_font_size
+            while low + step < high:
+                if not fits(low + step):
+                    high = low + step
+                    break
+                low += step
+                step *= 2
+        else:
+            low, high = min_size - 1, guess
+            while high - step > low:
+                if fits(high - step):
+                    low = high - step
+                    break
+                high -= step
+                step *= 2
+
+        while high - low > 1:
+            mid = (low + high) // 2
+            if fits(mid):
+                low = mid
             else:
                 high = mid
 
-        if not ElementBase.font_fits(draw, font, mid, text, label_size, horizontal_offset, vertical_offset, align):
-            mid -= 1
+        # print('Largest font size: ', low)
+        return low
 
-        # print('Largest font size: ', mid)
-        return mid
+    @staticmethod
+    def get_font(font_path, font_size, layout_engine=None):
+        """Return a FreeTypeFont from the process-wide font cache instead of loading the file again."""
+        return font_helpers.get_font(font_path, font_size, layout_engine)
+
+    @staticmethod
+    def measure_text(draw, font, font_size, text, align='left'):
+        """Return the multiline bounding box of text, memoized by font, size, text and alignment."""
+        key = (font, font_size, text, align, draw.fontmode)
+        return TEXT_METRICS_CACHE.get_or_create(key, lambda: draw.multiline_textbbox(
+            (0, 0), text, font=ElementBase.get_font(font, font_size), align=align))
 
     @staticmethod
     def font_fits(draw, font, font_size, text, label_size, horizontal_offset, vertical_offset, align):
-        im_font = ImageFont.truetype(font, font_size)
-        textsize = draw.multiline_textbbox((0, 0), text, font=im_font, align=align)
+        textsize = ElementBase.measure_text(draw, font, font_size, text, align)
         textsize = (textsize[2], textsize[3])
         fits = (textsize[0] + horizontal_offset) < label_size[0] and (textsize[1] + vertical_offset) < label_size[1]
         return fits
@@ -1,20 +1,18 @@
 import elements
 from PIL import Image
+from elements.Barcode import get_barcode, linear
+from elements.Barcode.ghostscript import generate_barcode
 
 
 class CodeElement(elements.ElementBase):
 
+    # Generic barcode element, type must be "code"
+    element_type = 'code'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        # Generic barcode element, type must be "code"
-        return element['type'] == 'code'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
-        import treepoem
-
         data = element.get('data', kwargs.get(element.get('key')))
         data_key = element.get('datakey')
         if data_key is not None and isinstance(data, dict) and data_key in data:
@@ -31,11 +29,65 @@ class CodeElement(elements.ElementBase):
         horizontal_offset = element.get('horizontal_offset', 0)
         vertical_offset = element.get('vertical_offset', 0)
 
-        # Generate barcode via treepoem; let treepoem/BWIPP validate data
+        # Extra BWIPP options, e.g. {"includetext": true}
+        options = element.get('options') or {}
+
+        # "native" draws linear codes in-process, "treepoem" always uses BWIPP/Ghostscript,
+        # "auto" uses the native engine when it supports the code type, no BWIPP options are given and the
+        # barcode gets the same size as with treepoem (img_size is a whole multiple of the module count)
+        engine = element.get('engine', 'auto')
+        if engine not in ('auto', 'native', 'treepoem'):
+            raise ValueError(f"Unknown barcode engine '{engine}', use 'auto', 'native' or 'treepoem'")
+        if engine == 'native' or (engine == 'auto' and not options):
+            runs = self.encode_native(engine, code_type, data)
+            if runs is not None:
+                module_width, height, width = linear.barcode_size(runs, img_size)
+                if engine == 'native' or module_width * sum(runs) == width:
+                    linear.draw_barcode(im, runs, horizontal_offset, vertical_offset, module_width, height, width)
+                    return im
+
+        # Rendered barcodes are cached, so a repeated preview does not run Ghostscript again
+        barcode = get_barcode(code_type, data, options, img_size,
+                              lambda: self.render_barcode(code_type, data, options, img_size))
+
+        im.paste(
+            barcode,
+            (
+                horizontal_offset,
+                vertical_offset,
+                horizontal_offset + barcode.width,
+                vertical_offset + barcode.height
+            )
+        )
+
+        return im
+
+    @staticmethod
+    def encode_native(engine, code_type, data):
+        """Return the bar widths from the native encoder, or None to fall back to treepoem."""
+        if code_type not in linear.ENCODERS:
+            if engine == 'native':
+                raise ValueError(f"The native barcode engine does not support '{code_type}', "
+                                 f"supported are: {', '.join(linear.ENCODERS)}")
+            return None
+        try:
+            return linear.encode(code_type, data)
+        except ValueError as exc:
+            if engine == 'native':
+                raise ValueError(
+                    f"Failed to generate barcode of type '{code_type}' with data '{data}': {exc}"
+                ) from exc
+            # Let treepoem/BWIPP decide and report the error
+            return None
+
+    def render_barcode(self, code_type, data, options, img_size):
+        # Generate barcode via treepoem (or the warm Ghostscript pool if configured); let BWIPP validate data
         try:
-            barcode = treepoem.generate_barcode(
+            barcode = generate_barcode(
                 barcode_type=str(code_type),
-                data=str(data)
+                data=str(data),
+                options=dict(options),
+                config=self.config
             )
         except Exception as exc:
             # Fail fast with a clear error so the caller/user sees what's wrong
@@ -46,42 +98,14 @@ class CodeElement(elements.ElementBase):
         # Convert to RGB so it matches the main label image mode
         barcode = barcode.convert('RGB')
 
-        # Optional: scale to requested image size (pixels)
+        # Optional: scale to requested image size (pixels), preserving the aspect ratio to avoid unreadable barcodes
         if img_size is not None:
-            orig_w, orig_h = barcode.size
-
-            # Preserve aspect ratio to avoid unreadable barcodes
-            if isinstance(img_size, str) and 'x' in img_size.lower():
-                w_str, h_str = img_size.lower().split('x', 1)
-                target_w = int(w_str)
-                target_h = int(h_str)
-
-                scale = min(target_w / orig_w, target_h / orig_h)
-                new_w = max(1, int(orig_w * scale))
-                new_h = max(1, int(orig_h * scale))
-            else:
-                # Single value: treat as desired width and scale height proportionally
-                target_w = int(img_size)
-                scale = target_w / orig_w
-                new_w = target_w
-                new_h = max(1, int(orig_h * scale))
-
             barcode = barcode.resize(
-                (new_w, new_h),
+                linear.scaled_size(barcode.width, barcode.height, img_size),
                 resample=Image.NEAREST
             )
 
-        im.paste(
-            barcode,
-            (
-                horizontal_offset,
-                vertical_offset,
-                horizontal_offset + barcode.width,
-                vertical_offset + barcode.height
-            )
-        )
-
-        return im
+        return barcode
 
     def get_form_elements(self, element):
         form = self.get_default_form_elements(element)
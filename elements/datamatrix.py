@@ -1,19 +1,16 @@
 import elements
 from PIL import Image
+from elements.Barcode import DATAMATRIX_CACHE
 
 
 class DataMatrixElement(elements.ElementBase):
 
+    element_type = 'datamatrix'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'datamatrix'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
-        from pylibdmtx.pylibdmtx import encode
-
         data = element.get('data', kwargs.get(element.get('key')))
         data_key = element.get('datakey')
         if data_key is not None and isinstance(data, dict) and data_key in data:
@@ -33,13 +30,34 @@ class DataMatrixElement(elements.ElementBase):
         horizontal_offset = element.get('horizontal_offset', 0)
         vertical_offset = element.get('vertical_offset', 0)
 
+        # Encoded symbols are memoized; the image is shared and must not be modified
+        datamatrix = DATAMATRIX_CACHE.get_or_create(
+            (str(data), dm_size, img_size), lambda: self.render_datamatrix(data, dm_size, img_size))
+
+        im.paste(
+            datamatrix,
+            (
+                horizontal_offset,
+                vertical_offset,
+                horizontal_offset + datamatrix.width,
+                vertical_offset + datamatrix.height
+            )
+        )
+
+        return im
+
+    @staticmethod
+    def render_datamatrix(data, dm_size, img_size):
+        from pylibdmtx.pylibdmtx import encode
+
         # Generate DataMatrix with the configured symbol size
-        encoded = encode(data.encode('utf8'), size=dm_size)
+        encoded = encode(str(data).encode('utf8'), size=dm_size)
 
+        # The symbol is black on white, so one channel of libdmtx's RGB output is enough for an L mode image
         datamatrix = Image.frombytes(
-            'RGB',
+            'L',
             (encoded.width, encoded.height),
-            encoded.pixels
+            encoded.pixels[::encoded.bpp // 8]
         )
 
         # --- Optional: scale to requested image size (pixels) -----------------
@@ -60,19 +78,7 @@ class DataMatrixElement(elements.ElementBase):
             )
         # ----------------------------------------------------------------------
 
-        datamatrix.save('/tmp/dmtx.png')
-
-        im.paste(
-            datamatrix,
-            (
-                horizontal_offset,
-                vertical_offset,
-                horizontal_offset + datamatrix.width,
-                vertical_offset + datamatrix.height
-            )
-        )
-
-        return im
+        return datamatrix
 
     def get_form_elements(self, element):
         form = self.get_default_form_elements(element)
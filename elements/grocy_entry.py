@@ -3,24 +3,25 @@ import elements
 
 class GrocyEntryElement(elements.ElementBase):
 
+    element_type = 'grocy_entry'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'grocy_entry'
-
-    def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+    def get_api_element(self, element, payload, kwargs, verbose=True):
+        """Return the json_api element requesting the grocycode's entry, or None if there is no valid grocycode."""
         server = element.get('endpoint')
         api_key = element.get('api_key')
         raw_grocycode = element.get('grocycode', payload.get('grocycode', kwargs.get('grocycode')))
         if raw_grocycode is None:
-            print('No grocycode found!')
-            return im
+            if verbose:
+                print('No grocycode found!')
+            return None
         grocycode = raw_grocycode.split(':')
         if len(grocycode) < 3:
-            print("Invalid grocycode format! Expected format: 'grcy:TYPE:ID[:STOCK_ID]', got '{}'".format(raw_grocycode))
-            return im
+            if verbose:
+                print("Invalid grocycode format! Expected format: 'grcy:TYPE:ID[:STOCK_ID]', got '{}'".format(raw_grocycode))
+            return None
         grocycode_type = grocycode[1]
         typeid = grocycode[2]
         if grocycode_type == 'p':  # Product
@@ -32,10 +33,21 @@ class GrocyEntryElement(elements.ElementBase):
         elif grocycode_type == 'b':  # battery
             server = f"{server}/api/battery/{typeid}"
 
-        element['type'] = 'json_api'
-        element['endpoint'] = server
         headers = element.get('headers', {})
-        element['headers'] = headers | {"GROCY-API-KEY": api_key}
+        return self.derive_element(element, type='json_api', endpoint=server,
+                                   headers=dict(headers) | {"GROCY-API-KEY": api_key})
+
+    def get_prefetches(self, element, payload, **kwargs):
+        # Problems with the grocycode are reported when the element is drawn
+        api_element = self.get_api_element(element, payload, kwargs, verbose=False)
+        if api_element is None:
+            return []
+        return self.collect_prefetches([api_element], payload, **kwargs)
+
+    def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+        element = self.get_api_element(element, payload, kwargs)
+        if element is None:
+            return im
 
         im = self.process_with_plugins(element, im, margins, dimensions, payload, **kwargs)
 
@@ -1,23 +1,23 @@
 import elements
 
 import json
-import requests
+
+from elements.Fetch import Prefetch
+from elements.Fetch.response_cache import cached_request, get_cache_ttl
 
 
 class JsonAPIElement(elements.ElementBase):
 
+    element_type = 'json_api'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'json_api'
-
-    def process_element(self, element, im, margins, dimensions, payload, **kwargs):
-
+    def get_request(self, element, **kwargs):
+        """Return the method, endpoint, data and headers of the element's request, or None without an endpoint."""
         endpoint = element.get('endpoint')
         if endpoint is None:
-            return im
+            return None
 
         method = element.get('method')
 
@@ -28,34 +28,56 @@ class JsonAPIElement(elements.ElementBase):
         headers = headers | {'accept': 'application/json'}
 
         data = element.get('data', {})
-        datakey = kwargs.get(element.get('datakey'))
-        datakeyname = kwargs.get(element.get('datakeyname'), element.get('datakey'))
-        if datakey is not None and datakeyname is not None:
-            data[datakeyname] = datakey
-
-        if len(data) == 0:
+        if isinstance(data, dict):
+            # Copy so the template's own data is never modified
+            data = dict(data)
+            datakey = kwargs.get(element.get('datakey'))
+            datakeyname = kwargs.get(element.get('datakeyname'), element.get('datakey'))
+            if datakey is not None and datakeyname is not None:
+                data[datakeyname] = datakey
+
+        # Data handed down by a parent element may be any JSON value, e.g. an id or a list
+        if data is None or (isinstance(data, (dict, list, tuple, str)) and len(data) == 0):
             data = None
         else:
             data = json.dumps(data)
 
-        if method == 'post':
-            response_api = requests.post(endpoint, data=data, headers=headers)
-        elif method == 'put':
-            response_api = requests.put(endpoint, data=data, headers=headers)
-        elif method == 'delete':
-            response_api = requests.delete(endpoint, data=data, headers=headers)
-        else:
-            response_api = requests.get(endpoint, data=data, headers=headers)
+        return method, endpoint, data, headers
+
+    @staticmethod
+    def get_request_key(method, endpoint, data, headers):
+        return 'json_api', method, endpoint, data, tuple(sorted(headers.items()))
+
+    def send_request(self, element, method, endpoint, data, headers):
+        # Responses are only reused if the element opts in with cache_ttl
+        content = cached_request(self.http_request, method, endpoint, data=data, headers=headers,
+                                 ttl=get_cache_ttl(element), vary=element.get('cache_headers'))
+
+        return json.loads(content)
+
+    def get_prefetches(self, element, payload, **kwargs):
+        api_request = self.get_request(element, **kwargs)
+        # Only requests without side effects are made ahead of time
+        if api_request is None or api_request[0] != 'get':
+            return []
+        return [Prefetch(self.get_request_key(*api_request), lambda: self.send_request(element, *api_request))]
+
+    def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+
+        api_request = self.get_request(element, **kwargs)
+        if api_request is None:
+            return im
 
-        response_data = response_api.json()
+        response_data = self.fetch(kwargs, self.get_request_key(*api_request),
+                                   lambda: self.send_request(element, *api_request))
 
         sub_elements = element.get('elements', [])
         for sub_element in sub_elements:
             sub_element_key = sub_element.get('key')
             if sub_element_key is not None and sub_element_key in response_data:
-                sub_element['data'] = response_data[sub_element_key]
+                sub_element = self.derive_element(sub_element, data=response_data[sub_element_key])
             else:
-                sub_element['data'] = response_data
+                sub_element = self.derive_element(sub_element, data=response_data)
             self.process_with_plugins(sub_element, im, margins, dimensions, payload, **kwargs)
 
         return im
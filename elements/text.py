@@ -2,22 +2,20 @@ import elements
 
 import textwrap
 
-from PIL import ImageDraw, ImageFont
+from PIL import ImageDraw
 
 
 class TextElement(elements.ElementBase):
 
+    element_type = 'text'
+
     def __init__(self):
         pass
 
-    @staticmethod
-    def can_process(element):
-        return element['type'] == 'text'
-
     def process_element(self, element, im, margins, dimensions, payload, **kwargs):
         data = element.get('data', kwargs.get(element.get('key')))
         data_key = element.get('datakey')
-        if data_key is not None and type(data) is dict and data_key in data:
+        if data_key is not None and isinstance(data, dict) and data_key in data:
             data = data[data_key]
 
         if data is None:
@@ -49,7 +47,7 @@ class TextElement(elements.ElementBase):
                                                 vertical_offset + margins[3],
                                                 align)
 
-        font = ImageFont.truetype(font_path, font_size)
+        font = self.get_font(font_path, font_size)
 
         draw.multiline_text(text_offset, data, fill_color, font=font, align=align)
 
@@ -1,48 +1,623 @@
 #!/usr/bin/env python
 
-import logging, subprocess
+import json, logging, os, struct, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import ImageFont
+
+from cache_helpers import LRUCache
 
 logger = logging.getLogger(__name__)
 
-def get_fonts(folder=None):
+# Loaded FreeTypeFont objects, shared by every renderer. Capacity is configured with CACHE.FONTS.
+FONT_CACHE = LRUCache('fonts', maxsize=64)
+
+
+class FontPath(str):
     """
-    Scan a folder (or the system) for .ttf / .otf fonts and
-    return a dictionary of the structure  family -> style -> file path
+    Path of a font file that also knows which font of a TTC/OTC collection it refers to.
+
+    It is used like a plain path, e.g. in the template context, and equals the plain path for the first font of a
+    file. Paths of other fonts of a collection compare unequal to it, so caches keyed by font path tell them apart.
     """
-    fonts = {}
-    if folder:
-        cmd = ['fc-scan', '--format', '%{file}:%{family}:style=%{style}\n', folder]
+
+    def __new__(cls, path, index=0):
+        font_path = super().__new__(cls, path)
+        font_path.index = index
+        return font_path
+
+    def __eq__(self, other):
+        if isinstance(other, FontPath) or self.index:
+            return str(self) == str(other) and self.index == (other.index if isinstance(other, FontPath) else 0)
+        return str.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((str(self), self.index)) if self.index else str.__hash__(self)
+
+    def __reduce__(self):
+        return FontPath, (str(self), self.index)
+
+
+def get_font(font_path, font_size, layout_engine=None, index=None):
+    """
+    Return a FreeTypeFont for the given file and size, loading it from disk only on the first use.
+
+    index selects the font of a TTC/OTC collection; by default it is taken from a FontPath, otherwise it is 0.
+    """
+    if index is None:
+        index = font_path.index if isinstance(font_path, FontPath) else 0
+    key = (str(font_path), index, font_size, layout_engine)
+    return FONT_CACHE.get_or_create(key, lambda: ImageFont.truetype(str(font_path), font_size, index=index,
+                                                                    layout_engine=layout_engine))
+
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+# Folders searched for system fonts, in the order fontconfig usually lists them
+SYSTEM_FONT_DIRS = ('/usr/share/fonts', '/usr/local/share/fonts', '~/.local/share/fonts', '~/.fonts')
+DEFAULT_FONT_INDEX_FILE = os.path.join(os.environ.get('XDG_CACHE_HOME') or '~/.cache', 'label_web', 'font_index.json')
+FONT_INDEX_VERSION = 3
+# Number of font files read at the same time
+FONT_SCAN_WORKERS = 8
+
+
+# sfnt versions of TrueType and OpenType (CFF) fonts
+SFNT_VERSIONS = (b'\x00\x01\x00\x00', b'OTTO', b'true')
+# Typographic family and subfamily (16, 17) are listed before the legacy family and subfamily (1, 2)
+FACE_NAME_IDS = ((16, 17), (1, 2))
+WINDOWS_ENGLISH_US = 0x409
+MAX_COLLECTION_FONTS = 1024
+
+
+def _decode_name(platform_id, encoding_id, language_id, raw):
+    """Return (priority, text) of a name record, lower priorities preferred, or None for unsupported encodings."""
+    if platform_id == 3 and encoding_id in (0, 1, 10):  # Windows, Unicode
+        return (0 if language_id == WINDOWS_ENGLISH_US else 1), raw.decode('utf-16-be', errors='replace')
+    if platform_id == 0:  # Unicode
+        return 2, raw.decode('utf-16-be', errors='replace')
+    if platform_id == 1 and encoding_id == 0:  # Macintosh, Roman
+        return (3 if language_id == 0 else 4), raw.decode('mac_roman', errors='replace')
+    return None
+
+
+def _read_names(fh, offset):
+    """Return nameID -> name of the font whose table directory starts at offset, for the IDs in FACE_NAME_IDS."""
+    fh.seek(offset)
+    header = fh.read(12)
+    if len(header) < 12 or header[:4] not in SFNT_VERSIONS:
+        raise ValueError('not a TrueType or OpenType font')
+    num_tables, = struct.unpack('>H', header[4:6])
+    directory = fh.read(16 * num_tables)
+    for i in range(num_tables):
+        tag, _, table_offset, length = struct.unpack_from('>4sIII', directory, 16 * i)
+        if tag == b'name':
+            break
     else:
-        cmd = ['fc-list', ':', 'file', 'family', 'style']
+        raise ValueError('font has no name table')
 
-    try:
-        subprocess_results = subprocess.check_output(cmd).decode('utf-8').split("\n")
-    except subprocess.CalledProcessError:
-        return fonts
-
-    for line in subprocess_results:
-        logger.debug(line)
-        line.strip()
-        if not line: continue
-        if 'otf' not in line and 'ttf' not in line: continue
-        parts = line.split(':')
-        if 'style=' not in line or len(parts) < 3:
-            # fc-list didn't output all desired properties
-            logger.warn('skipping invalid font %s', line)
+    fh.seek(table_offset)
+    table = fh.read(length)
+    _, count, strings_offset = struct.unpack_from('>HHH', table, 0)
+    wanted = {name_id for ids in FACE_NAME_IDS for name_id in ids}
+    names = {}
+    for i in range(count):
+        platform_id, encoding_id, language_id, name_id, str_length, str_offset = \
+            struct.unpack_from('>HHHHHH', table, 6 + 12 * i)
+        if name_id not in wanted:
             continue
-        path = parts[0]
-        families = parts[1].strip().split(',')
-        styles = parts[2].split('=')[1].split(',')
-        if len(families) == 1 and len(styles) > 1:
-            families = [families[0]] * len(styles)
-        elif len(families) > 1 and len(styles) == 1:
-            styles = [styles[0]] * len(families)
-        if len(families) != len(styles):
-            logger.debug("Problem with this font: " + line)
+        start = strings_offset + str_offset
+        decoded = _decode_name(platform_id, encoding_id, language_id, table[start:start + str_length])
+        if decoded is None:
             continue
-        for i in range(len(families)):
-            try: fonts[families[i]]
-            except: fonts[families[i]] = dict()
-            fonts[families[i]][styles[i]] = path
-            logger.debug("Added this font: " + str((families[i], styles[i], path)))
+        priority, text = decoded[0], decoded[1].strip('\x00').strip()
+        if text and (name_id not in names or priority < names[name_id][0]):
+            names[name_id] = (priority, text)
+    return {name_id: text for name_id, (_, text) in names.items()}
+
+
+def read_font_faces(path):
+    """
+    Return the (family, style, index) of a TTF/OTF font file, or of every font of a TTC/OTC collection, where index
+    is the position of the font in the collection (0 for single fonts).
+
+    The names are read from the fonts' name tables; both the typographic and the legacy family and style are
+    returned, like fontconfig lists them. A family and style found in several fonts of a collection is only
+    returned for the first of them.
+    """
+    faces = []
+    names_found = set()
+    with open(path, 'rb') as fh:
+        if fh.read(4) == b'ttcf':
+            _, num_fonts = struct.unpack('>II', fh.read(8))
+            if num_fonts > MAX_COLLECTION_FONTS:
+                raise ValueError(f'implausible number of fonts in collection: {num_fonts}')
+            offsets = struct.unpack(f'>{num_fonts}I', fh.read(4 * num_fonts))
+        else:
+            offsets = (0,)
+        for index, offset in enumerate(offsets):
+            names = _read_names(fh, offset)
+            for family_id, style_id in FACE_NAME_IDS:
+                family = names.get(family_id)
+                # Without a typographic subfamily, the legacy subfamily applies
+                style = names.get(style_id) or names.get(2)
+                if family and style and (family, style) not in names_found:
+                    names_found.add((family, style))
+                    faces.append((family, style, index))
+    return faces
+
+
+def _scan_font_file(path):
+    try:
+        return path, read_font_faces(path)
+    except OSError as e:
+        logger.warning(f"Could not read font file {path}: {e}")
+        return path, None
+    except (ValueError, struct.error) as e:
+        logger.debug(f"Skipping invalid font file {path}: {e}")
+        return path, []
+
+
+def scan_font_files(paths):
+    """
+    Return a dict of path -> list of (family, style, index) for the given font files, reading them in parallel.
+
+    Files that could not be read are left out, so they are scanned again next time. Files that are not valid
+    fonts are returned without faces.
+    """
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(FONT_SCAN_WORKERS, len(paths)), thread_name_prefix='font-scan') as executor:
+        return {path: faces for path, faces in executor.map(_scan_font_file, paths) if faces is not None}
+
+
+class FontIndex:
+    """
+    Persistent index of the fonts found in font folders.
+
+    Scanning fonts means reading every file, which takes seconds for large folders. The index remembers the font
+    faces of every file together with its size and modification time, and the contents of every directory
+    together with its modification time. A scan only lists directories that changed and only reads files that are
+    new or changed; everything else comes from the index. The index is stored as JSON in path, if given.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path) if path else None
+        self._directories = {}
+        self._files = {}
+        self._loaded = False
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable font index {self.path}: {e}")
+            return
+        if not isinstance(data, dict) or data.get('version') != FONT_INDEX_VERSION:
+            return
+        self._directories = data.get('directories') or {}
+        self._files = data.get('files') or {}
+
+    def _save(self):
+        if not self.path or not self._changed:
+            return
+        data = {'version': FONT_INDEX_VERSION, 'directories': self._directories, 'files': self._files}
+        try:
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file first so other processes never read a partial index
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                    json.dump(data, fh)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._changed = False
+        except OSError as e:
+            logger.warning(f"Could not write font index {self.path}: {e}")
+
+    def _list_directory(self, directory, mtime):
+        entry = self._directories.get(directory)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry['files'], entry['dirs']
+        files, dirs = [], []
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    if item.is_dir():
+                        dirs.append(item.path)
+                    elif item.name.lower().endswith(FONT_EXTENSIONS) and item.is_file():
+                        files.append(item.path)
+        except OSError as e:
+            logger.warning(f"Could not list font folder {directory}: {e}")
+            return [], []
+        self._directories[directory] = {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(dirs)}
+        self._changed = True
+        return files, dirs
+
+    def _scan_folder(self, folder):
+        """Return the font files below folder with their faces, updating the index."""
+        found = {}
+        to_scan = []
+        pending = [folder]
+        visited = set()
+        listed = set()
+        while pending:
+            directory = pending.pop()
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                continue
+            # Symbolic links may lead to a directory twice
+            if (stat.st_dev, stat.st_ino) in visited:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            listed.add(directory)
+            files, dirs = self._list_directory(directory, stat.st_mtime_ns)
+            pending.extend(dirs)
+            for path in files:
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    continue
+                entry = self._files.get(path)
+                if entry is not None and (entry['size'], entry['mtime']) == (file_stat.st_size, file_stat.st_mtime_ns):
+                    found[path] = entry['faces']
+                else:
+                    to_scan.append((path, file_stat))
+
+        if to_scan:
+            logger.info(f"Scanning {len(to_scan)} new or changed font files in {folder}")
+            faces = scan_font_files([path for path, _ in to_scan])
+            for path, file_stat in to_scan:
+                if path in faces:
+                    self._files[path] = {'size': file_stat.st_size, 'mtime': file_stat.st_mtime_ns,
+                                         'faces': [list(face) for face in faces[path]]}
+                    found[path] = self._files[path]['faces']
+            self._changed = True
+
+        # Forget files and directories below folder that are gone
+        prefix = folder.rstrip(os.sep) + os.sep
+        for table, present in ((self._files, found), (self._directories, listed)):
+            for path in [path for path in table if path == folder or path.startswith(prefix)]:
+                if path not in present:
+                    del table[path]
+                    self._changed = True
+        return found
+
+    def scan(self, folders):
+        """
+        Return a dictionary of the structure file path -> list of (family, style, index) for the fonts below the
+        folders.
+
+        Files are ordered by precedence: fonts of later entries override fonts of earlier ones with the same
+        family and style.
+        """
+        files = {}
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            for folder in folders:
+                folder = os.path.abspath(os.path.expanduser(folder))
+                if not os.path.isdir(folder):
+                    continue
+                for path, faces in sorted(self._scan_folder(folder).items()):
+                    # A folder listed twice takes the precedence of its last position
+                    files.pop(path, None)
+                    files[path] = [tuple(face) for face in faces]
+            self._save()
+        return files
+
+    def directories(self, folders):
+        """Return the indexed directories below the given folders, including the folders themselves."""
+        prefixes = [os.path.abspath(os.path.expanduser(folder)) for folder in folders]
+        with self._lock:
+            return [directory for directory in self._directories
+                    if any(directory == prefix or directory.startswith(prefix.rstrip(os.sep) + os.sep)
+                           for prefix in prefixes)]
+
+    def get_fonts(self, folders):
+        """
+        Return a dictionary of the structure family -> style -> file path for the fonts below the given folders.
+
+        Fonts of later folders take precedence over fonts of earlier ones with the same family and style.
+        """
+        return build_font_map(self.scan(folders))
+
+
+def build_font_map(files):
+    """Return family -> style -> FontPath for a dictionary of file path -> list of (family, style, index)."""
+    fonts = {}
+    for path, faces in files.items():
+        for family, style, index in faces:
+            fonts.setdefault(family, {})[style] = FontPath(path, index)
+            logger.debug("Added this font: " + str((family, style, path)))
     return fonts
+
+
+def apply_font_changes(fonts, removed, added):
+    """
+    Return a copy of the font dictionary family -> style -> FontPath with the faces of removed files taken out and
+    the faces of added files put in, each given as file path -> list of (family, style, index).
+
+    fonts itself is not modified and only the changed families are copied, so the result can replace a dictionary
+    that other threads are reading.
+    """
+    fonts = dict(fonts)
+    copied = set()
+
+    def styles_of(family):
+        if family not in copied:
+            fonts[family] = dict(fonts.get(family, {}))
+            copied.add(family)
+        return fonts.setdefault(family, {})
+
+    for path, faces in removed.items():
+        for family, style, _ in faces:
+            current = fonts.get(family, {}).get(style)
+            # Another file may have replaced the face in the meantime
+            if current is not None and str(current) == path:
+                styles = styles_of(family)
+                del styles[style]
+                if not styles:
+                    del fonts[family]
+    for path, faces in added.items():
+        for family, style, index in faces:
+            styles_of(family)[style] = FontPath(path, index)
+    return fonts
+
+
+FONT_INDEX = FontIndex(DEFAULT_FONT_INDEX_FILE)
+
+
+def configure_font_index(config):
+    """Use the font index file of CACHE.FONT_INDEX_FILE; false disables storing the index."""
+    global FONT_INDEX
+    path = ((config or {}).get('CACHE') or {}).get('FONT_INDEX_FILE', DEFAULT_FONT_INDEX_FILE)
+    path = os.path.expanduser(path) if path else None
+    if path != FONT_INDEX.path:
+        FONT_INDEX = FontIndex(path)
+
+
+def get_fonts(folder=None):
+    """
+    Scan a folder (or the system font folders) for .ttf / .otf / .ttc fonts and
+    return a dictionary of the structure  family -> style -> file path
+
+    folder may also be a list of folders; fonts of later folders take precedence.
+    Only new or changed font files are read, without fontconfig; see FontIndex and read_font_faces.
+    """
+    if isinstance(folder, (list, tuple)):
+        folders = folder
+    else:
+        folders = [folder] if folder else SYSTEM_FONT_DIRS
+    return FONT_INDEX.get_fonts(folders)
+
+
+# Seconds between scans of the watched font folders when inotify is not available
+DEFAULT_FONT_WATCH_INTERVAL = 5
+# Seconds between scans with inotify, in case events were missed, e.g. on network file systems
+INOTIFY_RESCAN_INTERVAL = 300
+# Seconds without further events before a scan starts, so copying many fonts leads to a single scan
+FONT_WATCH_DEBOUNCE = 0.5
+
+
+class _Inotify:
+    """Minimal inotify binding through ctypes. Raises OSError where inotify is not available."""
+
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+            | IN_MOVE_SELF)
+
+    def __init__(self):
+        import ctypes, ctypes.util
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError(f"inotify is not available: {e}")
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._get_errno = ctypes.get_errno
+        self._watches = {}
+
+    def watch(self, directories):
+        """Watch exactly the given directories, adding and removing watches as needed."""
+        directories = set(directories)
+        for directory in set(self._watches) - directories:
+            self._libc.inotify_rm_watch(self.fd, self._watches.pop(directory))
+        for directory in directories - set(self._watches):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                logger.debug(f"Could not watch font folder {directory}: {os.strerror(self._get_errno())}")
+            else:
+                self._watches[directory] = wd
+
+    def read(self):
+        """Consume pending events and return True if there were any."""
+        events = False
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    return events
+            except BlockingIOError:
+                return events
+            events = True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FontWatcher:
+    """
+    Keeps fonts up to date with the files in font folders, in a background thread.
+
+    The folders are scanned through FONT_INDEX, so only new and changed files are read. Where inotify is available
+    a scan starts shortly after a file below the folders changed; otherwise the folders are scanned every interval
+    seconds. After each scan on_change(removed, added) is called with the files whose faces disappeared and
+    appeared, both as file path -> list of (family, style, index), ready for apply_font_changes. The first scan reports
+    every font file as added.
+
+    The thread is started on demand, so worker processes forked from the server start their own.
+
+    Args:
+        get_folders: Callable returning the folders to watch; called before every scan so configuration changes
+            take effect without restarting the watcher
+        on_change: Callable receiving the changes of each scan that found any
+        interval: Seconds between scans without inotify; 0 only scans on request_scan()
+        use_inotify: Whether to use inotify where it is available
+    """
+
+    def __init__(self, get_folders, on_change, interval=DEFAULT_FONT_WATCH_INTERVAL, use_inotify=True):
+        self.get_folders = get_folders
+        self.on_change = on_change
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self._files = {}
+        self._lock = threading.Lock()
+        self._requested = []
+        self._thread = None
+        self._stopped = threading.Event()
+        self._wake = None
+
+    def configure(self, config):
+        """Apply SERVER.FONT_WATCH_INTERVAL from the configuration."""
+        interval = ((config or {}).get('SERVER') or {}).get('FONT_WATCH_INTERVAL')
+        if interval is None:
+            return
+        if isinstance(interval, (int, float)) and not isinstance(interval, bool) and interval >= 0:
+            self.interval = interval
+            with self._lock:
+                self._notify()
+        else:
+            logger.warning(f"Ignoring invalid SERVER.FONT_WATCH_INTERVAL {interval!r}")
+
+    def start(self):
+        """Start the background thread unless it is running, e.g. again in a forked worker process."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._wake = os.pipe()
+            for fd in self._wake:
+                os.set_blocking(fd, False)
+            self._thread = threading.Thread(target=self._run, args=(self._wake,), name='font-watcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread and wait up to timeout seconds for it to finish."""
+        with self._lock:
+            thread = self._thread
+            self._stopped.set()
+            self._notify()
+        if thread is not None:
+            thread.join(timeout)
+
+    def request_scan(self):
+        """
+        Scan the folders as soon as possible, starting the watcher if needed, and return a threading.Event that
+        is set once the changes of that scan have been applied.
+        """
+        done = threading.Event()
+        self.start()
+        with self._lock:
+            self._requested.append(done)
+            self._notify()
+        return done
+
+    def _notify(self):
+        if self._wake is not None:
+            try:
+                os.write(self._wake[1], b'x')
+            except (BlockingIOError, OSError):
+                # A full pipe wakes the thread just as well
+                pass
+
+    def _open_inotify(self):
+        if not self.use_inotify:
+            return None
+        try:
+            return _Inotify()
+        except OSError as e:
+            logger.info(f"Watching font folders by polling: {e}")
+            return None
+
+    def _run(self, wake):
+        import select
+        inotify = self._open_inotify()
+        wake_read, wake_write = wake
+        try:
+            while not self._stopped.is_set():
+                with self._lock:
+                    requested, self._requested = self._requested, []
+                try:
+                    folders = [folder for folder in self.get_folders() if folder]
+                    self._scan(folders)
+                    if inotify is not None:
+                        inotify.watch(FONT_INDEX.directories(folders))
+                except Exception:
+                    logger.exception("Scanning the font folders failed")
+                finally:
+                    for done in requested:
+                        done.set()
+
+                if inotify is not None:
+                    timeout = INOTIFY_RESCAN_INTERVAL
+                else:
+                    timeout = self.interval or None
+                readable, _, _ = select.select([wake_read] + ([inotify.fd] if inotify else []), [], [], timeout)
+                if inotify is not None and inotify.fd in readable:
+                    # Wait until the files stopped changing
+                    while inotify.read() and not self._stopped.is_set():
+                        if not select.select([inotify.fd], [], [], FONT_WATCH_DEBOUNCE)[0]:
+                            break
+                if wake_read in readable:
+                    try:
+                        while os.read(wake_read, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+        finally:
+            if inotify is not None:
+                inotify.close()
+            os.close(wake_read)
+            os.close(wake_write)
+            with self._lock:
+                if self._wake is wake:
+                    self._wake = None
+
+    def _scan(self, folders):
+        files = FONT_INDEX.scan(folders)
+        previous, self._files = self._files, files
+        removed = {path: faces for path, faces in previous.items() if files.get(path) != faces}
+        added = {path: faces for path, faces in files.items() if previous.get(path) != faces}
+        # A face of a removed file may still be provided by another watched file it had replaced
+        lost = ({face[:2] for faces in removed.values() for face in faces}
+                - {face[:2] for faces in added.values() for face in faces})
+        for path, faces in files.items():
+            for face in faces:
+                if face[:2] in lost:
+                    added.setdefault(path, []).append(face)
+        if removed or added:
+            logger.info(f"Font folders changed: {len(removed)} font files removed or changed, "
+                        f"{len(added)} added or changed")
+            self.on_change(removed, added)
@@ -1,12 +1,34 @@
 # NOTE: Requires the 'pycups' library. Install with: pip install pycups
 import cups
+import io
+import os
 import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from cache_helpers import LRUCache
 from constants import PARSEABLE_SIZE_PATTERN
 from configuration_management import split_server_and_port
 
 # Conversion constants
 POINTS_PER_INCH = 72.0  # PostScript/CUPS points per inch
 
+# Print spooling
+PRINT_JOB_TITLE = "grocy"
+DOCUMENT_FORMAT = "image/png"
+HTTP_CONTINUE = 100  # Status returned by writeRequestData while CUPS accepts more data
+DEFAULT_BATCH_JOB_SIZE = 100  # Documents per CUPS job when printing a batch of labels
+
+# Names of the IPP job-state values (RFC 8011, section 5.3.7)
+JOB_STATES = {3: "pending", 4: "pending-held", 5: "processing", 6: "processing-stopped",
+              7: "canceled", 8: "aborted", 9: "completed"}
+
+# Printer attributes used while rendering and printing; they are fetched together and cached per printer
+PRINTER_ATTRIBUTES = ["media-supported", "media-size-supported", "media-default", "printer-resolution-default"]
+DEFAULT_ATTRIBUTE_CACHE_TTL = 60  # seconds
+
 # Printer-specific settings
 # Set these based on your printer and loaded labels
 
@@ -33,6 +55,77 @@ POINTS_PER_INCH = 72.0  # PostScript/CUPS points per inch
 
 # End of Printer Specific Settings
 
+
+class CupsConnectionPool:
+    """
+    Thread-safe pool of reusable CUPS connections, kept per (host, port).
+
+    A pycups Connection must not be used by two threads at once, so every connection is checked out by one
+    thread at a time. Connections that raised an error are dropped instead of being returned to the pool, and
+    connections that were idle for longer than health_check_interval seconds are checked before they are
+    reused. Connections are opened with an explicit host and port, so the process-global cups.setServer and
+    cups.setPort settings are never touched.
+    """
+
+    def __init__(self, max_idle=4, health_check_interval=30):
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self._idle = {}  # (host, port) -> [(connection, time it was returned), ...]
+        self._checked_out = {}  # id(connection) -> ((host, port), connection)
+        self._lock = threading.Lock()
+
+    def acquire(self, host, port):
+        """Check out a connection to host:port, reusing an idle one if it is still healthy."""
+        key = (host, port)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn, returned = idle.pop() if idle else (None, None)
+            if conn is None:
+                conn = cups.Connection(host=host, port=port)
+                break
+            if time.monotonic() - returned < self.health_check_interval or self._is_healthy(conn):
+                break
+        with self._lock:
+            self._checked_out[id(conn)] = (key, conn)
+        return conn
+
+    def release(self, conn, healthy=True):
+        """Return a connection to the pool; unhealthy connections and connections from elsewhere are dropped."""
+        with self._lock:
+            entry = self._checked_out.pop(id(conn), None)
+            if entry is None or not healthy:
+                return
+            idle = self._idle.setdefault(entry[0], [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self, host, port):
+        conn = self.acquire(host, port)
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            self.release(conn, healthy)
+
+    def clear(self):
+        """Drop all idle connections."""
+        with self._lock:
+            self._idle.clear()
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.getDefault()
+            return True
+        except Exception:
+            return False
+
+
+CONNECTION_POOL = CupsConnectionPool()
+
 class implementation:
 
     def __init__(self):
@@ -46,6 +139,7 @@ class implementation:
         self.selected_printer = None
         self.initialization_errors = []  # Track initialization and CUPS errors
         self.cups_default = None  # Track CUPS-reported default printer
+        self._attribute_cache = LRUCache(None, maxsize=32, ttl=DEFAULT_ATTRIBUTE_CACHE_TTL)
 
     def initialize(self, config):
         self.CONFIG = config
@@ -61,20 +155,26 @@ class implementation:
             error_msg = "No printer configuration found in config file. Using defaults."
             self.initialization_errors.append(error_msg)
 
+        # Printers or the server may have changed, so start with an empty attribute cache
+        ttl = self.CONFIG['PRINTER'].get('ATTRIBUTE_CACHE_TTL', DEFAULT_ATTRIBUTE_CACHE_TTL)
+        if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl < 0:
+            self.initialization_errors.append(
+                f"Invalid PRINTER.ATTRIBUTE_CACHE_TTL '{ttl}', using {DEFAULT_ATTRIBUTE_CACHE_TTL} seconds.")
+            ttl = DEFAULT_ATTRIBUTE_CACHE_TTL
+        self._attribute_cache = LRUCache(None, maxsize=32 if ttl else 0, ttl=ttl or None)
+
         if 'SERVER' in self.CONFIG['PRINTER']:
             self.server_ip = self.CONFIG['PRINTER']['SERVER']
 
         self.server_host, self.server_port = split_server_and_port(self.server_ip)
-        cups.setServer(self.server_host)
-        cups.setPort(self.server_port)
 
         # Test CUPS connection
         try:
             # Try to connect to verify the server is accessible
-            conn = self._get_conn()
-            # Verify we can get printers to ensure full connectivity
-            _ = conn.getPrinters()
-            self.cups_default = conn.getDefault() or None
+            with self._connection() as conn:
+                # Verify we can get printers to ensure full connectivity
+                _ = conn.getPrinters()
+                self.cups_default = conn.getDefault() or None
         except Exception as e:
             server_display = self.server_host or 'localhost'
             if self.server_port:
@@ -90,7 +190,19 @@ class implementation:
         return ''
 
     def _get_conn(self):
-        return cups.Connection()
+        """Check out a pooled connection to the configured server; return it with CONNECTION_POOL.release()."""
+        return CONNECTION_POOL.acquire(self.server_host, self.server_port)
+
+    @contextmanager
+    def _connection(self):
+        """Use a pooled connection for the duration of a with block."""
+        conn = self._get_conn()
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            CONNECTION_POOL.release(conn, healthy)
 
     def validate_connectivity(self, payload):
         payload = payload or {}
@@ -98,24 +210,29 @@ class implementation:
             payload = {}
         server = payload.get('server') or 'localhost'
 
-        old_server = cups.getServer()
-        old_port = cups.getPort() if hasattr(cups, 'getPort') else None
-        if not isinstance(old_port, int):
-            old_port = None
-
         server_host, server_port = split_server_and_port(server)
         try:
-            cups.setServer(server_host)
-            cups.setPort(server_port)
-            conn = cups.Connection()
-            printers = list(conn.getPrinters().keys())
+            with CONNECTION_POOL.connection(server_host, server_port) as conn:
+                printers = list(conn.getPrinters().keys())
             return {'success': True, 'server': server, 'printers': printers}
         except Exception as e:
             return {'success': False, 'error': str(e), 'server': server}
-        finally:
-            cups.setServer(old_server)
-            if old_port is not None:
-                cups.setPort(old_port)
+
+    def _get_printer_attributes(self, printerName):
+        """
+        Return the PRINTER_ATTRIBUTES of a printer, fetched from CUPS with a single request and cached for
+        PRINTER.ATTRIBUTE_CACHE_TTL seconds. Errors are raised to the caller and not cached.
+        """
+        attrs = self._attribute_cache.get(printerName)
+        if attrs is None:
+            with self._connection() as conn:
+                attrs = self._attribute_cache.put(
+                    printerName, conn.getPrinterAttributes(printerName, requested_attributes=PRINTER_ATTRIBUTES))
+        return attrs
+
+    def invalidate_printer_attributes(self, printerName=None):
+        """Forget cached attributes of one printer, or of all printers when printerName is None."""
+        self._attribute_cache.invalidate(printerName)
 
     def _get_printer_name(self, printerName=None):
         if printerName:
@@ -123,7 +240,8 @@ class implementation:
         if self.selected_printer:
             return self.selected_printer
         try:
-            return self._get_conn().getDefault()
+            with self._connection() as conn:
+                return conn.getDefault()
         except Exception:
             return None
 
@@ -164,8 +282,7 @@ class implementation:
 
         # Priority 2: Try to get from CUPS
         try:
-            conn = self._get_conn()
-            attrs = conn.getPrinterAttributes(printerName, requested_attributes=["printer-resolution-default"])
+            attrs = self._get_printer_attributes(printerName)
             resolution = attrs.get("printer-resolution-default")
             if resolution:
                 # Resolution is typically (xdpi, ydpi, units) where:
@@ -279,9 +396,7 @@ class implementation:
         # Try to get dimensions from CUPS media-size-supported (only if CUPS enabled)
         if self._should_use_cups():
             try:
-                conn = self._get_conn()
-                attrs = conn.getPrinterAttributes(printerName,
-                    requested_attributes=["media-size-supported", "media-supported"])
+                attrs = self._get_printer_attributes(printerName)
 
                 media_supported = attrs.get("media-supported", [])
                 media_sizes = attrs.get("media-size-supported", [])
@@ -362,9 +477,8 @@ class implementation:
         # Only attempt CUPS query if we have a valid printer name
         if printer_name:
             try:
-                conn = self._get_conn()
                 # Get all supported media from CUPS (includes standard and custom CUPS sizes)
-                attrs = conn.getPrinterAttributes(printer_name, requested_attributes=["media-supported"])
+                attrs = self._get_printer_attributes(printer_name)
                 media_supported = attrs.get("media-supported", [])
 
                 for media in media_supported:
@@ -413,8 +527,7 @@ class implementation:
         # CUPS is enabled, try to query it
         printerName = self._get_printer_name(printerName)
         try:
-            conn = self._get_conn()
-            attrs = conn.getPrinterAttributes(printerName, requested_attributes=["media-default"])
+            attrs = self._get_printer_attributes(printerName)
             media_default = attrs.get("media-default")
             if media_default:
                 # Return the full CUPS media name as the key
@@ -430,8 +543,8 @@ class implementation:
 
     def get_printer_properties(self, printerName=None):
         printerName = self._get_printer_name(printerName)
-        conn = self._get_conn()
-        return conn.getPrinterAttributes(printerName, requested_attributes=["media-default", "media-supported", "printer-resolution-supported", "printer-resolution-default"])
+        with self._connection() as conn:
+            return conn.getPrinterAttributes(printerName, requested_attributes=["media-default", "media-supported", "printer-resolution-supported", "printer-resolution-default"])
 
     def get_label_dimensions(self, label_size, printerName=None):
         """
@@ -516,8 +629,8 @@ class implementation:
 
         # CUPS is enabled, try to query it
         try:
-            conn = self._get_conn()
-            printers = list(conn.getPrinters().keys())
+            with self._connection() as conn:
+                printers = list(conn.getPrinters().keys())
         except Exception as e:
             error_msg = f"Error getting list of printers from CUPS server: {str(e)}"
             print(error_msg)
@@ -527,71 +640,220 @@ class implementation:
             printers = []
         return printers
 
+    def _get_job_printer(self, conn, context):
+        printer_name = context.get("printer")
+        if printer_name is None:
+            print("No printer specified in Context")
+            printer_name = self.CONFIG['PRINTER'].get("PRINTER")
+        if printer_name is None:
+            print("No printer specified in Config")
+            printer_name = str(conn.getDefault())
+        return printer_name
+
+    def _get_print_options(self, printer_name, context, copies=None):
+        """Return the CUPS job options for the context; copies defaults to the quantity in the context."""
+        # Build print options with copies and media size
+        options = {"copies": str(context.get("quantity", 1) if copies is None else copies)}
+
+        # Add media size to options if specified in context
+        label_size = context.get("label_size")
+        if label_size:
+            should_add_media = False
+            cups_media_name = label_size  # Default to the original label size
+
+            if self._should_use_cups():
+                # Verify the selected media is available on this printer (only if CUPS enabled)
+                try:
+                    attrs = self._get_printer_attributes(printer_name)
+                    media_supported = attrs.get("media-supported", [])
+
+                    # Check if the selected media is in the CUPS supported list
+                    if label_size in media_supported:
+                        # Media is available in CUPS, pass it as-is
+                        should_add_media = True
+                    else:
+                        # Check if it's a custom size from config
+                        config_sizes = self.CONFIG.get('PRINTER', {}).get('LABEL_SIZES', {})
+                        if isinstance(config_sizes, dict) and label_size in config_sizes:
+                            # It's a custom config size, convert it to CUPS format
+                            cups_media_name = self._convert_to_cups_media_format(label_size, printer_name)
+                            should_add_media = True
+                            print(f"Info: Using custom config size '{label_size}' (converted to '{cups_media_name}') for printer '{printer_name}'.")
+                        elif isinstance(config_sizes, list) and any(size[0] == label_size for size in config_sizes):
+                            # It's in the config list format, convert it
+                            cups_media_name = self._convert_to_cups_media_format(label_size, printer_name)
+                            should_add_media = True
+                            print(f"Info: Using custom config size '{label_size}' (converted to '{cups_media_name}') for printer '{printer_name}'.")
+                        else:
+                            print(f"Warning: Selected media '{label_size}' not available on printer '{printer_name}'. Attempting to use selected size anyway.")
+                            should_add_media = True
+                except Exception as e:
+                    print(f"Warning: Could not verify media availability: {e}. Attempting to use selected size anyway.")
+                    should_add_media = True
+            else:
+                # CUPS is disabled, pass media size directly without verification
+                should_add_media = True
+
+            if should_add_media:
+                options["media"] = cups_media_name
+
+        return options
+
     def print_label(self, im, **context):
         return_dict = {'success': False, 'message': ''}
+        conn = None
         try:
             print(context)
-            im.save('sample-out.png')
-            quantity = context.get("quantity", 1)
+            document = self._encode_document(im)
+            self._dump_debug_document(document)
             conn = self._get_conn()
-            printer_name = context.get("printer")
-            if printer_name is None:
-                print("No printer specified in Context")
-                printer_name = self.CONFIG['PRINTER'].get("PRINTER")
-            if printer_name is None:
-                print("No printer specified in Config")
-                printer_name = str(conn.getDefault())
-
-            # Build print options with copies and media size
-            options = {"copies": str(quantity)}
-
-            # Add media size to options if specified in context
-            label_size = context.get("label_size")
-            if label_size:
-                should_add_media = False
-                cups_media_name = label_size  # Default to the original label size
-
-                if self._should_use_cups():
-                    # Verify the selected media is available on this printer (only if CUPS enabled)
-                    try:
-                        attrs = conn.getPrinterAttributes(printer_name, requested_attributes=["media-supported"])
-                        media_supported = attrs.get("media-supported", [])
-
-                        # Check if the selected media is in the CUPS supported list
-                        if label_size in media_supported:
-                            # Media is available in CUPS, pass it as-is
-                            should_add_media = True
-                        else:
-                            # Check if it's a custom size from config
-                            config_sizes = self.CONFIG.get('PRINTER', {}).get('LABEL_SIZES', {})
-                            if isinstance(config_sizes, dict) and label_size in config_sizes:
-                                # It's a custom config size, convert it to CUPS format
-                                cups_media_name = self._convert_to_cups_media_format(label_size, printer_name)
-                                should_add_media = True
-                                print(f"Info: Using custom config size '{label_size}' (converted to '{cups_media_name}') for printer '{printer_name}'.")
-                            elif isinstance(config_sizes, list) and any(size[0] == label_size for size in config_sizes):
-                                # It's in the config list format, convert it
-                                cups_media_name = self._convert_to_cups_media_format(label_size, printer_name)
-                                should_add_media = True
-                                print(f"Info: Using custom config size '{label_size}' (converted to '{cups_media_name}') for printer '{printer_name}'.")
-                            else:
-                                print(f"Warning: Selected media '{label_size}' not available on printer '{printer_name}'. Attempting to use selected size anyway.")
-                                should_add_media = True
-                    except Exception as e:
-                        print(f"Warning: Could not verify media availability: {e}. Attempting to use selected size anyway.")
-                        should_add_media = True
-                else:
-                    # CUPS is disabled, pass media size directly without verification
-                    should_add_media = True
-
-                if should_add_media:
-                    options["media"] = cups_media_name
+            printer_name = self._get_job_printer(conn, context)
+            options = self._get_print_options(printer_name, context)
 
             print(printer_name, options)
-            conn.printFile(printer_name, 'sample-out.png', "grocy", options)
+            return_dict['job_id'] = self._submit_document(conn, printer_name, document, options)
 
             return_dict['success'] = True
         except Exception as e:
             return_dict['success'] = False
             return_dict['message'] = str(e)
+        finally:
+            if conn is not None:
+                CONNECTION_POOL.release(conn, return_dict['success'])
         return return_dict
+
+    @staticmethod
+    def _encode_document(im):
+        """Encode the label as PNG in memory."""
+        buffer = io.BytesIO()
+        im.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def _dump_debug_document(self, document):
+        """Save a copy of the printed document if PRINTER.DEBUG_DUMP_DIR is configured."""
+        dump_dir = self.CONFIG.get('PRINTER', {}).get('DEBUG_DUMP_DIR')
+        if not dump_dir:
+            return
+        try:
+            os.makedirs(dump_dir, exist_ok=True)
+            path = os.path.join(dump_dir, f"label-{uuid.uuid4().hex}.png")
+            with open(path, 'wb') as f:
+                f.write(document)
+            print(f"Info: Saved printed label to '{path}'")
+        except OSError as e:
+            print(f"Warning: Could not save debug copy of label: {e}")
+
+    def print_labels(self, labels, **context):
+        """
+        Print a batch of labels as one CUPS job with a document per label, or as a few jobs of at most
+        PRINTER.BATCH_JOB_SIZE documents each.
+
+        labels is a list of (im, copies), where im is an image or an already encoded PNG document. Every label is
+        encoded once and its document repeated copies times.
+        Returns a result per label like print_label's, with the id of the job the label was printed in.
+        """
+        results = [{'success': False, 'message': ''} for _ in labels]
+        job_size = self.CONFIG.get('PRINTER', {}).get('BATCH_JOB_SIZE', DEFAULT_BATCH_JOB_SIZE)
+        if not isinstance(job_size, int) or job_size < 1:
+            job_size = DEFAULT_BATCH_JOB_SIZE
+        conn = None
+        healthy = True
+        try:
+            conn = self._get_conn()
+            printer_name = self._get_job_printer(conn, context)
+            options = self._get_print_options(printer_name, context, copies=1)
+            print(printer_name, options, f"{len(labels)} labels")
+            for chunk in self._batch_chunks(labels, job_size):
+                try:
+                    documents = []
+                    for index in chunk:
+                        im, copies = labels[index]
+                        document = im if isinstance(im, bytes) else self._encode_document(im)
+                        self._dump_debug_document(document)
+                        documents.extend([document] * copies)
+                    job_id = self._submit_documents(conn, printer_name, documents, options)
+                except Exception as e:
+                    healthy = False
+                    for index in chunk:
+                        results[index]['message'] = str(e)
+                    continue
+                for index in chunk:
+                    results[index].update(success=True, job_id=job_id)
+        except Exception as e:
+            healthy = False
+            for result in results:
+                result['message'] = str(e)
+        finally:
+            if conn is not None:
+                CONNECTION_POOL.release(conn, healthy)
+        return results
+
+    @staticmethod
+    def _batch_chunks(labels, job_size):
+        """Split label indices into consecutive chunks of at most job_size documents, counting copies."""
+        chunk, documents = [], 0
+        for index, (_, copies) in enumerate(labels):
+            if chunk and documents + copies > job_size:
+                yield chunk
+                chunk, documents = [], 0
+            chunk.append(index)
+            documents += copies
+        if chunk:
+            yield chunk
+
+    def _submit_document(self, conn, printer_name, document, options):
+        """Send an encoded document to CUPS and return the job id."""
+        return self._submit_documents(conn, printer_name, [document], options)
+
+    def _submit_documents(self, conn, printer_name, documents, options):
+        """
+        Send encoded documents to CUPS as a single job and return the job id.
+
+        The documents are streamed from memory with createJob/startDocument/writeRequestData. Connections that do
+        not support streaming fall back to printFiles with temporary files private to this job, so concurrent
+        print requests never share a file.
+        """
+        if not hasattr(conn, 'createJob'):
+            paths = []
+            try:
+                for document in documents:
+                    fd, path = tempfile.mkstemp(prefix='label-', suffix='.png')
+                    paths.append(path)
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(document)
+                if len(paths) == 1:
+                    return conn.printFile(printer_name, paths[0], PRINT_JOB_TITLE, options)
+                return conn.printFiles(printer_name, paths, PRINT_JOB_TITLE, options)
+            finally:
+                for path in paths:
+                    os.unlink(path)
+
+        job_id = conn.createJob(printer_name, PRINT_JOB_TITLE, options)
+        try:
+            for number, document in enumerate(documents, 1):
+                last_document = 1 if number == len(documents) else 0
+                conn.startDocument(printer_name, job_id, "label.png", DOCUMENT_FORMAT, last_document)
+                status = conn.writeRequestData(document, len(document))
+                if status != HTTP_CONTINUE:
+                    raise RuntimeError(f"CUPS rejected the label data (HTTP status {status})")
+                conn.finishDocument(printer_name)
+        except Exception:
+            try:
+                conn.cancelJob(job_id)
+            except Exception:
+                pass
+            raise
+        return job_id
+
+    def get_job_state(self, job_id):
+        """
+        Return the state of a CUPS job as a dict with its IPP job-state name (e.g. "processing" or "completed")
+        and job-state-reasons.
+        """
+        with self._connection() as conn:
+            attrs = conn.getJobAttributes(job_id, requested_attributes=["job-state", "job-state-reasons"])
+        state = attrs.get("job-state")
+        reasons = attrs.get("job-state-reasons", [])
+        if isinstance(reasons, str):
+            reasons = [reasons]
+        return {'state': JOB_STATES.get(state, str(state)), 'reasons': list(reasons)}
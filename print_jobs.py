@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""
+Background print job queue.
+
+The print endpoints only validate a request and enqueue it; a small pool of worker threads renders the label and
+submits it to CUPS. Every job gets an ID under which its progress can be looked up:
+
+    queued -> rendering -> submitted -> completed
+                      \\          \\
+                       failed     failed
+
+A job is "submitted" once CUPS accepted it. Whether the printer finished it is only known to CUPS, so the state
+of submitted jobs is refreshed from the CUPS job state when they are looked up.
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RENDERING = 'rendering'
+SUBMITTED = 'submitted'
+COMPLETED = 'completed'
+FAILED = 'failed'
+PENDING_STATES = (QUEUED, RENDERING)
+FINAL_STATES = (COMPLETED, FAILED)
+
+# CUPS job states (see implementation_cups.JOB_STATES) that finish a submitted job
+CUPS_COMPLETED_STATES = ('completed',)
+CUPS_FAILED_STATES = ('canceled', 'aborted')
+
+
+class PrintJob:
+    """A queued print request and its progress."""
+
+    def __init__(self, render, print_image, info=None):
+        self.id = uuid.uuid4().hex
+        self.state = QUEUED
+        self.info = dict(info or {})
+        self.error = None
+        self.cups_job_id = None
+        self.cups_state = None
+        self.created = self.updated = time.time()
+        self._render = render
+        self._print_image = print_image
+        self._finished = threading.Event()
+
+    def set_state(self, state, **changes):
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.state = state
+        self.updated = time.time()
+        if state not in PENDING_STATES:
+            # Submitted counts as finished for callers waiting for the job to leave this process
+            self._finished.set()
+
+    def wait(self, timeout=None):
+        """Wait until the job was submitted to CUPS or failed. Returns False if timeout expired first."""
+        return self._finished.wait(timeout)
+
+    def refresh_cups_state(self, get_job_state):
+        """Update a submitted job from its CUPS job state, using get_job_state(cups_job_id)."""
+        if self.state != SUBMITTED or self.cups_job_id is None:
+            return
+        try:
+            cups_state = get_job_state(self.cups_job_id)
+        except Exception as e:
+            logger.debug(f"Could not get the state of CUPS job {self.cups_job_id}: {e}")
+            return
+        if cups_state['state'] in CUPS_COMPLETED_STATES:
+            self.set_state(COMPLETED, cups_state=cups_state)
+        elif cups_state['state'] in CUPS_FAILED_STATES:
+            self.set_state(FAILED, cups_state=cups_state,
+                           error=f"CUPS job {cups_state['state']}: {', '.join(cups_state['reasons'])}")
+        else:
+            self.cups_state = cups_state
+
+    def as_dict(self):
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'error': self.error,
+            'cups_job_id': self.cups_job_id,
+            'cups_state': self.cups_state,
+            'created': self.created,
+            'updated': self.updated,
+            **self.info,
+        }
+
+
+class PrintJobQueue:
+    """
+    Runs print jobs on a pool of worker threads in the order they were submitted.
+
+    Args:
+        workers: Number of jobs rendered and submitted at the same time. With one worker, labels are sent to
+            CUPS in the order they were requested.
+        history: Number of finished jobs whose state is kept for lookups
+    """
+
+    def __init__(self, workers=1, history=1000):
+        self.workers = workers
+        self.history = history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._closed = False
+
+    def configure(self, config):
+        """Apply PRINTER.JOB_WORKERS and PRINTER.JOB_HISTORY from the configuration."""
+        settings = (config or {}).get('PRINTER') or {}
+        for key, attribute, minimum in (('JOB_WORKERS', 'workers', 1), ('JOB_HISTORY', 'history', 0)):
+            value = settings.get(key)
+            if value is None:
+                continue
+            if isinstance(value, int) and not isinstance(value, bool) and value >= minimum:
+                setattr(self, attribute, value)
+            else:
+                logger.warning(f"Ignoring invalid PRINTER.{key} {value!r}")
+        with self._lock:
+            # Surplus workers stop after their current job
+            for _ in range(len(self._alive_threads()) - self.workers):
+                self._queue.put(None)
+
+    def _alive_threads(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        return self._threads
+
+    def _start_workers(self):
+        # Started on demand, so worker processes forked from the server start their own threads
+        for _ in range(self.workers - len(self._alive_threads())):
+            thread = threading.Thread(target=self._work, name='print-job-worker', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, render, print_image, **info):
+        """
+        Queue a job and return it.
+
+        render() must return the label image and print_image(im) submit it, returning a dict like
+        implementation.print_label with 'success', 'job_id' and 'message'. Extra keyword arguments are reported
+        with the job's state.
+        """
+        job = PrintJob(render, print_image, info)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The print job queue is closed')
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+            self._start_workers()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """Return the job with the given ID, or None if it is unknown or was forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        """Return the number of jobs that are queued or being rendered."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state in PENDING_STATES)
+
+    def close(self, timeout=None):
+        """
+        Stop accepting jobs and wait up to timeout seconds for the queued ones to be submitted or fail.
+
+        Returns False if jobs were still pending when timeout expired.
+        """
+        with self._lock:
+            self._closed = True
+            jobs = [job for job in self._jobs.values() if job.state in PENDING_STATES]
+            # Workers stop once the jobs queued before them are done
+            for _ in self._alive_threads():
+                self._queue.put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in jobs:
+            if not job.wait(None if deadline is None else max(0, deadline - time.monotonic())):
+                return False
+        return True
+
+    def _forget_finished_jobs(self):
+        # Jobs that are still running are never dropped, even if there are more than history of them
+        finished = [job_id for job_id, job in self._jobs.items() if job.state not in PENDING_STATES]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._run(job)
+
+    @staticmethod
+    def _run(job):
+        try:
+            job.set_state(RENDERING)
+            im = job._render()
+            result = job._print_image(im)
+        except Exception as e:
+            logger.exception(f"Print job {job.id} failed")
+            job.set_state(FAILED, error=str(e))
+            return
+        finally:
+            job._render = job._print_image = None
+
+        if result.get('success'):
+            job.set_state(SUBMITTED, cups_job_id=result.get('job_id'))
+        else:
+            job.set_state(FAILED, error=result.get('message') or result.get('error') or 'Printing failed')
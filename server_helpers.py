@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+
+"""
+WSGI server backends for running the web service with more than one request in flight.
+
+The SERVER.BACKEND setting selects one of:
+
+- "wsgiref": bottle's default single-threaded development server
+- "threaded": one process with a fixed pool of worker threads (the default)
+- "prefork": several processes, forked after binding the port, each with its own pool of worker threads
+- "gunicorn": gunicorn's pre-fork server, with a configurable worker class (e.g. "gevent" for async workers)
+
+All backends finish the requests in flight when the process receives SIGTERM or SIGINT, for at most
+SERVER.SHUTDOWN_TIMEOUT seconds. The on_shutdown callables passed to run_server are then called in every serving
+process with the seconds left of that timeout, e.g. to finish queued print jobs.
+"""
+
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import bottle
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('wsgiref', 'threaded', 'prefork', 'gunicorn')
+
+DEFAULT_SERVER_SETTINGS = {
+    'BACKEND': 'threaded',
+    'WORKERS': 8,
+    'THREADS': 4,
+    'REQUEST_TIMEOUT': 30,
+    'SHUTDOWN_TIMEOUT': 10,
+    'WORKER_CLASS': 'gthread',
+}
+
+
+def get_server_settings(config):
+    """
+    Return the server settings from the SERVER section of config, with defaults for missing or invalid values.
+
+    Invalid values are logged as a warning.
+    """
+    section = (config or {}).get('SERVER') or {}
+    settings = dict(DEFAULT_SERVER_SETTINGS)
+
+    backend = section.get('BACKEND', settings['BACKEND'])
+    if backend in BACKENDS:
+        settings['BACKEND'] = backend
+    else:
+        logger.warning(f"Unknown server backend {backend!r}, using '{settings['BACKEND']}'. "
+                       f"Valid backends are: {', '.join(BACKENDS)}")
+
+    for key in ('WORKERS', 'THREADS', 'REQUEST_TIMEOUT', 'SHUTDOWN_TIMEOUT'):
+        value = section.get(key, settings[key])
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            settings[key] = value
+        else:
+            logger.warning(f"Ignoring invalid SERVER.{key} {value!r}, using {settings[key]}")
+    settings['WORKERS'] = int(settings['WORKERS'])
+    settings['THREADS'] = int(settings['THREADS'])
+
+    worker_class = section.get('WORKER_CLASS', settings['WORKER_CLASS'])
+    if isinstance(worker_class, str) and worker_class:
+        settings['WORKER_CLASS'] = worker_class
+    return settings
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that logs requests through logging instead of printing every line to stderr."""
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """
+    WSGI server that hands every accepted connection to a fixed pool of worker threads.
+
+    The worker threads are started by serve_forever(), so a server can be created before forking and served in
+    every child process.
+
+    Args:
+        server_address: (host, port) to bind to
+        app: The WSGI application
+        threads: Number of requests handled concurrently; further connections wait for a free thread
+        request_timeout: Seconds a client may take to send its request or receive the response
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, server_address, app, threads=8, request_timeout=30, handler_class=QuietRequestHandler):
+        super().__init__(server_address, handler_class)
+        self.set_app(app)
+        self.threads = threads
+        self.request_timeout = request_timeout
+        self._connections = queue.Queue()
+        self._workers = []
+        self._pending = 0
+        self._pending_changed = threading.Condition()
+        # Every process serving a forked server polls the shared socket; whoever loses the race must not block
+        self.socket.setblocking(False)
+
+    def _start_workers(self):
+        if self._workers:
+            return
+        for number in range(self.threads):
+            worker = threading.Thread(target=self._work, name=f'label-web-worker-{number}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def serve_forever(self, poll_interval=0.5):
+        self._start_workers()
+        super().serve_forever(poll_interval)
+
+    def get_request(self):
+        connection, client_address = super().get_request()
+        connection.settimeout(self.request_timeout)
+        return connection, client_address
+
+    def process_request(self, request, client_address):
+        with self._pending_changed:
+            self._pending += 1
+        self._connections.put((request, client_address))
+
+    def _work(self):
+        while True:
+            item = self._connections.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._pending_changed:
+                    self._pending -= 1
+                    self._pending_changed.notify_all()
+
+    def handle_error(self, request, client_address):
+        # Clients that stop sending are expected; everything else is worth a traceback
+        if isinstance(sys.exc_info()[1], TimeoutError):
+            logger.debug(f"Request from {client_address[0]} timed out after {self.request_timeout}s")
+        else:
+            logger.exception(f"Error while handling a request from {client_address[0]}")
+
+    def wait_for_requests(self, timeout=None):
+        """Wait until every accepted request is finished. Returns False if timeout expired first."""
+        with self._pending_changed:
+            return self._pending_changed.wait_for(lambda: self._pending == 0, timeout)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._connections.put(None)
+        self._workers = []
+
+
+def _stop_on_signals(server):
+    """Make SIGTERM and SIGINT stop server.serve_forever(), which must be running in the main thread."""
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        # shutdown() waits for serve_forever() to return, so it cannot be called from the serving thread itself
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+
+def _serve(server, shutdown_timeout, on_shutdown=()):
+    _stop_on_signals(server)
+    try:
+        server.serve_forever()
+    finally:
+        # Stop accepting connections, then give the requests in flight time to complete
+        deadline = time.monotonic() + shutdown_timeout
+        server.socket.close()
+        if not server.wait_for_requests(shutdown_timeout):
+            logger.warning(f"Requests still running after {shutdown_timeout}s, shutting down anyway")
+        server.server_close()
+        _run_shutdown_hooks(on_shutdown, deadline)
+
+
+def _run_shutdown_hooks(on_shutdown, deadline):
+    for hook in on_shutdown:
+        try:
+            hook(max(0, deadline - time.monotonic()))
+        except Exception:
+            logger.exception('Error while shutting down')
+
+
+def run_threaded(app, host, port, threads, request_timeout, shutdown_timeout, on_shutdown=()):
+    """Serve app from a pool of worker threads until SIGTERM or SIGINT."""
+    server = ThreadPoolWSGIServer((host, port), app, threads=threads, request_timeout=request_timeout)
+    logger.info(f"Listening on http://{host}:{server.server_port}/ with {threads} worker threads")
+    _serve(server, shutdown_timeout, on_shutdown)
+
+
+def run_prefork(app, host, port, processes, threads, request_timeout, shutdown_timeout, after_fork=(),
+                on_shutdown=()):
+    """
+    Serve app from several forked processes sharing one listening socket, until SIGTERM or SIGINT.
+
+    Worker processes that exit unexpectedly are replaced. Each callable in after_fork is called in every new
+    worker process before it starts serving, e.g. to drop connections inherited from the parent.
+    """
+    server = ThreadPoolWSGIServer((host, port), app, threads=threads, request_timeout=request_timeout)
+    logger.info(f"Listening on http://{host}:{server.server_port}/ with {processes} processes "
+                f"of {threads} threads each")
+    children = set()
+    stopping = threading.Event()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                for hook in after_fork:
+                    hook()
+                _serve(server, shutdown_timeout, on_shutdown)
+            except BaseException:
+                logger.exception('Worker process failed')
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children.add(pid)
+
+    def handle_signal(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    for _ in range(processes):
+        spawn()
+    deadline = None
+    try:
+        while children:
+            if stopping.is_set() and deadline is None:
+                deadline = time.monotonic() + shutdown_timeout
+                _signal_children(children, signal.SIGTERM)
+            if deadline is not None and time.monotonic() > deadline:
+                logger.warning(f"Worker processes still running after {shutdown_timeout}s, killing them")
+                _signal_children(children, signal.SIGKILL)
+                deadline = float('inf')
+
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+            children.discard(pid)
+            if not stopping.is_set():
+                logger.warning(f"Worker process {pid} exited with status {status}, starting a new one")
+                spawn()
+    finally:
+        server.server_close()
+
+
+def _signal_children(children, signum):
+    for pid in children:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def run_server(app, host, port, settings, debug=False, after_fork=(), on_shutdown=()):
+    """
+    Serve app with the backend selected in settings (see get_server_settings).
+
+    Each callable in after_fork is called in every forked worker process before it starts serving. Each callable in
+    on_shutdown is called with the seconds left of SERVER.SHUTDOWN_TIMEOUT once the server stopped serving.
+    """
+    backend = settings['BACKEND']
+    if backend == 'wsgiref':
+        try:
+            bottle.run(app, host=host, port=port, debug=debug)
+        finally:
+            _run_shutdown_hooks(on_shutdown, time.monotonic() + settings['SHUTDOWN_TIMEOUT'])
+        return
+
+    bottle.debug(debug)
+    if backend == 'threaded':
+        run_threaded(app, host, port, settings['WORKERS'], settings['REQUEST_TIMEOUT'], settings['SHUTDOWN_TIMEOUT'],
+                     on_shutdown=on_shutdown)
+    elif backend == 'prefork':
+        run_prefork(app, host, port, settings['WORKERS'], settings['THREADS'], settings['REQUEST_TIMEOUT'],
+                    settings['SHUTDOWN_TIMEOUT'], after_fork=after_fork, on_shutdown=on_shutdown)
+    elif backend == 'gunicorn':
+        # gunicorn kills workers graceful_timeout seconds after asking them to stop, requests included
+        bottle.run(app, server='gunicorn', host=host, port=port, debug=debug,
+                   workers=settings['WORKERS'], threads=settings['THREADS'], worker_class=settings['WORKER_CLASS'],
+                   timeout=settings['REQUEST_TIMEOUT'], graceful_timeout=settings['SHUTDOWN_TIMEOUT'],
+                   post_fork=lambda arbiter, worker: [hook() for hook in after_fork],
+                   worker_exit=lambda arbiter, worker: _run_shutdown_hooks(
+                       on_shutdown, time.monotonic() + settings['SHUTDOWN_TIMEOUT']))
+    else:
+        raise ValueError(f"Unknown server backend {backend!r}")
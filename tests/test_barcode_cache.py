@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from elements import ElementBase
+from elements.Barcode import BARCODE_CACHE, barcode_cache_key
+
+
+def fake_barcode(barcode_type, data, options=None):
+    return Image.new('1', (40, 10), 1)
+
+
+class TestBarcodeCache(unittest.TestCase):
+    """Test that CodeElement reuses rendered barcodes instead of running Ghostscript again"""
+
+    def setUp(self):
+        BARCODE_CACHE.invalidate()
+        self.config = ElementBase.config
+        ElementBase.configure({})
+        self.im = Image.new('RGB', (100, 50), 'white')
+
+    def tearDown(self):
+        ElementBase.configure(self.config)
+
+    def render(self, **element):
+        # The native engine does not use Ghostscript or the cache, so these tests force treepoem
+        element = dict({'type': 'code', 'data': '12345', 'code_type': 'code128', 'engine': 'treepoem'}, **element)
+        ElementBase.process_with_plugins(element, self.im, [0, 0, 0, 0], (100, 50), {})
+
+    def test_repeated_render_is_served_from_memory(self):
+        with patch('treepoem.generate_barcode', side_effect=fake_barcode) as mock_generate:
+            self.render()
+            self.render()
+
+        mock_generate.assert_called_once_with(barcode_type='code128', data='12345', options={})
+
+    def test_cache_key_covers_all_parameters(self):
+        with patch('treepoem.generate_barcode', side_effect=fake_barcode) as mock_generate:
+            self.render()
+            self.render(data='54321')
+            self.render(code_type='code39')
+            self.render(img_size=80)
+            self.render(options={'includetext': True})
+
+        self.assertEqual(mock_generate.call_count, 5)
+        self.assertEqual(mock_generate.call_args.kwargs['options'], {'includetext': True})
+
+    def test_scaled_barcode_is_cached(self):
+        with patch('treepoem.generate_barcode', side_effect=fake_barcode):
+            self.render(img_size='80x40')
+
+        cached = BARCODE_CACHE.get(barcode_cache_key('code128', '12345', {}, '80x40'))
+        self.assertEqual(cached.size, (80, 20))
+        self.assertEqual(cached.mode, 'RGB')
+
+    def test_disk_tier_survives_memory_eviction(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ElementBase.configure({'CACHE': {'BARCODE_CACHE_DIR': cache_dir}})
+            with patch('treepoem.generate_barcode', side_effect=fake_barcode) as mock_generate:
+                self.render()
+                BARCODE_CACHE.invalidate()
+                self.render()
+
+            mock_generate.assert_called_once()
+            self.assertEqual([name for name in os.listdir(cache_dir) if name.endswith('.png')],
+                             [barcode_cache_key('code128', '12345', {}, None) + '.png'])
+
+    def test_unwritable_disk_tier_still_renders(self):
+        with tempfile.NamedTemporaryFile() as not_a_dir:
+            ElementBase.configure({'CACHE': {'BARCODE_CACHE_DIR': not_a_dir.name}})
+            with patch('treepoem.generate_barcode', side_effect=fake_barcode):
+                self.render()
+
+        self.assertEqual(self.im.getpixel((0, 0)), (255, 255, 255))
+        self.assertEqual(len(BARCODE_CACHE), 1)
+
+    def test_generation_errors_are_not_cached(self):
+        with patch('treepoem.generate_barcode', side_effect=RuntimeError('bad data')):
+            with self.assertRaises(ValueError):
+                self.render()
+
+        self.assertEqual(len(BARCODE_CACHE), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import io
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.modules.setdefault('cups', MagicMock())
+
+from bottle import request, response
+from PIL import Image
+
+import brother_ql_web
+from implementation_cups import implementation
+from test_print_spooling import FileConn, StreamingConn
+
+
+class MultiDocumentConn(StreamingConn):
+    """Records every document of a job separately"""
+
+    def startDocument(self, printer, job_id, doc_name, doc_format, last_document):
+        super().startDocument(printer, job_id, doc_name, doc_format, last_document)
+        self.jobs[job_id].setdefault('documents', []).append((b'', last_document))
+
+    def writeRequestData(self, data, length):
+        documents = self.jobs[self._current]['documents']
+        data_so_far, last_document = documents[-1]
+        documents[-1] = (data_so_far + data[:length], last_document)
+        return self.status
+
+
+class BatchFileConn(FileConn):
+    def printFiles(self, printer, filenames, title, options):
+        for filename in filenames:
+            self.printFile(printer, filename, title, options)
+        return 99
+
+
+class TestParseBatchPayloads(unittest.TestCase):
+    """Test reading batch payloads in the supported formats"""
+
+    def test_json_array(self):
+        self.assertEqual(brother_ql_web.parse_batch_payloads(b'[{"a": 1}, {"a": 2}]', 'application/json'),
+                         [{'a': 1}, {'a': 2}])
+
+    def test_ndjson(self):
+        body = b'{"a": 1}\n\n{"a": 2}\n'
+        self.assertEqual(brother_ql_web.parse_batch_payloads(body, 'application/x-ndjson; charset=utf-8'),
+                         [{'a': 1}, {'a': 2}])
+
+    def test_csv(self):
+        body = '﻿name,quantity\nMilk,2\nEggs,1\n'.encode('utf-8')
+        self.assertEqual(brother_ql_web.parse_batch_payloads(body, 'text/csv'),
+                         [{'name': 'Milk', 'quantity': '2'}, {'name': 'Eggs', 'quantity': '1'}])
+
+    def test_json_body_must_be_an_array(self):
+        with self.assertRaises(ValueError):
+            brother_ql_web.parse_batch_payloads(b'{"a": 1}', 'application/json')
+
+    def test_payload_quantity(self):
+        self.assertEqual(brother_ql_web.get_payload_quantity({'quantity': '3'}, 1), 3)
+        self.assertEqual(brother_ql_web.get_payload_quantity({'name': 'x'}, '2'), 2)
+        self.assertEqual(brother_ql_web.get_payload_quantity(['not', 'a', 'dict'], 1), 1)
+        with self.assertRaises(ValueError):
+            brother_ql_web.get_payload_quantity({'quantity': 0}, 1)
+
+
+class TestPrintLabels(unittest.TestCase):
+    """Test printing a batch of labels as multi-document CUPS jobs"""
+
+    def setUp(self):
+        self.impl = implementation()
+        self.impl.CONFIG = {'PRINTER': {'USE_CUPS': False, 'PRINTER': 'zebra'}}
+        self.labels = [(Image.new('RGB', (10 + i, 5), 'white'), 1) for i in range(3)]
+
+    def test_labels_are_sent_as_one_job(self):
+        conn = MultiDocumentConn()
+        self.impl._get_conn = lambda: conn
+
+        results = self.impl.print_labels(self.labels, quantity=5, label_size='62')
+
+        self.assertEqual([result['job_id'] for result in results], [1, 1, 1])
+        job = conn.jobs[1]
+        self.assertEqual(job['options'], {'copies': '1', 'media': '62'})
+        self.assertEqual([last for _, last in job['documents']], [0, 0, 1])
+        self.assertTrue(all(data.startswith(b'\x89PNG') for data, _ in job['documents']))
+
+    def test_copies_repeat_the_document(self):
+        conn = MultiDocumentConn()
+        self.impl._get_conn = lambda: conn
+
+        self.impl.print_labels([(b'\x89PNG first', 2), (b'\x89PNG second', 1)])
+
+        self.assertEqual([data for data, _ in conn.jobs[1]['documents']],
+                         [b'\x89PNG first', b'\x89PNG first', b'\x89PNG second'])
+
+    def test_large_batches_are_split_into_jobs(self):
+        conn = MultiDocumentConn()
+        self.impl._get_conn = lambda: conn
+        self.impl.CONFIG['PRINTER']['BATCH_JOB_SIZE'] = 3
+
+        results = self.impl.print_labels([(b'a', 2), (b'b', 1), (b'c', 1), (b'd', 5)])
+
+        self.assertEqual([result['job_id'] for result in results], [1, 1, 2, 3])
+
+    def test_failed_job_fails_only_its_labels(self):
+        conn = MultiDocumentConn()
+        conn.writeRequestData = MagicMock(side_effect=[100, 100, 413, 100])
+        self.impl._get_conn = lambda: conn
+        self.impl.CONFIG['PRINTER']['BATCH_JOB_SIZE'] = 2
+
+        results = self.impl.print_labels([(b'a', 1), (b'b', 1), (b'c', 1), (b'd', 1)])
+
+        self.assertEqual([result['success'] for result in results], [True, True, False, False])
+        self.assertIn('413', results[2]['message'])
+        self.assertEqual(conn.cancelled, [2])
+
+    def test_file_fallback_prints_all_files_in_one_job(self):
+        conn = BatchFileConn()
+        self.impl._get_conn = lambda: conn
+
+        results = self.impl.print_labels([(b'a', 1), (b'b', 1)])
+
+        self.assertEqual([result['job_id'] for result in results], [99, 99])
+        self.assertEqual([data for _, _, data in conn.printed], [b'a', b'b'])
+
+
+class TestBatchPrintRoute(unittest.TestCase):
+    """Test the batch print endpoint"""
+
+    def setUp(self):
+        self.context = {'printer': 'p1', 'label_size': '62', 'quantity': '1'}
+        self.rendered = []
+
+        def render(template, payload, **context):
+            if payload.get('name') == 'broken':
+                raise ValueError('cannot render')
+            self.rendered.append(payload)
+            return Image.new('RGB', (10, 5), 'white')
+
+        self.patches = [
+            patch.object(brother_ql_web, 'get_template_data', return_value={'elements': ()}),
+            patch.object(brother_ql_web, 'get_label_context', return_value=self.context),
+            patch.object(brother_ql_web, 'create_label_from_template', side_effect=render),
+            patch.object(brother_ql_web.instance, 'print_labels',
+                         side_effect=lambda labels, **context: [{'success': True, 'job_id': 7} for _ in labels]),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def post(self, body, content_type='application/json'):
+        request.bind({'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)),
+                      'wsgi.input': io.BytesIO(body)})
+        response.bind()
+        return brother_ql_web.printtemplate_batch('labels.lbl'), response.status_code
+
+    def test_items_are_rendered_once_and_printed_with_copies(self):
+        result, status = self.post(b'[{"name": "Milk", "quantity": 3}, {"name": "broken"}, {"name": "Eggs"}]')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(self.rendered), 2)
+        labels = brother_ql_web.instance.print_labels.call_args.args[0]
+        self.assertEqual([copies for _, copies in labels], [3, 1])
+        self.assertFalse(result['success'])
+        self.assertEqual((result['printed'], result['failed'], result['jobs']), (2, 1, [7]))
+        self.assertEqual(result['items'][1], {'index': 1, 'success': False, 'error': 'cannot render'})
+        self.assertEqual(result['items'][0]['copies'], 3)
+
+    def test_invalid_body_is_rejected(self):
+        result, status = self.post(b'not json')
+
+        self.assertEqual(status, 400)
+        self.assertFalse(result['success'])
+        brother_ql_web.instance.print_labels.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
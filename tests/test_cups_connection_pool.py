@@ -0,0 +1,131 @@
+"""
+Test suite for the pooled CUPS connections.
+
+Tests cover:
+- Reuse of connections per (host, port)
+- Dropping failed connections and health checks of idle ones
+- Exclusive use of a connection under concurrent access
+- No changes to the process-global cups server settings
+"""
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Mock the cups module before importing implementation_cups
+sys.modules.setdefault('cups', MagicMock())
+
+from implementation_cups import implementation, CupsConnectionPool
+
+
+class TestCupsConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.connection_patch = patch('implementation_cups.cups.Connection', side_effect=lambda **kwargs: MagicMock())
+        self.mock_connection = self.connection_patch.start()
+        self.pool = CupsConnectionPool(max_idle=2, health_check_interval=30)
+
+    def tearDown(self):
+        self.connection_patch.stop()
+
+    def test_connections_are_reused_per_server(self):
+        with self.pool.connection('cups.local', 631) as first:
+            pass
+        with self.pool.connection('cups.local', 631) as second:
+            pass
+        with self.pool.connection('other', 631) as third:
+            pass
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+        self.assertEqual(self.mock_connection.call_args_list[0].kwargs, {'host': 'cups.local', 'port': 631})
+        self.assertEqual(self.mock_connection.call_args_list[1].kwargs, {'host': 'other', 'port': 631})
+
+    def test_failed_connection_is_dropped(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.connection('cups.local', 631) as first:
+                raise RuntimeError('connection reset')
+        with self.pool.connection('cups.local', 631) as second:
+            pass
+
+        self.assertIsNot(first, second)
+
+    def test_idle_connection_is_checked_before_reuse(self):
+        with patch('implementation_cups.time.monotonic', return_value=100):
+            with self.pool.connection('cups.local', 631) as first:
+                pass
+        first.getDefault.side_effect = RuntimeError('server closed the connection')
+
+        with patch('implementation_cups.time.monotonic', return_value=110):
+            with self.pool.connection('cups.local', 631) as conn:
+                self.assertIs(conn, first)
+        first.getDefault.assert_not_called()
+
+        with patch('implementation_cups.time.monotonic', return_value=200):
+            with self.pool.connection('cups.local', 631) as conn:
+                self.assertIsNot(conn, first)
+        first.getDefault.assert_called_once()
+
+    def test_connection_is_never_shared_between_threads(self):
+        in_use = set()
+        shared = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(50):
+                with self.pool.connection('cups.local', 631) as conn:
+                    with lock:
+                        if id(conn) in in_use:
+                            shared.append(conn)
+                        in_use.add(id(conn))
+                    threading.Event().wait(0.0005)
+                    with lock:
+                        in_use.discard(id(conn))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(shared, [])
+
+    def test_foreign_connections_are_not_pooled(self):
+        self.pool.release(MagicMock())
+        with self.pool.connection('cups.local', 631):
+            pass
+        self.assertEqual(self.mock_connection.call_count, 1)
+
+
+class TestImplementationUsesPool(unittest.TestCase):
+
+    def test_validate_connectivity_leaves_global_server_alone(self):
+        conn = MagicMock()
+        conn.getPrinters.return_value = {'zebra': {}}
+        with patch('implementation_cups.cups.Connection', return_value=conn) as mock_connection, \
+                patch('implementation_cups.cups.setServer', create=True) as mock_set_server, \
+                patch('implementation_cups.cups.setPort', create=True) as mock_set_port, \
+                patch('implementation_cups.CONNECTION_POOL', CupsConnectionPool()):
+            result = implementation().validate_connectivity({'server': 'other.local:8631'})
+
+        self.assertEqual(result, {'success': True, 'server': 'other.local:8631', 'printers': ['zebra']})
+        mock_connection.assert_called_once_with(host='other.local', port=8631)
+        mock_set_server.assert_not_called()
+        mock_set_port.assert_not_called()
+
+    def test_one_connection_serves_consecutive_requests(self):
+        conn = MagicMock()
+        conn.getPrinters.return_value = {'zebra': {}}
+        conn.getDefault.return_value = 'zebra'
+        with patch('implementation_cups.cups.Connection', return_value=conn) as mock_connection, \
+                patch('implementation_cups.CONNECTION_POOL', CupsConnectionPool()):
+            impl = implementation()
+            impl.initialize({'PRINTER': {'USE_CUPS': True, 'SERVER': 'localhost'}, 'LABEL': {}})
+            impl.get_printers()
+            impl.get_default_label_size('zebra')
+
+        mock_connection.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import sys
+import types
+import unittest
+from collections import namedtuple
+from unittest.mock import patch, MagicMock
+
+from PIL import Image
+
+from elements import ElementBase
+from elements.Barcode import DATAMATRIX_CACHE
+
+Encoded = namedtuple('Encoded', 'width height bpp pixels')
+
+
+def fake_encode(data, size='SquareAuto'):
+    """A 4x2 pixel 'symbol': black top row, white bottom row, as RGB like libdmtx"""
+    return Encoded(4, 2, 24, b'\x00\x00\x00' * 4 + b'\xff\xff\xff' * 4)
+
+
+class TestDataMatrixElement(unittest.TestCase):
+    """Test in-memory, memoized DataMatrix rendering"""
+
+    def setUp(self):
+        DATAMATRIX_CACHE.invalidate()
+        self.encode = MagicMock(side_effect=fake_encode)
+        fake_module = types.ModuleType('pylibdmtx.pylibdmtx')
+        fake_module.encode = self.encode
+        self.modules_patch = patch.dict(sys.modules, {'pylibdmtx.pylibdmtx': fake_module})
+        self.modules_patch.start()
+        self.im = Image.new('RGB', (20, 20), 'red')
+
+    def tearDown(self):
+        self.modules_patch.stop()
+
+    def render(self, **element):
+        element = dict({'type': 'datamatrix', 'data': 'grcy:p:1'}, **element)
+        ElementBase.process_with_plugins(element, self.im, [0, 0, 0, 0], (20, 20), {})
+
+    def test_symbol_is_pasted_in_label_mode(self):
+        self.render(horizontal_offset=2, vertical_offset=3)
+
+        self.assertEqual(self.im.getpixel((2, 3)), (0, 0, 0))
+        self.assertEqual(self.im.getpixel((5, 4)), (255, 255, 255))
+        self.assertEqual(self.im.getpixel((6, 3)), (255, 0, 0))
+        self.encode.assert_called_once_with(b'grcy:p:1', size='SquareAuto')
+
+    def test_repeated_render_is_memoized(self):
+        self.render()
+        self.render()
+        self.render(data='grcy:p:2')
+
+        self.assertEqual(self.encode.call_count, 2)
+        cached = DATAMATRIX_CACHE.get(('grcy:p:1', 'SquareAuto', None))
+        self.assertEqual(cached.mode, 'L')
+
+    def test_img_size_is_part_of_the_key(self):
+        self.render(img_size=8)
+        self.render(img_size='8x4')
+
+        self.assertEqual(self.encode.call_count, 2)
+        self.assertEqual(DATAMATRIX_CACHE.get(('grcy:p:1', 'SquareAuto', 8)).size, (8, 8))
+        self.assertEqual(self.im.getpixel((7, 1)), (0, 0, 0))
+        self.assertEqual(self.im.getpixel((7, 2)), (255, 255, 255))
+
+    def test_nothing_is_written_to_disk(self):
+        with patch.object(Image.Image, 'save', side_effect=AssertionError('image saved')):
+            self.render()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+import font_helpers
+from cache_helpers import configure_caches
+
+FONT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'fonts',
+                         'glyphicons-halflings-regular.ttf')
+
+
+def collection(font, count):
+    """Build a TTC of count fonts that share the tables of a TTF"""
+    num_tables = struct.unpack('>H', font[4:6])[0]
+    directory_size = 12 + 16 * num_tables
+    base = 12 + 4 * count + directory_size * count
+    directory = font[:12]
+    for record in range(num_tables):
+        tag, checksum, offset, length = struct.unpack('>4sIII', font[12 + 16 * record:28 + 16 * record])
+        directory += struct.pack('>4sIII', tag, checksum, base + offset, length)
+    offsets = [12 + 4 * count + directory_size * number for number in range(count)]
+    return (b'ttcf' + struct.pack('>HHI', 1, 0, count) + struct.pack(f'>{count}I', *offsets) + directory * count
+            + font)
+
+
+class TestFontCache(unittest.TestCase):
+    """Test the process-wide FreeTypeFont cache"""
+
+    def setUp(self):
+        font_helpers.FONT_CACHE.invalidate()
+        self.original_maxsize = font_helpers.FONT_CACHE.maxsize
+
+    def tearDown(self):
+        font_helpers.FONT_CACHE.resize(self.original_maxsize)
+        font_helpers.FONT_CACHE.invalidate()
+
+    def test_font_is_loaded_once_per_path_and_size(self):
+        with patch('font_helpers.ImageFont.truetype', side_effect=lambda *a, **kw: MagicMock()) as mock_truetype:
+            first = font_helpers.get_font('/fonts/a.ttf', 20)
+            second = font_helpers.get_font('/fonts/a.ttf', 20)
+            other_size = font_helpers.get_font('/fonts/a.ttf', 21)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other_size)
+        self.assertEqual(mock_truetype.call_count, 2)
+
+    def test_layout_engine_is_part_of_the_key(self):
+        with patch('font_helpers.ImageFont.truetype', side_effect=lambda *a, **kw: MagicMock()) as mock_truetype:
+            font_helpers.get_font('/fonts/a.ttf', 20)
+            font_helpers.get_font('/fonts/a.ttf', 20, layout_engine=0)
+
+        self.assertEqual(mock_truetype.call_count, 2)
+        self.assertEqual(mock_truetype.call_args.kwargs['layout_engine'], 0)
+
+    def test_font_of_a_collection_is_loaded_by_index(self):
+        with patch('font_helpers.ImageFont.truetype', side_effect=lambda *a, **kw: MagicMock()) as mock_truetype:
+            first = font_helpers.get_font(font_helpers.FontPath('/fonts/c.ttc', 0), 20)
+            second = font_helpers.get_font(font_helpers.FontPath('/fonts/c.ttc', 2), 20)
+            font_helpers.get_font('/fonts/c.ttc', 20, index=2)
+
+        self.assertIsNot(first, second)
+        self.assertEqual([call.kwargs['index'] for call in mock_truetype.call_args_list], [0, 2])
+
+    def test_real_fonts_load_from_plain_and_collection_paths(self):
+        with open(FONT_FILE, 'rb') as fh:
+            font = fh.read()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ttc = os.path.join(temp_dir, 'fonts.ttc')
+            with open(ttc, 'wb') as fh:
+                fh.write(collection(font, 2))
+
+            plain = font_helpers.get_font(FONT_FILE, 20)
+            second = font_helpers.get_font(font_helpers.FontPath(ttc, 1), 20)
+            with self.assertRaises(OSError):
+                font_helpers.get_font(font_helpers.FontPath(ttc, 2), 20)
+
+        self.assertEqual((plain.index, plain.size), (0, 20))
+        self.assertEqual((second.index, second.path), (1, ttc))
+        self.assertEqual(second.getname(), plain.getname())
+
+    def test_capacity_is_configurable(self):
+        configure_caches({'CACHE': {'FONTS': 1}})
+        with patch('font_helpers.ImageFont.truetype', side_effect=lambda *a, **kw: MagicMock()) as mock_truetype:
+            font_helpers.get_font('/fonts/a.ttf', 20)
+            font_helpers.get_font('/fonts/b.ttf', 20)
+            font_helpers.get_font('/fonts/a.ttf', 20)
+
+        self.assertEqual(mock_truetype.call_count, 3)
+        self.assertEqual(font_helpers.FONT_CACHE.stats()['maxsize'], 1)
+
+    def test_invalid_capacity_is_ignored(self):
+        configure_caches({'CACHE': {'FONTS': 'lots'}})
+
+        self.assertEqual(font_helpers.FONT_CACHE.maxsize, self.original_maxsize)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from elements import ElementBase, TEXT_METRICS_CACHE, FONT_FIT_CACHE
+
+
+class FakeDraw:
+    """Draw stand-in whose text extents grow (slightly non-linearly) with the font size"""
+    fontmode = 'L'
+
+    def __init__(self):
+        self.measured_sizes = []
+
+    @property
+    def measurements(self):
+        return len(self.measured_sizes)
+
+    def multiline_textbbox(self, xy, text, font=None, align='left'):
+        self.measured_sizes.append(font.size)
+        lines = text.split('\n')
+        width = int(font.size * 0.55 * max(len(line) for line in lines)) + font.size // 7
+        height = int(font.size * 1.17 * len(lines))
+        return 0, 0, width, height
+
+
+class TestAdjustFontToFit(unittest.TestCase):
+    """Test the shrink-to-fit solver and its text metrics memoization"""
+
+    def setUp(self):
+        TEXT_METRICS_CACHE.invalidate()
+        FONT_FIT_CACHE.invalidate()
+        self.font_patch = patch.object(ElementBase, 'get_font', side_effect=lambda path, size: SimpleNamespace(size=size))
+        self.font_patch.start()
+
+    def tearDown(self):
+        self.font_patch.stop()
+
+    def brute_force(self, draw, max_size, text, label_size, min_size, h_offset, v_offset):
+        largest = min_size - 1
+        for size in range(min_size, max_size + 1):
+            if ElementBase.font_fits(draw, 'font.ttf', size, text, label_size, h_offset, v_offset, 'left'):
+                largest = size
+        return largest
+
+    def test_matches_exhaustive_search(self):
+        draw = FakeDraw()
+        cases = [
+            ('Hello', 200, (300, 100), 2, 0, 0),
+            ('A much longer line of text', 120, (400, 80), 2, 10, 5),
+            ('Two\nlines', 90, (150, 200), 2, 0, 20),
+            ('Fits easily', 20, (1000, 1000), 2, 0, 0),
+            ('Never fits', 50, (5, 5), 2, 0, 0),
+            ('Barely', 61, (200, 72), 60, 0, 0),
+        ]
+        for text, max_size, label_size, min_size, h_offset, v_offset in cases:
+            with self.subTest(text=text):
+                expected = self.brute_force(draw, max_size, text, label_size, min_size, h_offset, v_offset)
+                FONT_FIT_CACHE.invalidate()
+                result = ElementBase.adjust_font_to_fit(draw, 'font.ttf', max_size, text, label_size, min_size,
+                                                        h_offset, v_offset)
+                self.assertEqual(result, expected)
+
+    def test_shrinking_needs_few_measurements(self):
+        draw = FakeDraw()
+
+        size = ElementBase.adjust_font_to_fit(draw, 'font.ttf', 200, 'Shrink me to fit', (400, 120))
+
+        self.assertLess(size, 200)
+        # One measurement at the maximum size, then the estimate and the size above it
+        self.assertLessEqual(draw.measurements, 3)
+
+    def test_repeated_fit_is_served_from_cache(self):
+        draw = FakeDraw()
+        first = ElementBase.adjust_font_to_fit(draw, 'font.ttf', 200, 'Same text', (300, 100))
+        measurements = draw.measurements
+
+        second = ElementBase.adjust_font_to_fit(draw, 'font.ttf', 200, 'Same text', (300, 100))
+
+        self.assertEqual(first, second)
+        self.assertEqual(draw.measurements, measurements)
+
+    def test_text_metrics_are_shared_between_fits(self):
+        draw = FakeDraw()
+        ElementBase.adjust_font_to_fit(draw, 'font.ttf', 200, 'Typed text', (300, 100))
+
+        # A different label size re-runs the solver, but the bounding box at the maximum size is reused
+        ElementBase.adjust_font_to_fit(draw, 'font.ttf', 200, 'Typed text', (310, 100))
+
+        self.assertEqual(draw.measured_sizes.count(200), 1)
+        self.assertEqual(len(draw.measured_sizes), len(set(draw.measured_sizes)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import font_helpers
+from font_helpers import FontIndex
+
+
+def fake_scan(paths):
+    """Derive the family of a font file from its name, like a real scan would read it from the file"""
+    return {path: [(os.path.splitext(os.path.basename(path))[0].title(), 'Regular', 0)] for path in paths}
+
+
+class TestFontIndex(unittest.TestCase):
+    """Test the persistent font index only scanning new and changed files"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.folder = os.path.join(temp_dir.name, 'fonts')
+        self.index_file = os.path.join(temp_dir.name, 'cache', 'font_index.json')
+        os.makedirs(os.path.join(self.folder, 'sub'))
+        for name in ('alpha.ttf', 'sub/beta.otf', 'notes.txt'):
+            self.write(name)
+        self.scan = patch('font_helpers.scan_font_files', side_effect=fake_scan)
+        self.scan_files = self.scan.start()
+        self.addCleanup(self.scan.stop)
+
+    def write(self, name, content=b'font'):
+        with open(os.path.join(self.folder, name), 'wb') as fh:
+            fh.write(content)
+
+    def scanned(self):
+        return sorted(os.path.basename(path) for call in self.scan_files.call_args_list for path in call.args[0])
+
+    def test_fonts_are_found_below_the_folder(self):
+        fonts = FontIndex(self.index_file).get_fonts([self.folder])
+
+        self.assertEqual(fonts, {'Alpha': {'Regular': os.path.join(self.folder, 'alpha.ttf')},
+                                 'Beta': {'Regular': os.path.join(self.folder, 'sub', 'beta.otf')}})
+        self.assertEqual(self.scanned(), ['alpha.ttf', 'beta.otf'])
+
+    def test_index_is_reused_after_restart(self):
+        FontIndex(self.index_file).get_fonts([self.folder])
+        self.scan_files.reset_mock()
+
+        with patch('os.scandir', wraps=os.scandir) as scandir:
+            fonts = FontIndex(self.index_file).get_fonts([self.folder])
+
+        self.assertEqual(sorted(fonts), ['Alpha', 'Beta'])
+        self.scan_files.assert_not_called()
+        # Unchanged directories are not listed again
+        scandir.assert_not_called()
+
+    def test_only_new_and_changed_files_are_scanned(self):
+        index = FontIndex(self.index_file)
+        index.get_fonts([self.folder])
+        self.scan_files.reset_mock()
+
+        self.write('gamma.ttf')
+        self.write('alpha.ttf', b'new version of the font')
+        fonts = index.get_fonts([self.folder])
+
+        self.assertEqual(self.scanned(), ['alpha.ttf', 'gamma.ttf'])
+        self.assertEqual(sorted(fonts), ['Alpha', 'Beta', 'Gamma'])
+
+    def test_removed_files_are_forgotten(self):
+        index = FontIndex(self.index_file)
+        index.get_fonts([self.folder])
+
+        os.remove(os.path.join(self.folder, 'sub', 'beta.otf'))
+        fonts = index.get_fonts([self.folder])
+
+        self.assertEqual(sorted(fonts), ['Alpha'])
+        with open(self.index_file, encoding='utf-8') as fh:
+            self.assertEqual(list(json.load(fh)['files']), [os.path.join(self.folder, 'alpha.ttf')])
+
+    def test_unreadable_index_is_rebuilt(self):
+        os.makedirs(os.path.dirname(self.index_file))
+        with open(self.index_file, 'w') as fh:
+            fh.write('{not json')
+
+        with self.assertLogs('font_helpers', level='WARNING'):
+            fonts = FontIndex(self.index_file).get_fonts([self.folder])
+
+        self.assertEqual(sorted(fonts), ['Alpha', 'Beta'])
+
+    def test_index_file_can_be_disabled(self):
+        with patch.object(font_helpers, 'FONT_INDEX', FontIndex(self.index_file)):
+            font_helpers.configure_font_index({'CACHE': {'FONT_INDEX_FILE': False}})
+            self.assertIsNone(font_helpers.FONT_INDEX.path)
+            font_helpers.get_fonts(self.folder)
+
+        self.assertFalse(os.path.exists(self.index_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
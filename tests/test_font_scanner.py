@@ -0,0 +1,118 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import font_helpers
+from font_helpers import read_font_faces, scan_font_files
+
+WINDOWS = (3, 1, 0x409)
+MACINTOSH = (1, 0, 0)
+
+
+def name_table(names):
+    """Build a name table from {(platform, encoding, language, name_id): text}"""
+    records, strings = b'', b''
+    for (platform_id, encoding_id, language_id, name_id), text in names.items():
+        raw = text.encode('mac_roman' if platform_id == 1 else 'utf-16-be')
+        records += struct.pack('>HHHHHH', platform_id, encoding_id, language_id, name_id, len(raw), len(strings))
+        strings += raw
+    return struct.pack('>HHH', 0, len(names), 6 + len(records)) + records + strings
+
+
+def sfnt(names, offset=0, version=b'\x00\x01\x00\x00'):
+    """Build a font with only a name table, placed as if the font started at offset of its file"""
+    table = name_table(names)
+    header = version + struct.pack('>HHHH', 1, 16, 0, 0)
+    table_offset = offset + len(header) + 16
+    return header + struct.pack('>4sIII', b'name', 0, table_offset, len(table)) + table
+
+
+def names(family, style, platform=WINDOWS, **extra):
+    result = {platform + (1,): family, platform + (2,): style}
+    for name_id, text in extra.items():
+        result[platform + (int(name_id[1:]),)] = text
+    return result
+
+
+class TestFontScanner(unittest.TestCase):
+    """Test reading family and style names from font files"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.folder = temp_dir.name
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def test_truetype_and_opentype_names(self):
+        ttf = self.write('a.ttf', sfnt(names('DejaVu Sans', 'Bold')))
+        otf = self.write('b.otf', sfnt(names('Minion Pro', 'Regular', platform=MACINTOSH), version=b'OTTO'))
+
+        self.assertEqual(read_font_faces(ttf), [('DejaVu Sans', 'Bold', 0)])
+        self.assertEqual(read_font_faces(otf), [('Minion Pro', 'Regular', 0)])
+
+    def test_typographic_names_are_listed_first(self):
+        path = self.write('c.ttf', sfnt(names('Minion Pro Semibold', 'Regular', n16='Minion Pro', n17='Semibold')))
+
+        self.assertEqual(read_font_faces(path), [('Minion Pro', 'Semibold', 0), ('Minion Pro Semibold', 'Regular', 0)])
+
+    def test_english_windows_names_are_preferred(self):
+        font_names = names('Schrift', 'Fett', platform=(3, 1, 0x407))
+        font_names.update(names('Font', 'Bold', platform=MACINTOSH))
+        font_names.update(names('Font', 'Bold'))
+
+        self.assertEqual(read_font_faces(self.write('d.ttf', sfnt(font_names))), [('Font', 'Bold', 0)])
+
+    def write_collection(self, name, *fonts):
+        header_size = 12 + 4 * len(fonts)
+        offsets, data = [], b''
+        for font_names in fonts:
+            offsets.append(header_size + len(data))
+            data += sfnt(font_names, offset=offsets[-1])
+        return self.write(name, b'ttcf' + struct.pack(f'>II{len(fonts)}I', 0x10000, len(fonts), *offsets) + data)
+
+    def test_collection_lists_every_font(self):
+        path = self.write_collection('e.ttc', names('Noto Sans CJK JP', 'Regular'),
+                                     names('Noto Sans CJK KR', 'Regular'))
+
+        self.assertEqual(read_font_faces(path),
+                         [('Noto Sans CJK JP', 'Regular', 0), ('Noto Sans CJK KR', 'Regular', 1)])
+
+    def test_collection_fonts_keep_their_index(self):
+        path = self.write_collection('f.ttc', names('Noto Sans CJK', 'Regular'), names('Noto Sans CJK', 'Bold'))
+
+        fonts = font_helpers.FontIndex().get_fonts([self.folder])
+
+        self.assertEqual([fonts['Noto Sans CJK'][style].index for style in ('Regular', 'Bold')], [0, 1])
+        self.assertEqual(fonts['Noto Sans CJK']['Regular'], path)
+        # Different fonts of one collection are never mistaken for each other, e.g. as cache keys
+        self.assertNotEqual(fonts['Noto Sans CJK']['Bold'], path)
+        self.assertNotEqual(fonts['Noto Sans CJK']['Bold'], fonts['Noto Sans CJK']['Regular'])
+
+    def test_scan_in_parallel_including_unusual_paths(self):
+        paths = [self.write(f'font:{i}.ttf', sfnt(names(f'Family {i}', 'Regular'))) for i in range(20)]
+        broken = self.write('broken.ttf', b'not a font at all')
+        missing = os.path.join(self.folder, 'missing.ttf')
+
+        with self.assertLogs('font_helpers', level='WARNING'):
+            faces = scan_font_files(paths + [broken, missing])
+
+        self.assertEqual(faces[paths[7]], [('Family 7', 'Regular', 0)])
+        self.assertEqual(faces[broken], [])
+        self.assertNotIn(missing, faces)
+
+    def test_get_fonts_maps_families_to_styles(self):
+        regular = self.write('r.ttf', sfnt(names('Lato', 'Regular')))
+        italic = self.write('i.ttf', sfnt(names('Lato', 'Italic')))
+
+        index = font_helpers.FontIndex()
+        self.assertEqual(index.get_fonts([self.folder]), {'Lato': {'Regular': regular, 'Italic': italic}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bottle import request, response
+
+import brother_ql_web
+import font_helpers
+from font_helpers import FontIndex, FontWatcher, apply_font_changes
+
+
+def fake_scan(paths):
+    """Derive the family of a font file from its name, like a real scan would read it from the file"""
+    return {path: [(os.path.splitext(os.path.basename(path))[0].title(), 'Regular', 0)] for path in paths}
+
+
+class TestApplyFontChanges(unittest.TestCase):
+    """Test applying the changes of font folders to a font dictionary"""
+
+    def setUp(self):
+        self.fonts = {'Alpha': {'Regular': '/f/alpha.ttf', 'Bold': '/f/alpha-bold.ttf'},
+                      'Beta': {'Regular': '/f/beta.ttf'}}
+
+    def test_changes_are_applied_to_a_copy(self):
+        fonts = apply_font_changes(self.fonts, {'/f/alpha-bold.ttf': [('Alpha', 'Bold', 0)]},
+                                   {'/f/gamma.ttf': [('Gamma', 'Regular', 0)]})
+
+        self.assertEqual(fonts, {'Alpha': {'Regular': '/f/alpha.ttf'}, 'Beta': {'Regular': '/f/beta.ttf'},
+                                 'Gamma': {'Regular': '/f/gamma.ttf'}})
+        self.assertEqual(self.fonts['Alpha'], {'Regular': '/f/alpha.ttf', 'Bold': '/f/alpha-bold.ttf'})
+        # Unchanged families are shared with the previous dictionary
+        self.assertIs(fonts['Beta'], self.fonts['Beta'])
+
+    def test_family_without_styles_is_removed(self):
+        fonts = apply_font_changes(self.fonts, {'/f/beta.ttf': [('Beta', 'Regular', 0)]}, {})
+
+        self.assertEqual(sorted(fonts), ['Alpha'])
+
+    def test_face_provided_by_another_file_is_kept(self):
+        fonts = apply_font_changes(self.fonts, {'/other/beta.ttf': [('Beta', 'Regular', 0)]}, {})
+
+        self.assertEqual(fonts['Beta'], {'Regular': '/f/beta.ttf'})
+
+    def test_changed_file_replaces_its_faces(self):
+        fonts = apply_font_changes(self.fonts, {'/f/beta.ttf': [('Beta', 'Regular', 0)]},
+                                   {'/f/beta.ttf': [('Beta', 'Italic', 0)]})
+
+        self.assertEqual(fonts['Beta'], {'Italic': '/f/beta.ttf'})
+
+
+class TestFontWatcher(unittest.TestCase):
+    """Test scanning watched font folders in the background"""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.folder = os.path.join(temp_dir.name, 'fonts')
+        os.makedirs(os.path.join(self.folder, 'sub'))
+        self.write('alpha.ttf')
+        for p in (patch('font_helpers.scan_font_files', side_effect=fake_scan),
+                  patch.object(font_helpers, 'FONT_INDEX', FontIndex())):
+            p.start()
+            self.addCleanup(p.stop)
+        self.changes = []
+        self.changed = threading.Event()
+
+    def write(self, name, content=b'font'):
+        with open(os.path.join(self.folder, name), 'wb') as fh:
+            fh.write(content)
+
+    def on_change(self, removed, added):
+        self.changes.append((removed, added))
+        self.changed.set()
+
+    def watcher(self, **kwargs):
+        watcher = FontWatcher(lambda: [self.folder], self.on_change, **kwargs)
+        self.addCleanup(watcher.stop, 5)
+        return watcher
+
+    def wait_for_change(self, timeout=5):
+        self.assertTrue(self.changed.wait(timeout), 'no font changes were reported')
+        self.changed.clear()
+        return self.changes[-1]
+
+    def test_first_scan_reports_all_fonts(self):
+        watcher = self.watcher(interval=0, use_inotify=False)
+
+        self.assertTrue(watcher.request_scan().wait(5))
+
+        self.assertEqual(self.changes, [({}, {os.path.join(self.folder, 'alpha.ttf'): [('Alpha', 'Regular', 0)]})])
+
+    def test_polling_finds_added_and_removed_files(self):
+        self.watcher(interval=0.05, use_inotify=False).start()
+        self.wait_for_change()
+
+        self.write(os.path.join('sub', 'beta.otf'))
+        self.assertEqual(self.wait_for_change(), ({}, {os.path.join(self.folder, 'sub', 'beta.otf'):
+                                                       [('Beta', 'Regular', 0)]}))
+
+        os.remove(os.path.join(self.folder, 'alpha.ttf'))
+        self.assertEqual(self.wait_for_change(),
+                         ({os.path.join(self.folder, 'alpha.ttf'): [('Alpha', 'Regular', 0)]}, {}))
+
+    def test_unchanged_folder_reports_nothing(self):
+        watcher = self.watcher(interval=0, use_inotify=False)
+        watcher.request_scan().wait(5)
+        font_helpers.scan_font_files.reset_mock()
+
+        self.assertTrue(watcher.request_scan().wait(5))
+
+        self.assertEqual(len(self.changes), 1)
+        font_helpers.scan_font_files.assert_not_called()
+
+    def test_removed_face_falls_back_to_the_file_it_replaced(self):
+        self.write('alpha2.ttf')
+        scan = {'alpha.ttf': [('Alpha', 'Regular', 0)], 'alpha2.ttf': [('Alpha', 'Regular', 0)]}
+        font_helpers.scan_font_files.side_effect = lambda paths: {path: scan[os.path.basename(path)]
+                                                                  for path in paths}
+        watcher = self.watcher(interval=0, use_inotify=False)
+        watcher.request_scan().wait(5)
+
+        os.remove(os.path.join(self.folder, 'alpha2.ttf'))
+        watcher.request_scan().wait(5)
+
+        removed, added = self.changes[-1]
+        self.assertEqual(added, {os.path.join(self.folder, 'alpha.ttf'): [('Alpha', 'Regular', 0)]})
+        fonts = apply_font_changes({'Alpha': {'Regular': os.path.join(self.folder, 'alpha2.ttf')}}, removed, added)
+        self.assertEqual(fonts, {'Alpha': {'Regular': os.path.join(self.folder, 'alpha.ttf')}})
+
+    def test_removed_override_restores_the_system_font(self):
+        system_folder = os.path.join(os.path.dirname(self.folder), 'system')
+        os.makedirs(system_folder)
+        with open(os.path.join(system_folder, 'alpha.ttf'), 'wb') as fh:
+            fh.write(b'system font')
+        watcher = FontWatcher(lambda: [system_folder, self.folder], self.on_change, interval=0, use_inotify=False)
+        self.addCleanup(watcher.stop, 5)
+        watcher.request_scan().wait(5)
+        fonts = apply_font_changes({}, *self.changes[-1])
+        self.assertEqual(fonts['Alpha']['Regular'], os.path.join(self.folder, 'alpha.ttf'))
+
+        os.remove(os.path.join(self.folder, 'alpha.ttf'))
+        watcher.request_scan().wait(5)
+
+        fonts = apply_font_changes(fonts, *self.changes[-1])
+        self.assertEqual(fonts['Alpha']['Regular'], os.path.join(system_folder, 'alpha.ttf'))
+
+    def test_inotify_reports_changes_without_polling(self):
+        try:
+            font_helpers._Inotify().close()
+        except OSError:
+            self.skipTest('inotify is not available')
+        watcher = self.watcher(interval=0)
+        watcher.request_scan().wait(5)
+        self.changed.clear()
+
+        self.write(os.path.join('sub', 'gamma.ttf'))
+
+        self.assertEqual(self.wait_for_change(), ({}, {os.path.join(self.folder, 'sub', 'gamma.ttf'):
+                                                       [('Gamma', 'Regular', 0)]}))
+
+    def test_failing_scan_does_not_stop_the_watcher(self):
+        font_helpers.scan_font_files.side_effect = [RuntimeError('broken'), {}]
+        self.write('beta.ttf')
+        watcher = self.watcher(interval=0, use_inotify=False)
+
+        with self.assertLogs('font_helpers', level='ERROR'):
+            self.assertTrue(watcher.request_scan().wait(5))
+        font_helpers.scan_font_files.side_effect = fake_scan
+        self.assertTrue(watcher.request_scan().wait(5))
+
+        self.assertEqual(sorted(self.changes[-1][1]), [os.path.join(self.folder, 'alpha.ttf'),
+                                                        os.path.join(self.folder, 'beta.ttf')])
+
+
+class TestReloadFontsRoute(unittest.TestCase):
+    """Test the font reload route scanning in the background"""
+
+    def setUp(self):
+        self.done = threading.Event()
+        self.watcher = MagicMock()
+        self.watcher.request_scan.return_value = self.done
+        for p in (patch.object(brother_ql_web, 'FONT_WATCHER', self.watcher),
+                  patch.object(brother_ql_web, 'FONTS', {'Alpha': {'Regular': '/f/alpha.ttf'}})):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def call(self, query=''):
+        request.bind({'REQUEST_METHOD': 'POST', 'QUERY_STRING': query})
+        response.bind()
+        return brother_ql_web.reload_fonts_api()
+
+    def test_reload_returns_without_waiting_for_the_scan(self):
+        result = self.call()
+
+        self.watcher.request_scan.assert_called_once()
+        self.assertEqual(result['fonts'], {'Alpha': ['Regular']})
+        self.assertTrue(result['success'])
+        self.assertTrue(result['scanning'])
+
+    def test_system_font_folders_are_watched_first(self):
+        with patch.object(brother_ql_web, 'SYSTEM_FONT_DIRS', ('/usr/share/fonts',)), \
+                patch.object(brother_ql_web, 'FONT_FOLDERS', ['/fonts_folder']), \
+                patch.object(brother_ql_web, 'CONFIG', {'SERVER': {'ADDITIONAL_FONT_FOLDER': '/fonts'}}):
+            self.assertEqual(brother_ql_web.get_watched_font_folders(),
+                             ['/usr/share/fonts', '/fonts_folder', '/fonts'])
+
+    def test_fonts_are_loaded_from_the_watched_folders(self):
+        index = MagicMock()
+        with patch.object(font_helpers, 'FONT_INDEX', index), \
+                patch.object(brother_ql_web, 'SYSTEM_FONT_DIRS', ('/usr/share/fonts',)), \
+                patch.object(brother_ql_web, 'FONT_FOLDERS', ['/fonts_folder']), \
+                patch.object(brother_ql_web, 'CONFIG', {'SERVER': {'ADDITIONAL_FONT_FOLDER': '/fonts'}}):
+            self.assertIs(brother_ql_web.load_fonts(), index.get_fonts.return_value)
+            brother_ql_web.load_fonts({'SERVER': {'ADDITIONAL_FONT_FOLDER': '/new_fonts'}})
+
+        self.assertEqual([call.args[0] for call in index.get_fonts.call_args_list],
+                         [['/usr/share/fonts', '/fonts_folder', '/fonts'],
+                          ['/usr/share/fonts', '/fonts_folder', '/new_fonts']])
+
+    def test_reload_can_wait_for_the_scan(self):
+        def scan():
+            brother_ql_web.apply_font_folder_changes({}, {'/f/beta.ttf': [('Beta', 'Bold', 0)]})
+            self.done.set()
+        threading.Timer(0.05, scan).start()
+
+        result = self.call('wait=5')
+
+        self.assertFalse(result['scanning'])
+        self.assertEqual(result['fonts'], {'Alpha': ['Regular'], 'Beta': ['Bold']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+import shutil
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import treepoem
+from PIL import Image
+
+from elements.Barcode import ghostscript
+from elements.Barcode.ghostscript import (GhostscriptError, GhostscriptPool, GhostscriptWorker, PoolUnavailableError,
+                                          parse_hires_bbox)
+
+
+class FakeWorker:
+    """Stands in for a GhostscriptWorker; fails if its 'process' has been marked as crashed"""
+    created = []
+
+    def __init__(self):
+        self.jobs = 0
+        self.crashed = False
+        self.closed = False
+        FakeWorker.created.append(self)
+
+    def generate_barcode(self, barcode_type, data, options=None):
+        self.jobs += 1
+        if self.crashed:
+            raise GhostscriptError('worker exited')
+        if data == 'invalid':
+            raise ValueError('BWIPP rejected the data')
+        return Image.new('RGB', (len(data), 10))
+
+    def close(self):
+        self.closed = True
+
+
+class TestGhostscriptPool(unittest.TestCase):
+    """Test worker reuse and recycling in the Ghostscript pool"""
+
+    def setUp(self):
+        FakeWorker.created = []
+
+    def test_workers_are_started_lazily_and_reused(self):
+        pool = GhostscriptPool(2, worker_factory=FakeWorker)
+        self.assertEqual(FakeWorker.created, [])
+
+        for data in ('a', 'bb', 'ccc'):
+            self.assertEqual(pool.generate_barcode('code128', data).width, len(data))
+
+        self.assertEqual(len(FakeWorker.created), 1)
+        self.assertEqual(FakeWorker.created[0].jobs, 3)
+
+    def test_crashed_worker_is_replaced(self):
+        pool = GhostscriptPool(1, worker_factory=FakeWorker)
+        pool.generate_barcode('code128', 'a')
+        FakeWorker.created[0].crashed = True
+
+        with self.assertRaises(GhostscriptError):
+            pool.generate_barcode('code128', 'b')
+        pool.generate_barcode('code128', 'c')
+
+        self.assertTrue(FakeWorker.created[0].closed)
+        self.assertEqual(len(FakeWorker.created), 2)
+        self.assertEqual(pool.recycled, 1)
+
+    def test_data_errors_keep_the_worker(self):
+        pool = GhostscriptPool(1, worker_factory=FakeWorker)
+
+        with self.assertRaises(ValueError):
+            pool.generate_barcode('code128', 'invalid')
+        pool.generate_barcode('code128', 'a')
+
+        self.assertEqual(len(FakeWorker.created), 1)
+
+    def test_worker_is_replaced_after_max_jobs(self):
+        pool = GhostscriptPool(1, max_jobs=2, worker_factory=FakeWorker)
+
+        for data in ('a', 'b', 'c'):
+            pool.generate_barcode('code128', data)
+
+        self.assertEqual([worker.jobs for worker in FakeWorker.created], [2, 1])
+        self.assertTrue(FakeWorker.created[0].closed)
+
+    def test_concurrent_jobs_never_share_a_worker(self):
+        busy = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        class SlowWorker(FakeWorker):
+            def generate_barcode(self, barcode_type, data, options=None):
+                with lock:
+                    if self in busy:
+                        overlaps.append(self)
+                    busy.add(self)
+                try:
+                    threading.Event().wait(0.005)
+                    return super().generate_barcode(barcode_type, data, options)
+                finally:
+                    with lock:
+                        busy.discard(self)
+
+        pool = GhostscriptPool(3, worker_factory=SlowWorker)
+        threads = [threading.Thread(target=pool.generate_barcode, args=('code128', str(i))) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(overlaps, [])
+        self.assertLessEqual(len(FakeWorker.created), 3)
+
+    def test_close_stops_idle_workers(self):
+        pool = GhostscriptPool(2, worker_factory=FakeWorker)
+        pool.generate_barcode('code128', 'a')
+
+        pool.close()
+
+        self.assertTrue(FakeWorker.created[0].closed)
+
+    def test_failed_start_is_retried_after_a_delay(self):
+        factory = MagicMock(side_effect=[GhostscriptError('gs not found'), GhostscriptError('gs not found'),
+                                         FakeWorker()])
+        pool = GhostscriptPool(1, worker_factory=factory)
+
+        with self.assertRaises(GhostscriptError):
+            pool.generate_barcode('code128', 'a')
+        with self.assertRaises(PoolUnavailableError):
+            pool.generate_barcode('code128', 'a')
+        self.assertEqual(factory.call_count, 1)
+
+        with patch('time.monotonic', return_value=time.monotonic() + ghostscript.START_RETRY_DELAY):
+            with self.assertRaises(GhostscriptError):
+                pool.generate_barcode('code128', 'a')
+        self.assertEqual(pool.start_failures, 2)
+
+        with patch('time.monotonic', return_value=time.monotonic() + ghostscript.MAX_START_RETRY_DELAY):
+            self.assertEqual(pool.generate_barcode('code128', 'a').width, 1)
+        self.assertEqual((factory.call_count, pool.start_failures, pool.recycled), (3, 0, 0))
+
+
+@unittest.skipIf(shutil.which('gs') is None, 'Ghostscript is not installed')
+class TestGhostscriptWorker(unittest.TestCase):
+    """Render with real Ghostscript processes and compare with treepoem"""
+
+    def setUp(self):
+        self.worker = GhostscriptWorker(timeout=30)
+        self.addCleanup(self.worker.close)
+
+    def test_output_matches_treepoem(self):
+        for barcode_type, data, options in (('code128', 'ABC123', {}), ('qrcode', 'https://example.com', {}),
+                                            ('ean13', '5901234123457', {'includetext': True}),
+                                            ('datamatrix', 'label web', {})):
+            with self.subTest(barcode_type=barcode_type):
+                expected = treepoem.generate_barcode(barcode_type, data, options).convert('RGB')
+                actual = self.worker.generate_barcode(barcode_type, data, options).convert('RGB')
+
+                self.assertEqual(actual.size, expected.size)
+                self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def test_bwipp_errors_keep_the_worker(self):
+        with self.assertRaises(treepoem.TreepoemError):
+            self.worker.generate_barcode('ean13', 'not a number')
+
+        self.assertEqual(self.worker.generate_barcode('code128', 'ok').mode, 'RGB')
+
+
+class TestGenerateBarcode(unittest.TestCase):
+    """Test choosing between the pool and treepoem"""
+
+    def tearDown(self):
+        ghostscript.get_pool({})
+
+    def test_pool_is_disabled_by_default(self):
+        self.assertIsNone(ghostscript.get_pool({}))
+        with patch('treepoem.generate_barcode', return_value='image') as mock_generate:
+            self.assertEqual(ghostscript.generate_barcode('code128', '123', {}, config={}), 'image')
+        mock_generate.assert_called_once_with(barcode_type='code128', data='123', options={})
+
+    def test_pool_is_rebuilt_when_settings_change(self):
+        first = ghostscript.get_pool({'BARCODE': {'GHOSTSCRIPT_WORKERS': 2}})
+        self.assertIs(ghostscript.get_pool({'BARCODE': {'GHOSTSCRIPT_WORKERS': 2}}), first)
+
+        second = ghostscript.get_pool({'BARCODE': {'GHOSTSCRIPT_WORKERS': 3}})
+
+        self.assertIsNot(second, first)
+        self.assertEqual(second.size, 3)
+
+    def test_failing_pool_falls_back_to_treepoem(self):
+        config = {'BARCODE': {'GHOSTSCRIPT_WORKERS': 1}}
+        pool = ghostscript.get_pool(config)
+        with patch.object(pool, 'generate_barcode', side_effect=GhostscriptError('timeout')), \
+                patch('treepoem.generate_barcode', return_value='image') as mock_generate:
+            self.assertEqual(ghostscript.generate_barcode('code128', '123', config=config), 'image')
+        mock_generate.assert_called_once()
+
+    def test_worker_without_treepoem_helpers_falls_back_to_treepoem(self):
+        config = {'BARCODE': {'GHOSTSCRIPT_WORKERS': 1}}
+        # As if a treepoem release renamed the private helper the worker uses
+        with patch.dict(treepoem.__dict__), patch('treepoem.generate_barcode', return_value='image') as mock_generate:
+            del treepoem.__dict__['_format_data_options_encoder']
+            with self.assertLogs('elements.Barcode.ghostscript', level='WARNING'):
+                self.assertEqual(ghostscript.generate_barcode('code128', '123', config=config), 'image')
+        mock_generate.assert_called_once()
+
+
+class TestParseBoundingBox(unittest.TestCase):
+
+    def test_parses_hires_bounding_box(self):
+        output = '%%BoundingBox: 3000 3000 3050 3020\n%%HiResBoundingBox: 3000.0 3000.0 3049.5 3019.25\n'
+        self.assertEqual(parse_hires_bbox(output), (3000.0, 3000.0, 3049.5, 3019.25))
+
+    def test_missing_bounding_box_is_a_worker_error(self):
+        with self.assertRaises(GhostscriptError):
+            parse_hires_bbox('GPL Ghostscript: some warning')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from elements import ElementBase
+from elements.Fetch import sessions
+from elements.Fetch.sessions import SessionPool, get_http_settings
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """Answers every request, recording the client port of the connection it came in on"""
+    protocol_version = 'HTTP/1.1'
+    delay = 0
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        time.sleep(self.delay)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSessionPool(unittest.TestCase):
+    """Test the shared keep-alive sessions used by plugins"""
+
+    def start_server(self, delay=0):
+        handler = type('Handler', (RecordingHandler,), {'delay': delay})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        server.client_ports = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, f'http://127.0.0.1:{server.server_port}'
+
+    def test_connections_are_kept_alive(self):
+        server, url = self.start_server()
+        pool = SessionPool()
+        self.addCleanup(pool.close)
+
+        for _ in range(3):
+            self.assertEqual(pool.request('get', f'{url}/api').json(), {'ok': True})
+
+        self.assertEqual(len(server.client_ports), 3)
+        self.assertEqual(len(set(server.client_ports)), 1)
+
+    def test_slow_server_times_out(self):
+        server, url = self.start_server(delay=1)
+        pool = SessionPool(read_timeout=0.1, retries=0)
+        self.addCleanup(pool.close)
+
+        start = time.monotonic()
+        with self.assertRaises(requests.exceptions.RequestException):
+            pool.request('get', url)
+        self.assertLess(time.monotonic() - start, 0.9)
+
+    def test_sessions_are_kept_per_host(self):
+        pool = SessionPool(max_hosts=2)
+        first = pool.get_session('http://one/a')
+
+        self.assertIs(pool.get_session('HTTP://ONE/b'), first)
+        self.assertIsNot(pool.get_session('https://one/a'), first)
+
+        with patch.object(first, 'close') as close:
+            pool.get_session('http://two/')
+        close.assert_called_once_with()
+
+    def test_default_timeout_can_be_overridden(self):
+        pool = SessionPool(connect_timeout=2, read_timeout=7)
+        with patch('requests.Session.request') as request:
+            pool.request('post', 'http://one/', data='x')
+            pool.request('get', 'http://one/', timeout=1)
+
+        self.assertEqual(request.call_args_list[0].args, ('POST', 'http://one/'))
+        self.assertEqual(request.call_args_list[0].kwargs, {'data': 'x', 'timeout': (2, 7)})
+        self.assertEqual(request.call_args_list[1].kwargs['timeout'], 1)
+
+
+class TestHttpSettings(unittest.TestCase):
+    """Test reading the HTTP section of the configuration"""
+
+    def test_defaults(self):
+        self.assertEqual(get_http_settings({}), sessions.DEFAULT_HTTP_SETTINGS)
+
+    def test_invalid_values_are_ignored(self):
+        with self.assertLogs('elements.Fetch.sessions', level='WARNING'):
+            settings = get_http_settings({'HTTP': {'READ_TIMEOUT': 0, 'RETRIES': 1.5, 'CONNECT_TIMEOUT': 0.5}})
+
+        self.assertEqual(settings['READ_TIMEOUT'], 30)
+        self.assertEqual(settings['RETRIES'], 2)
+        self.assertEqual(settings['CONNECT_TIMEOUT'], 0.5)
+
+    def test_pool_is_rebuilt_when_settings_change(self):
+        pool = sessions.get_pool({'HTTP': {'READ_TIMEOUT': 10}})
+
+        self.assertIs(sessions.get_pool({'HTTP': {'READ_TIMEOUT': 10}}), pool)
+        changed = sessions.get_pool({'HTTP': {'READ_TIMEOUT': 20}})
+        self.assertIsNot(changed, pool)
+        self.assertEqual(changed.timeout, (5, 20))
+
+    def test_plugins_use_the_configured_pool(self):
+        with patch.object(ElementBase, 'config', {'HTTP': {'CONNECT_TIMEOUT': 3}}), \
+             patch('requests.Session.request', return_value=MagicMock()) as request:
+            ElementBase.http_request('get', 'http://one/')
+
+        self.assertEqual(request.call_args.kwargs['timeout'], (3, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
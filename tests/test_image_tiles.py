@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image, JpegImagePlugin
+
+from elements import ElementBase
+from elements.ImageElement.Element import IMAGE_TILE_CACHE, element_image_base, get_file_tile
+
+
+class TestImageTileCache(unittest.TestCase):
+    """Test caching the final resized tiles of image files"""
+
+    def setUp(self):
+        IMAGE_TILE_CACHE.invalidate()
+        self.addCleanup(IMAGE_TILE_CACHE.invalidate)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'logo.png')
+        image = Image.new('RGB', (40, 20), 'black')
+        image.paste((255, 0, 0), (20, 0, 40, 20))
+        image.save(self.path)
+
+    def render(self, element):
+        im = Image.new('RGBA', (60, 60), 'white')
+        ElementBase.process_with_plugins(ElementBase.compile_template(element), im, [0, 0, 0, 0], (60, 60), {})
+        return im
+
+    def test_file_is_decoded_once(self):
+        element = {'type': 'image_file', 'file': self.path, 'position': [5, 5], 'width': 20}
+
+        with patch('PIL.Image.open', wraps=Image.open) as image_open:
+            first = self.render(element)
+            second = self.render(element)
+
+        image_open.assert_called_once()
+        self.assertEqual(first.tobytes(), second.tobytes())
+        self.assertEqual(first.getpixel((5, 5)), (0, 0, 0, 255))
+        self.assertEqual(first.getpixel((24, 5)), (255, 0, 0, 255))
+        self.assertEqual(first.getpixel((25, 5)), (255, 255, 255, 255))
+
+    def test_cached_tile_matches_uncached_rendering(self):
+        element = {'type': 'image_file', 'file': self.path, 'position': [0, 0, 30, 30]}
+        expected = Image.new('RGBA', (60, 60), 'white')
+        with Image.open(self.path) as image:
+            element_image_base(image, element, expected, [0, 0, 0, 0], (60, 60))
+
+        self.assertEqual(self.render(element).tobytes(), expected.tobytes())
+
+    def test_changed_file_or_placement_is_loaded_again(self):
+        element = {'type': 'image_file', 'file': self.path, 'position': [0, 0], 'width': 20}
+        get_file_tile(self.path, element)
+        get_file_tile(self.path, dict(element, width=10))
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        tile, position = get_file_tile(self.path, element)
+
+        self.assertEqual(len(IMAGE_TILE_CACHE), 3)
+        self.assertEqual((tile.size, tile.mode, tuple(position)), ((20, 10), 'RGBA', (0, 0)))
+
+    def test_jpeg_is_decoded_at_reduced_scale(self):
+        path = os.path.join(os.path.dirname(self.path), 'photo.jpg')
+        Image.new('RGB', (1600, 800), 'blue').save(path)
+
+        with patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True,
+                          wraps=JpegImagePlugin.JpegImageFile.draft) as draft:
+            tile, _ = get_file_tile(path, {'position': [0, 0], 'width': 100})
+
+        self.assertEqual(draft.call_args.args[1:], (None, (100, 50)))
+        self.assertEqual(tile.size, (100, 50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+from PIL import Image
+
+from elements import ElementBase
+from elements.ImageElement import url_cache
+from elements.ImageElement.url_cache import IMAGE_URL_CACHE, get_image
+
+URL = 'http://img/logo.png'
+
+
+def png_bytes(color='black', size=(4, 4)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def http_response(content=b'', status_code=200, headers=None):
+    response = MagicMock(content=content, status_code=status_code, headers=headers or {})
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+    return response
+
+
+class TestImageUrlCache(unittest.TestCase):
+    """Test the memory and disk tiers of the image_url cache"""
+
+    def setUp(self):
+        IMAGE_URL_CACHE.invalidate()
+        self.addCleanup(IMAGE_URL_CACHE.invalidate)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = temp_dir.name
+        self.config = patch.object(ElementBase, 'config', {'CACHE': {'IMAGE_URL_CACHE_DIR': self.cache_dir}})
+        self.config.start()
+        self.addCleanup(self.config.stop)
+        self.request = MagicMock(return_value=http_response(png_bytes(), headers={'ETag': '"logo-1"'}))
+
+    def test_fresh_image_is_not_requested_again(self):
+        first = get_image(URL, self.request)
+        second = get_image(URL, self.request)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.mode, 'RGBA')
+        self.request.assert_called_once_with('get', URL, headers={})
+
+    def test_stale_image_is_revalidated(self):
+        first = get_image(URL, self.request, ttl=0)
+        self.request.return_value = http_response(status_code=304)
+
+        self.assertIs(get_image(URL, self.request, ttl=0), first)
+        self.assertEqual(self.request.call_args.kwargs['headers'], {'If-None-Match': '"logo-1"'})
+
+    def test_changed_image_is_downloaded(self):
+        get_image(URL, self.request, ttl=0)
+        self.request.return_value = http_response(png_bytes('white'), headers={'ETag': '"logo-2"'})
+
+        image = get_image(URL, self.request, ttl=0)
+
+        self.assertEqual(image.getpixel((0, 0)), (255, 255, 255, 255))
+
+    def test_disk_copy_is_revalidated_after_restart(self):
+        get_image(URL, self.request)
+        IMAGE_URL_CACHE.invalidate()
+        self.request.return_value = http_response(status_code=304)
+
+        image = get_image(URL, self.request)
+
+        self.assertEqual(self.request.call_args.kwargs['headers'], {'If-None-Match': '"logo-1"'})
+        self.assertEqual(image.size, (4, 4))
+        self.assertIn(URL, IMAGE_URL_CACHE)
+
+    def test_stale_copy_is_used_when_server_fails(self):
+        first = get_image(URL, self.request, ttl=0)
+        self.request.side_effect = requests.ConnectionError('unreachable')
+
+        with self.assertLogs('elements.ImageElement.url_cache', level='WARNING'):
+            self.assertIs(get_image(URL, self.request), first)
+
+    def test_missing_image_raises(self):
+        self.request.return_value = http_response(status_code=404)
+
+        with self.assertRaises(requests.HTTPError):
+            get_image(URL, self.request)
+
+    def test_unexpected_not_modified_is_fetched_again(self):
+        self.request.side_effect = [http_response(status_code=304), self.request.return_value]
+
+        image = get_image(URL, self.request)
+
+        self.assertEqual(image.size, (4, 4))
+        self.assertEqual([call.kwargs['headers'] for call in self.request.call_args_list],
+                         [{}, {'Cache-Control': 'no-cache'}])
+
+    def test_repeated_not_modified_without_cached_copy_raises(self):
+        self.request.return_value = http_response(status_code=304)
+
+        with self.assertRaisesRegex(ValueError, '304 Not Modified'):
+            get_image(URL, self.request)
+        self.assertNotIn(URL, IMAGE_URL_CACHE)
+
+    def test_disk_tier_is_bounded_by_size(self):
+        ElementBase.config['CACHE']['IMAGE_URL_CACHE_DIR_SIZE'] = 2 * len(png_bytes())
+
+        for i in range(4):
+            get_image(f'{URL}?v={i}', self.request)
+            # Distinct modification times, so the oldest files are evicted first
+            time.sleep(0.01)
+
+        stored = sorted(name for name in os.listdir(self.cache_dir) if name.endswith('.bin'))
+        self.assertEqual(len(stored), 2)
+        self.assertIsNotNone(url_cache._load_from_disk(self.cache_dir, f'{URL}?v=3'))
+        self.assertIsNone(url_cache._load_from_disk(self.cache_dir, f'{URL}?v=0'))
+
+    def test_memory_tier_is_bounded_by_size(self):
+        self.addCleanup(IMAGE_URL_CACHE.resize, IMAGE_URL_CACHE.maxsize)
+        IMAGE_URL_CACHE.resize(2 * 4 * 4 * 4)
+
+        for i in range(3):
+            get_image(f'{URL}?v={i}', self.request)
+
+        self.assertEqual(len(IMAGE_URL_CACHE), 2)
+
+    def test_element_cache_ttl_overrides_configuration(self):
+        self.assertEqual(url_cache.get_ttl({'cache_ttl': 5}), 5)
+        self.assertEqual(url_cache.get_ttl({}), url_cache.DEFAULT_TTL)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 from PIL import Image
 import elements
 
@@ -50,6 +51,12 @@ class TestInjectData(unittest.TestCase):
         # Should not raise
         self.injector.process_element(element, self.im, self.margins, self.dimensions, payload, **kwargs)
 
+    def process_and_record_children(self, element):
+        """Process element and return the child definitions handed to the plugins"""
+        with patch.object(elements.ElementBase, 'process_with_plugins') as mock_process:
+            self.injector.process_element(element, self.im, self.margins, self.dimensions, {})
+        return [call.args[0] for call in mock_process.call_args_list]
+
     def test_inject_children(self):
         children = [
             {'type': 'text', 'name': 'Child 1'},
@@ -64,14 +71,15 @@ class TestInjectData(unittest.TestCase):
             'override': False,
             'elements': children
         }
-        payload = {}
-        kwargs = {}
-        self.injector.process_element(element, self.im, self.margins, self.dimensions, payload, **kwargs)
-        # ensure dict children got updated according to override behavior
-        self.assertEqual(element['elements'][0].get('datakey'), 'title')
+        processed = self.process_and_record_children(element)
+        # ensure dict children received the injected value according to override behavior
+        self.assertEqual(processed[0].get('datakey'), 'title')
         # second child already had datakey; since override False, it should remain unchanged
-        self.assertEqual(element['elements'][1].get('datakey'), 'already')
-        # non-dict child should remain as-is
+        self.assertEqual(processed[1].get('datakey'), 'already')
+        # non-dict child is not processed
+        self.assertEqual(len(processed), 2)
+        # the template definition itself is not modified
+        self.assertNotIn('datakey', element['elements'][0])
         self.assertEqual(element['elements'][2], 'non-dict-child-ignored')
 
     def test_inject_children_override_true(self):
@@ -87,12 +95,22 @@ class TestInjectData(unittest.TestCase):
             'override': True,
             'elements': children
         }
-        payload = {}
-        kwargs = {}
-        self.injector.process_element(element, self.im, self.margins, self.dimensions, payload, **kwargs)
+        processed = self.process_and_record_children(element)
         # Both children should be overwritten
-        self.assertEqual(element['elements'][0].get('datakey'), 'new_value')
-        self.assertEqual(element['elements'][1].get('datakey'), 'new_value')
+        self.assertEqual(processed[0].get('datakey'), 'new_value')
+        self.assertEqual(processed[1].get('datakey'), 'new_value')
+        self.assertEqual(element['elements'][0].get('datakey'), 'old')
+
+    def test_inject_children_into_compiled_template(self):
+        element = elements.ElementBase.compile_template({
+            'type': 'inject_data',
+            'target_key': 'datakey',
+            'data': 'title',
+            'target': 'children',
+            'elements': [{'type': 'text', 'name': 'Child 1'}]
+        })
+        processed = self.process_and_record_children(element)
+        self.assertEqual(processed[0].get('datakey'), 'title')
 
     def test_unknown_target_no_crash(self):
         element = {
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from bottle import BaseRequest
+
+import brother_ql_web
+
+
+def make_request(**params):
+    return BaseRequest({'REQUEST_METHOD': 'GET', 'QUERY_STRING': urlencode(params)})
+
+
+class TestLabelContext(unittest.TestCase):
+    """Test the media profiles and per-request memoization of get_label_context"""
+
+    def setUp(self):
+        brother_ql_web.MEDIA_PROFILES.invalidate()
+        config = {
+            'PRINTER': {'ATTRIBUTE_CACHE_TTL': 60},
+            'LABEL': {'DEFAULT_FONTS': {'family': 'Sans', 'style': 'Book'}},
+        }
+        instance = brother_ql_web.instance
+        self.patches = [
+            patch.object(brother_ql_web, 'CONFIG', config),
+            patch.object(brother_ql_web, 'FONTS', {'Sans': {'Book': '/fonts/sans.ttf'}}),
+            patch.object(instance, 'get_default_label_size', return_value='62'),
+            patch.object(instance, 'get_label_kind', return_value='ENDLESS_LABEL'),
+            patch.object(instance, 'get_label_dimensions', return_value=(300, 900)),
+            patch.object(instance, '_get_printer_dpi', return_value=300, create=True),
+        ]
+        for p in self.patches:
+            p.start()
+        self.instance = instance
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        brother_ql_web.MEDIA_PROFILES.invalidate()
+
+    def test_context_uses_media_profile(self):
+        context = brother_ql_web.get_label_context(make_request(printer='p1', label_size='62red'))
+
+        self.assertEqual(context['label_size'], '62red')
+        self.assertEqual(context['kind'], 'ENDLESS_LABEL')
+        self.assertEqual((context['width'], context['height']), (900, 300))
+        self.assertEqual(context['fill_color'], (255, 0, 0))
+        self.assertEqual(context['media_dpi'], 300)
+        self.assertEqual(context['font_path'], '/fonts/sans.ttf')
+
+    def test_requested_dpi_is_passed_through(self):
+        context = brother_ql_web.get_label_context(make_request(printer='p1', dpi='600'))
+
+        self.assertEqual(context['dpi'], '600')
+        self.assertEqual(context['media_dpi'], 300)
+
+    def test_rotated_orientation_swaps_profile_dimensions(self):
+        context = brother_ql_web.get_label_context(make_request(printer='p1', orientation='rotated'))
+
+        self.assertEqual((context['width'], context['height']), (300, 900))
+
+    def test_default_label_size_is_resolved_once(self):
+        brother_ql_web.get_label_context(make_request(printer='p1'))
+
+        self.instance.get_default_label_size.assert_called_once_with('p1')
+
+    def test_profile_is_shared_between_requests(self):
+        brother_ql_web.get_label_context(make_request(printer='p1', label_size='62'))
+        brother_ql_web.get_label_context(make_request(printer='p1', label_size='62', text='second'))
+        brother_ql_web.get_label_context(make_request(printer='p2', label_size='62'))
+
+        self.assertEqual(self.instance.get_label_dimensions.call_count, 2)
+        self.assertEqual(self.instance.get_label_kind.call_count, 2)
+        self.assertEqual(self.instance._get_printer_dpi.call_count, 2)
+
+    def test_zero_ttl_disables_profile_cache(self):
+        brother_ql_web.CONFIG['PRINTER']['ATTRIBUTE_CACHE_TTL'] = 0
+
+        brother_ql_web.get_label_context(make_request(printer='p1', label_size='62'))
+        brother_ql_web.get_label_context(make_request(printer='p1', label_size='62'))
+
+        self.assertEqual(self.instance.get_label_dimensions.call_count, 2)
+
+    def test_context_is_memoized_per_request(self):
+        request = make_request(printer='p1', label_size='62')
+
+        first = brother_ql_web.get_label_context(request)
+        second = brother_ql_web.get_label_context(request)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, brother_ql_web.get_label_context(make_request(printer='p1', label_size='62')))
+
+    def test_preview_headers_use_context_dpi(self):
+        context = brother_ql_web.get_label_context(make_request(printer='p1'))
+        self.instance._get_printer_dpi.reset_mock()
+
+        with patch.object(brother_ql_web, 'response') as response:
+            brother_ql_web.set_preview_metadata_headers(context)
+
+        response.set_header.assert_any_call('X-Label-DPI', '300')
+        self.instance._get_printer_dpi.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from elements import ElementBase
+from elements.Barcode import linear
+
+
+def read_runs(im, y):
+    """Read the bar/space widths in pixels from one row of a rendered barcode, starting at the first bar"""
+    row = [im.getpixel((x, y)) for x in range(im.width)]
+    dark = [pixel == (0, 0, 0) for pixel in row]
+    start = dark.index(True)
+    end = len(dark) - dark[::-1].index(True)
+    runs = []
+    previous = None
+    for is_dark in dark[start:end]:
+        if is_dark == previous:
+            runs[-1] += 1
+        else:
+            runs.append(1)
+            previous = is_dark
+    return runs
+
+
+class TestLinearEncoders(unittest.TestCase):
+    """Test the native Code 128, Code 39 and EAN/UPC encoders"""
+
+    def test_code128_values(self):
+        self.assertEqual(linear.code128_values('PJJ123C'), [104, 48, 42, 42, 17, 18, 19, 35, 55, 106])
+
+    def test_code128_uses_code_set_c_for_digit_runs(self):
+        self.assertEqual(linear.code128_values('12345678'), [105, 12, 34, 56, 78, 47, 106])
+        self.assertEqual(linear.code128_values('AB123456CD')[:8], [104, 33, 34, 99, 12, 34, 56, 100])
+
+    def test_code128_switches_to_code_set_a_for_control_characters(self):
+        self.assertEqual(linear.code128_values('a\tb')[:5], [104, 65, 101, 73, 100])
+
+    def test_code128_rejects_non_ascii(self):
+        with self.assertRaises(ValueError):
+            linear.encode('code128', 'Grüße')
+
+    def test_code39(self):
+        runs = linear.encode('code39', 'A1')
+        # Start, two characters and stop, each 3 wide + 6 narrow elements, with 3 gaps in between
+        self.assertEqual(len(runs), 4 * 9 + 3)
+        self.assertEqual(sum(runs), 4 * (3 * 3 + 6) + 3)
+        with self.assertRaises(ValueError):
+            linear.encode('code39', 'a*b')
+
+    def test_ean13_check_digit_is_added_and_verified(self):
+        self.assertEqual(linear.encode('ean13', '400638133393'), linear.encode('ean13', '4006381333931'))
+        self.assertEqual(sum(linear.encode('ean13', '4006381333931')), 95)
+        with self.assertRaises(ValueError):
+            linear.encode('ean13', '4006381333932')
+
+    def test_ean8_and_upca(self):
+        self.assertEqual(sum(linear.encode('ean8', '9638507')), 67)
+        self.assertEqual(linear.encode('upca', '03600029145'), linear.encode('ean13', '0036000291452'))
+
+
+class TestNativeEngine(unittest.TestCase):
+    """Test CodeElement engine selection and the pixels drawn by the native engine"""
+
+    def setUp(self):
+        self.im = Image.new('RGB', (600, 200), 'white')
+
+    def render(self, **element):
+        element = dict({'type': 'code', 'data': 'ASSET-000123', 'code_type': 'code128'}, **element)
+        return ElementBase.process_with_plugins(element, self.im, [0, 0, 0, 0], self.im.size, {})
+
+    def test_auto_engine_draws_without_ghostscript(self):
+        with patch('treepoem.generate_barcode', side_effect=AssertionError('treepoem used')):
+            self.render(horizontal_offset=10, vertical_offset=5)
+
+        expected = [width * linear.DEFAULT_MODULE_WIDTH for width in linear.encode('code128', 'ASSET-000123')]
+        self.assertEqual(read_runs(self.im, 5), expected)
+        self.assertEqual(read_runs(self.im, 5 + linear.DEFAULT_HEIGHT - 1), expected)
+        self.assertEqual(self.im.getpixel((10, 4)), (255, 255, 255))
+        self.assertEqual(self.im.getpixel((10, 5 + linear.DEFAULT_HEIGHT)), (255, 255, 255))
+
+    def test_native_engine_centres_whole_pixel_modules_in_img_size(self):
+        runs = linear.encode('code128', 'ASSET-000123')
+        self.render(img_size='500x100', engine='native')
+
+        modules = sum(runs)
+        scale = min(500 / (modules * linear.DEFAULT_MODULE_WIDTH), 100 / linear.DEFAULT_HEIGHT)
+        width = int(modules * linear.DEFAULT_MODULE_WIDTH * scale)
+        module_width = max(1, width // modules)
+        self.assertEqual(read_runs(self.im, 0), [run * module_width for run in runs])
+        self.assertEqual(self.im.getpixel(((width - modules * module_width) // 2, 0)), (0, 0, 0))
+        self.assertEqual(self.im.getpixel((0, int(linear.DEFAULT_HEIGHT * scale))), (255, 255, 255))
+
+    def test_auto_engine_keeps_the_treepoem_size(self):
+        # ABC123 has 101 modules, so 300 px cannot be drawn with whole pixel modules
+        treepoem_output = Image.new('RGB', (101 * linear.DEFAULT_MODULE_WIDTH, linear.DEFAULT_HEIGHT))
+        for img_size in (300, '300x80'):
+            with patch('treepoem.generate_barcode', return_value=treepoem_output) as mock_generate:
+                self.render(data='ABC123', img_size=img_size)
+            mock_generate.assert_called_once()
+
+        with patch('treepoem.generate_barcode', side_effect=AssertionError('treepoem used')):
+            self.render(data='ABC123', img_size=404, horizontal_offset=0)
+        self.assertEqual(read_runs(self.im, 0), [run * 4 for run in linear.encode('code128', 'ABC123')])
+
+    def test_barcode_size_matches_treepoem_scaling(self):
+        runs = linear.encode('code128', 'ABC123')
+        self.assertEqual(linear.barcode_size(runs), (2, 144, 202))
+        self.assertEqual(linear.barcode_size(runs, 300), (2, 213, 300))
+        self.assertEqual(linear.barcode_size(runs, '300x80'), (1, 80, 112))
+
+    def test_unsupported_type_and_options_fall_back_to_treepoem(self):
+        with patch('treepoem.generate_barcode', return_value=Image.new('RGB', (20, 20))) as mock_generate:
+            self.render(code_type='qrcode', data='native-unsupported')
+            self.render(data='with-options', options={'includetext': True})
+            self.render(data='forced', engine='treepoem')
+
+        self.assertEqual(mock_generate.call_count, 3)
+
+    def test_invalid_data_falls_back_in_auto_mode(self):
+        with patch('treepoem.generate_barcode', side_effect=RuntimeError('bad check digit')) as mock_generate:
+            with self.assertRaises(ValueError):
+                self.render(code_type='ean13', data='4006381333932')
+        mock_generate.assert_called_once()
+
+    def test_native_engine_reports_errors(self):
+        with self.assertRaises(ValueError):
+            self.render(code_type='qrcode', engine='native')
+        with self.assertRaises(ValueError):
+            self.render(code_type='code39', data='lower case', engine='native')
+        with self.assertRaises(ValueError):
+            self.render(engine='ghostscript')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+from PIL import Image
+
+from elements import ElementBase
+
+
+class TestPluginDispatch(unittest.TestCase):
+    """Test the type-indexed plugin dispatch of ElementBase"""
+
+    def setUp(self):
+        self.registered = []
+        self.calls = []
+
+    def tearDown(self):
+        for handler in self.registered:
+            ElementBase.unregister_handler(handler)
+
+    def make_typed_plugin(self, type_name):
+        calls = self.calls
+
+        class TypedPlugin(ElementBase):
+            element_type = type_name
+
+            def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+                calls.append((element['type'], self))
+                return im
+
+        self.registered.append(TypedPlugin)
+        return TypedPlugin
+
+    def test_typed_plugin_is_found_by_type(self):
+        plugin = self.make_typed_plugin('dispatch_typed')
+
+        self.assertIn(plugin, ElementBase._handlers_by_type['dispatch_typed'])
+        self.assertNotIn(plugin, ElementBase._predicate_handlers)
+        self.assertTrue(plugin.can_process({'type': 'dispatch_typed'}))
+        self.assertFalse(plugin.can_process({'type': 'other'}))
+
+    def test_handler_instance_is_shared(self):
+        self.make_typed_plugin('dispatch_shared')
+        im = Image.new('RGB', (1, 1))
+
+        ElementBase.process_with_plugins({'type': 'dispatch_shared'}, im, [0, 0, 0, 0], (1, 1), {})
+        ElementBase.process_with_plugins({'type': 'dispatch_shared'}, im, [0, 0, 0, 0], (1, 1), {})
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertIs(self.calls[0][1], self.calls[1][1])
+
+    def test_custom_can_process_uses_predicate_path(self):
+        calls = self.calls
+
+        class PredicatePlugin(ElementBase):
+            @staticmethod
+            def can_process(element):
+                return element.get('type') == 'dispatch_predicate' and 'data' in element
+
+            def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+                calls.append(element['data'])
+                return im
+
+        self.registered.append(PredicatePlugin)
+        im = Image.new('RGB', (1, 1))
+
+        self.assertIn(PredicatePlugin, ElementBase._predicate_handlers)
+        ElementBase.process_with_plugins({'type': 'dispatch_predicate'}, im, [0, 0, 0, 0], (1, 1), {})
+        ElementBase.process_with_plugins({'type': 'dispatch_predicate', 'data': 'x'}, im, [0, 0, 0, 0], (1, 1), {})
+
+        self.assertEqual(calls, ['x'])
+
+    def test_handlers_run_in_registration_order(self):
+        calls = self.calls
+
+        class EarlyPredicatePlugin(ElementBase):
+            @staticmethod
+            def can_process(element):
+                return element.get('type') == 'dispatch_order'
+
+            def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+                calls.append('predicate')
+                return im
+
+        self.registered.append(EarlyPredicatePlugin)
+        self.make_typed_plugin('dispatch_order')
+
+        handlers = ElementBase.get_handlers({'type': 'dispatch_order'})
+
+        self.assertIsInstance(handlers[0], EarlyPredicatePlugin)
+        ElementBase.process_with_plugins({'type': 'dispatch_order'}, Image.new('RGB', (1, 1)), [0, 0, 0, 0], (1, 1), {})
+        self.assertEqual(calls[0], 'predicate')
+
+    def test_builtin_plugins_are_typed(self):
+        for element_type in ['text', 'code', 'datamatrix', 'json_api', 'from_json_payload', 'inject_data']:
+            handlers = ElementBase.get_handlers({'type': element_type})
+            self.assertEqual(len(handlers), 1, element_type)
+
+    def test_process_with_plugins_returns_image_for_nested_containers(self):
+        self.make_typed_plugin('dispatch_leaf')
+        im = Image.new('RGB', (1, 1))
+        element = ElementBase.compile_template({'type': 'passthrough', 'elements': [
+            {'type': 'dispatch_leaf'},
+            {'type': 'dispatch_leaf'},
+        ]})
+
+        result = ElementBase.process_with_plugins(element, im, [0, 0, 0, 0], (1, 1), {})
+
+        self.assertIs(result, im)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_unknown_type_falls_back_to_default_form_elements(self):
+        fields = ElementBase.get_form_elements_with_plugins({'type': 'dispatch_unknown', 'key': 'name'})
+
+        self.assertEqual(fields['name'], 'name')
+
+
+if __name__ == '__main__':
+    unittest.main()
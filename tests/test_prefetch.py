@@ -0,0 +1,105 @@
+import io
+import json
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from PIL import Image
+
+from elements import ElementBase
+from elements.Fetch import PREFETCH_KWARG, Prefetch, Prefetcher
+from elements.ImageElement.url_cache import IMAGE_URL_CACHE
+
+
+def api_response(data):
+    return MagicMock(content=json.dumps(data).encode())
+
+
+class TestPrefetcher(unittest.TestCase):
+    """Test starting prefetches and consuming their results"""
+
+    def test_identical_requests_are_made_once(self):
+        fetch = MagicMock(return_value='result')
+        prefetcher = Prefetcher([Prefetch('a', fetch), Prefetch('a', fetch)])
+
+        self.assertEqual(len(prefetcher), 1)
+        self.assertEqual(prefetcher.take('a', MagicMock()), 'result')
+        fetch.assert_called_once_with()
+
+    def test_unknown_request_is_fetched_now(self):
+        prefetcher = Prefetcher([Prefetch('a', lambda: 'a')])
+
+        self.assertEqual(prefetcher.take('b', lambda: 'b'), 'b')
+
+    def test_errors_are_raised_when_taken(self):
+        prefetcher = Prefetcher([Prefetch('a', MagicMock(side_effect=ValueError('offline')))])
+
+        with self.assertRaisesRegex(ValueError, 'offline'):
+            prefetcher.take('a', MagicMock())
+
+
+class TestPrefetchPlugins(unittest.TestCase):
+    """Test the data source plugins fetch their data ahead of drawing"""
+
+    def setUp(self):
+        self.im = Image.new('RGBA', (20, 20), 'white')
+        IMAGE_URL_CACHE.invalidate()
+
+    def render(self, elements, payload):
+        kwargs = ElementBase.start_prefetch(elements, payload)
+        for element in elements:
+            ElementBase.process_with_plugins(element, self.im, [0, 0, 0, 0], (20, 20), payload, **kwargs)
+        return kwargs
+
+    def test_json_api_requests_run_concurrently(self):
+        # Both requests must be in flight at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def get(method, url, **kwargs):
+            barrier.wait()
+            return api_response({'url': url})
+
+        elements = [
+            {'type': 'json_api', 'endpoint': 'http://one'},
+            {'type': 'passthrough', 'elements': [{'type': 'json_api', 'endpoint': 'http://two'}]},
+        ]
+        with patch('requests.Session.request', side_effect=get) as mock_get:
+            kwargs = self.render(elements, {})
+
+        self.assertEqual(len(kwargs[PREFETCH_KWARG]), 2)
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_grocy_entry_is_prefetched(self):
+        elements = [{'type': 'grocy_entry', 'endpoint': 'http://grocy', 'api_key': 'secret'}]
+
+        with patch('requests.Session.request', return_value=api_response({})) as mock_get:
+            kwargs = self.render(elements, {'grocycode': 'grcy:p:1'})
+
+        self.assertEqual(len(kwargs[PREFETCH_KWARG]), 1)
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.args, ('GET', 'http://grocy/api/stock/products/1'))
+
+    def test_requests_with_side_effects_are_not_prefetched(self):
+        elements = [{'type': 'json_api', 'endpoint': 'http://one', 'method': 'post'}]
+
+        self.assertEqual(ElementBase.start_prefetch(elements, {}), {})
+
+    def test_same_image_url_is_downloaded_once(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4), 'black').save(buffer, format='PNG')
+        download = MagicMock(content=buffer.getvalue())
+        elements = [
+            {'type': 'image_url', 'url': 'http://img/logo.png', 'position': [0, 0]},
+            {'type': 'image_url', 'url': 'http://img/logo.png', 'position': [10, 10]},
+        ]
+
+        with patch('requests.Session.request', return_value=download) as mock_get:
+            self.render(elements, {})
+
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.args, ('GET', 'http://img/logo.png'))
+        self.assertEqual(self.im.getpixel((11, 11)), (0, 0, 0, 255))
+
+
+if __name__ == '__main__':
+    unittest.main()
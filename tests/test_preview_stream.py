@@ -0,0 +1,96 @@
+import base64
+import io
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from bottle import request, response
+from PIL import Image
+
+import brother_ql_web
+
+
+class TestStreamPreviews(unittest.TestCase):
+    """Test streaming batch previews as NDJSON"""
+
+    def setUp(self):
+        self.context = {'printer': 'p1', 'label_size': '62', 'media_dpi': 300}
+        self.patches = [
+            patch.object(brother_ql_web, 'get_template_data', return_value={'elements': ()}),
+            patch.object(brother_ql_web, 'get_label_context', return_value=self.context),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def post(self, body):
+        request.bind({'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': 'application/json',
+                      'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)})
+        response.bind()
+        return brother_ql_web.stream_preview_template_images('labels.lbl')
+
+    def test_one_line_per_payload(self):
+        def render(template, payload, **context):
+            if payload['name'] == 'broken':
+                raise ValueError('cannot render')
+            return Image.new('RGB', (20 + len(payload['name']), 10), 'white')
+
+        with patch.object(brother_ql_web, 'create_label_from_template', side_effect=render):
+            lines = [json.loads(line) for line in self.post(b'[{"name": "a"}, {"name": "broken"}, {"name": "ccc"}]')]
+
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        self.assertEqual(response.get_header('X-Label-DPI'), '300')
+        by_index = {line['index']: line for line in lines}
+        self.assertEqual(sorted(by_index), [0, 1, 2])
+        self.assertEqual(by_index[1]['error'], 'cannot render')
+        self.assertEqual(by_index[2]['width'], 23)
+        with Image.open(io.BytesIO(base64.b64decode(by_index[0]['image']))) as im:
+            self.assertEqual(im.size, (21, 10))
+        self.assertTrue(all('render_ms' in line for line in lines))
+
+    def test_first_line_does_not_wait_for_slow_renders(self):
+        release = threading.Event()
+
+        def render(template, payload, **context):
+            if payload['name'] == 'slow':
+                release.wait(5)
+            return Image.new('RGB', (10, 10), 'white')
+
+        with patch.object(brother_ql_web, 'create_label_from_template', side_effect=render):
+            lines = self.post(b'[{"name": "slow"}, {"name": "fast"}]')
+            first = json.loads(next(lines))
+            release.set()
+            rest = [json.loads(line) for line in lines]
+
+        self.assertEqual(first['index'], 1)
+        self.assertEqual([line['index'] for line in rest], [0])
+
+    def test_renders_at_most_preview_workers_labels_at_once(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def render(template, payload, **context):
+            with lock:
+                running.append(payload)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(payload)
+            return Image.new('RGB', (10, 10), 'white')
+
+        with patch.dict(brother_ql_web.CONFIG, {'SERVER': {'PREVIEW_WORKERS': 2}}), \
+             patch.object(brother_ql_web, 'create_label_from_template', side_effect=render):
+            lines = list(self.post(json.dumps([{'n': i} for i in range(10)]).encode()))
+
+        self.assertEqual(len(lines), 10)
+        self.assertLessEqual(max(peak), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
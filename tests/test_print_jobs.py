@@ -0,0 +1,180 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bottle import request, response
+
+import brother_ql_web
+from print_jobs import PrintJobQueue
+
+
+class TestPrintJobQueue(unittest.TestCase):
+    """Test the background print job queue"""
+
+    def setUp(self):
+        self.queue = PrintJobQueue(workers=1)
+
+    def test_successful_job_is_submitted_with_cups_job_id(self):
+        printed = []
+        job = self.queue.submit(lambda: 'image', lambda im: printed.append(im) or {'success': True, 'job_id': 42},
+                                printer='p1')
+
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.state, 'submitted')
+        self.assertEqual(job.cups_job_id, 42)
+        self.assertEqual(printed, ['image'])
+        self.assertEqual(job.as_dict()['printer'], 'p1')
+        self.assertIs(self.queue.get(job.id), job)
+
+    def test_failed_print_and_render_errors_fail_the_job(self):
+        rejected = self.queue.submit(lambda: 'image', lambda im: {'success': False, 'message': 'printer offline'})
+        broken = self.queue.submit(MagicMock(side_effect=ValueError('bad template')), MagicMock())
+
+        self.assertTrue(rejected.wait(5))
+        self.assertTrue(broken.wait(5))
+        self.assertEqual((rejected.state, rejected.error), ('failed', 'printer offline'))
+        self.assertEqual((broken.state, broken.error), ('failed', 'bad template'))
+
+    def test_job_is_queued_while_workers_are_busy(self):
+        release = threading.Event()
+        first = self.queue.submit(lambda: release.wait(5), lambda im: {'success': True, 'job_id': 1})
+        second = self.queue.submit(lambda: 'image', lambda im: {'success': True, 'job_id': 2})
+
+        self.assertEqual(second.state, 'queued')
+        self.assertEqual(self.queue.pending(), 2)
+        release.set()
+        self.assertTrue(first.wait(5) and second.wait(5))
+        self.assertEqual(self.queue.pending(), 0)
+
+    def test_refresh_cups_state(self):
+        job = self.queue.submit(lambda: 'image', lambda im: {'success': True, 'job_id': 7})
+        job.wait(5)
+
+        job.refresh_cups_state(lambda job_id: {'state': 'processing', 'reasons': []})
+        self.assertEqual(job.state, 'submitted')
+        self.assertEqual(job.cups_state['state'], 'processing')
+
+        job.refresh_cups_state(lambda job_id: {'state': 'completed', 'reasons': ['job-completed-successfully']})
+        self.assertEqual(job.state, 'completed')
+
+    def test_canceled_cups_job_fails_the_job(self):
+        job = self.queue.submit(lambda: 'image', lambda im: {'success': True, 'job_id': 7})
+        job.wait(5)
+
+        job.refresh_cups_state(lambda job_id: {'state': 'canceled', 'reasons': ['job-canceled-by-user']})
+
+        self.assertEqual(job.state, 'failed')
+        self.assertIn('job-canceled-by-user', job.error)
+
+    def test_history_limits_finished_jobs(self):
+        self.queue.configure({'PRINTER': {'JOB_HISTORY': 2}})
+        jobs = [self.queue.submit(lambda: 'image', lambda im: {'success': True}) for _ in range(4)]
+        for job in jobs:
+            job.wait(5)
+        self.queue.submit(lambda: 'image', lambda im: {'success': True}).wait(5)
+
+        self.assertIsNone(self.queue.get(jobs[0].id))
+        self.assertIs(self.queue.get(jobs[3].id), jobs[3])
+
+    def test_invalid_configuration_is_ignored(self):
+        with self.assertLogs('print_jobs', level='WARNING'):
+            self.queue.configure({'PRINTER': {'JOB_WORKERS': 0}})
+        self.assertEqual(self.queue.workers, 1)
+
+    def test_close_waits_for_queued_jobs(self):
+        release = threading.Event()
+        first = self.queue.submit(lambda: release.wait(5), lambda im: {'success': True, 'job_id': 1})
+        second = self.queue.submit(lambda: 'image', lambda im: {'success': True, 'job_id': 2})
+
+        self.assertFalse(self.queue.close(0.05))
+        with self.assertRaises(RuntimeError):
+            self.queue.submit(lambda: 'image', lambda im: {'success': True})
+        release.set()
+
+        self.assertTrue(self.queue.close(5))
+        self.assertEqual((first.state, second.state), ('submitted', 'submitted'))
+
+
+class TestPrintJobRoutes(unittest.TestCase):
+    """Test queuing print requests and looking up their jobs through the routes"""
+
+    def setUp(self):
+        self.queue = PrintJobQueue(workers=1)
+        self.context = {'text': 'Hello', 'printer': 'p1', 'label_size': '62', 'quantity': 1}
+        self.patches = [
+            patch.object(brother_ql_web, 'PRINT_JOBS', self.queue),
+            patch.object(brother_ql_web, 'DEBUG', False, create=True),
+            patch.object(brother_ql_web, 'get_label_context', return_value=self.context),
+            patch.object(brother_ql_web, 'create_label_im', return_value='image'),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def call(self, route, query='', *args):
+        request.bind({'REQUEST_METHOD': 'POST', 'QUERY_STRING': query})
+        response.bind()
+        return route(*args), response.status_code
+
+    def test_print_text_returns_job_without_waiting(self):
+        release = threading.Event()
+
+        def print_label(im, **context):
+            release.wait(5)
+            return {'success': True, 'job_id': 5}
+
+        with patch.object(brother_ql_web.instance, 'print_label', side_effect=print_label):
+            result, status = self.call(brother_ql_web.print_text)
+            self.assertEqual(status, 202)
+            # Not yet known to have worked
+            self.assertFalse(result['success'])
+            self.assertIn(result['state'], ('queued', 'rendering'))
+            self.assertEqual(result['status_url'], f"/api/jobs/{result['job_id']}")
+            release.set()
+            self.queue.get(result['job_id']).wait(5)
+
+        with patch.object(brother_ql_web.instance, 'get_job_state', create=True,
+                          return_value={'state': 'completed', 'reasons': []}):
+            job, status = self.call(brother_ql_web.get_print_job, '', result['job_id'])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(job['state'], 'completed')
+        self.assertEqual(job['cups_job_id'], 5)
+
+    def test_wait_returns_submission_result(self):
+        with patch.object(brother_ql_web.instance, 'print_label', return_value={'success': False, 'message': 'jam'}):
+            result, status = self.call(brother_ql_web.print_text, 'wait=5')
+
+        self.assertEqual(status, 200)
+        self.assertFalse(result['success'])
+        self.assertEqual(result['message'], 'jam')
+
+    def test_wait_reports_success_once_submitted(self):
+        with patch.object(brother_ql_web.instance, 'print_label', return_value={'success': True, 'job_id': 3}):
+            result, status = self.call(brother_ql_web.print_text, 'wait=5')
+
+        self.assertEqual(status, 200)
+        self.assertTrue(result['success'])
+        self.assertEqual((result['state'], result['cups_job_id']), ('submitted', 3))
+
+    def test_unknown_template_is_404_without_queuing(self):
+        with patch.object(brother_ql_web, 'get_template_data', return_value=None), \
+                patch.object(self.queue, 'submit') as mock_submit:
+            result, status = self.call(brother_ql_web.printtemplate, '', 'missing.lbl')
+
+        self.assertEqual(status, 404)
+        self.assertFalse(result['success'])
+        mock_submit.assert_not_called()
+
+    def test_unknown_job_is_404(self):
+        result, status = self.call(brother_ql_web.get_print_job, '', 'missing')
+
+        self.assertEqual(status, 404)
+        self.assertFalse(result['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
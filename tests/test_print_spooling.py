@@ -0,0 +1,152 @@
+"""
+Test suite for spooling printed labels to CUPS.
+
+Tests cover:
+- Streaming the encoded label from memory
+- Private temporary files for connections without streaming support
+- Opt-in debug copies of printed labels
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+# Mock the cups module before importing implementation_cups
+sys.modules.setdefault('cups', MagicMock())
+
+from PIL import Image
+
+from implementation_cups import implementation
+
+
+class StreamingConn:
+    """Records the documents streamed through createJob/startDocument/writeRequestData"""
+
+    def __init__(self, status=100):
+        self.status = status
+        self.jobs = {}
+        self.cancelled = []
+        self._current = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def createJob(self, printer, title, options):
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+        self.jobs[job_id] = {'printer': printer, 'title': title, 'options': options, 'data': b''}
+        return job_id
+
+    def startDocument(self, printer, job_id, doc_name, doc_format, last_document):
+        self._current = job_id
+        self.jobs[job_id]['format'] = doc_format
+
+    def writeRequestData(self, data, length):
+        self.jobs[self._current]['data'] += data[:length]
+        return self.status
+
+    def finishDocument(self, printer):
+        self.jobs[self._current]['finished'] = True
+
+    def cancelJob(self, job_id):
+        self.cancelled.append(job_id)
+
+
+class FileConn:
+    """Connection without streaming support, only printFile"""
+
+    def __init__(self):
+        self.printed = []
+
+    def printFile(self, printer, filename, title, options):
+        with open(filename, 'rb') as f:
+            self.printed.append((printer, filename, f.read()))
+        return len(self.printed)
+
+
+class TestPrintSpooling(unittest.TestCase):
+
+    def setUp(self):
+        self.impl = implementation()
+        self.impl.CONFIG = {'PRINTER': {'USE_CUPS': False, 'PRINTER': 'zebra'}}
+        self.im = Image.new('RGB', (30, 10), 'white')
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.workdir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
+
+    def test_label_is_streamed_from_memory(self):
+        conn = StreamingConn()
+        self.impl._get_conn = lambda: conn
+
+        result = self.impl.print_label(self.im, quantity=2, label_size='62')
+
+        self.assertTrue(result['success'], result)
+        job = conn.jobs[result['job_id']]
+        self.assertEqual(job['printer'], 'zebra')
+        self.assertEqual(job['options'], {'copies': '2', 'media': '62'})
+        self.assertEqual(job['format'], 'image/png')
+        self.assertTrue(job['data'].startswith(b'\x89PNG'))
+        self.assertTrue(job['finished'])
+        self.assertEqual(os.listdir(self.workdir.name), [])
+
+    def test_rejected_data_cancels_the_job(self):
+        conn = StreamingConn(status=413)
+        self.impl._get_conn = lambda: conn
+
+        result = self.impl.print_label(self.im)
+
+        self.assertFalse(result['success'])
+        self.assertIn('413', result['message'])
+        self.assertEqual(conn.cancelled, [1])
+
+    def test_file_fallback_uses_private_temporary_files(self):
+        conn = FileConn()
+        self.impl._get_conn = lambda: conn
+
+        for _ in range(2):
+            self.assertTrue(self.impl.print_label(self.im)['success'])
+
+        (_, first, data), (_, second, _) = conn.printed
+        self.assertNotEqual(first, second)
+        self.assertTrue(data.startswith(b'\x89PNG'))
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(os.listdir(self.workdir.name), [])
+
+    def test_concurrent_prints_keep_their_own_label(self):
+        conn = FileConn()
+        self.impl._get_conn = lambda: conn
+        sizes = list(range(10, 30))
+
+        threads = [threading.Thread(target=self.impl.print_label, args=(Image.new('RGB', (width, 5)),))
+                   for width in sizes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        printed_widths = sorted(int.from_bytes(data[16:20], 'big') for _, _, data in conn.printed)
+        self.assertEqual(printed_widths, sizes)
+
+    def test_debug_copy_is_opt_in(self):
+        conn = StreamingConn()
+        self.impl._get_conn = lambda: conn
+        dump_dir = os.path.join(self.workdir.name, 'dumps')
+
+        self.impl.print_label(self.im)
+        self.assertEqual(os.listdir(self.workdir.name), [])
+
+        self.impl.CONFIG['PRINTER']['DEBUG_DUMP_DIR'] = dump_dir
+        self.impl.print_label(self.im)
+        self.impl.print_label(self.im)
+
+        self.assertEqual(len(os.listdir(dump_dir)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Test suite for the CUPS printer attribute cache.
+
+Tests cover:
+- A single bulk attribute request per printer shared by all lookups
+- TTL expiry and explicit invalidation
+- Disabling the cache
+"""
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Mock the cups module before importing implementation_cups
+sys.modules.setdefault('cups', MagicMock())
+
+from implementation_cups import implementation, PRINTER_ATTRIBUTES
+
+ATTRIBUTES = {
+    'media-supported': ['na_index-4x6_4x6in', 'om_small_2x1in'],
+    'media-size-supported': [{'x-dimension': 10160, 'y-dimension': 15240},
+                             {'x-dimension': 5080, 'y-dimension': 2540}],
+    'media-default': 'na_index-4x6_4x6in',
+    'printer-resolution-default': (300, 300, 3),
+}
+
+
+class TestPrinterAttributeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = MagicMock()
+        self.conn.getPrinters.return_value = {'zebra': {}}
+        self.conn.getDefault.return_value = 'zebra'
+        self.conn.getPrinterAttributes.return_value = ATTRIBUTES
+        self.impl = implementation()
+        self.impl._get_conn = lambda: self.conn
+
+    def initialize(self, **printer_config):
+        self.impl.initialize({'PRINTER': dict({'USE_CUPS': True, 'SERVER': 'localhost', 'PRINTER': 'zebra'},
+                                              **printer_config),
+                              'LABEL': {'DEFAULT_SIZE': '62'}})
+        self.conn.getPrinterAttributes.reset_mock()
+
+    def render_context_lookups(self):
+        """The attribute lookups made while handling one print request"""
+        size = self.impl.get_default_label_size('zebra')
+        self.impl.get_default_label_size('zebra')
+        dimensions = self.impl.get_label_dimensions(size, 'zebra')
+        self.impl._get_printer_dpi('zebra')
+        self.impl.get_label_sizes('zebra')
+        return size, dimensions
+
+    def test_lookups_share_one_bulk_request(self):
+        self.initialize()
+
+        size, dimensions = self.render_context_lookups()
+
+        self.assertEqual(size, 'na_index-4x6_4x6in')
+        self.assertEqual(dimensions, (1200, 1800))
+        self.conn.getPrinterAttributes.assert_called_once_with('zebra', requested_attributes=PRINTER_ATTRIBUTES)
+
+    def test_print_label_uses_cached_media(self):
+        self.initialize()
+        self.impl.get_default_label_size('zebra')
+
+        with patch.object(self.impl, '_submit_document', return_value=7):
+            result = self.impl.print_label(MagicMock(), printer='zebra', label_size='om_small_2x1in')
+
+        self.assertTrue(result['success'], result)
+        self.conn.getPrinterAttributes.assert_called_once()
+
+    def test_entries_expire_after_ttl(self):
+        self.initialize(ATTRIBUTE_CACHE_TTL=30)
+        with patch('cache_helpers.time.monotonic', return_value=1000):
+            self.impl.get_default_label_size('zebra')
+        with patch('cache_helpers.time.monotonic', return_value=1029):
+            self.impl.get_default_label_size('zebra')
+        self.assertEqual(self.conn.getPrinterAttributes.call_count, 1)
+
+        with patch('cache_helpers.time.monotonic', return_value=1031):
+            self.impl.get_default_label_size('zebra')
+        self.assertEqual(self.conn.getPrinterAttributes.call_count, 2)
+
+    def test_invalidation(self):
+        self.initialize()
+        self.impl.get_default_label_size('zebra')
+
+        self.impl.invalidate_printer_attributes('zebra')
+        self.conn.getPrinterAttributes.return_value = dict(ATTRIBUTES, **{'media-default': 'om_small_2x1in'})
+
+        self.assertEqual(self.impl.get_default_label_size('zebra'), 'om_small_2x1in')
+
+    def test_errors_are_not_cached(self):
+        self.initialize()
+        self.conn.getPrinterAttributes.side_effect = [RuntimeError('server down'), ATTRIBUTES]
+
+        self.assertEqual(self.impl.get_default_label_size('zebra'), '62')
+        self.assertEqual(self.impl.get_default_label_size('zebra'), 'na_index-4x6_4x6in')
+
+    def test_zero_ttl_disables_cache(self):
+        self.initialize(ATTRIBUTE_CACHE_TTL=0)
+
+        self.impl.get_default_label_size('zebra')
+        self.impl.get_default_label_size('zebra')
+
+        self.assertEqual(self.conn.getPrinterAttributes.call_count, 2)
+
+    def test_invalid_ttl_is_reported(self):
+        self.initialize(ATTRIBUTE_CACHE_TTL='soon')
+
+        self.assertIn('ATTRIBUTE_CACHE_TTL', ' '.join(self.impl.initialization_errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 from unittest.mock import patch
 
 import brother_ql_web
-from implementation_cups import implementation
+from implementation_cups import implementation, CONNECTION_POOL
 
 
 class FakeConn:
@@ -25,6 +25,10 @@ class FakeConn:
 
 
 class TestPrinterDefaults(unittest.TestCase):
+    def setUp(self):
+        # Don't reuse pooled connections created by other tests
+        CONNECTION_POOL.clear()
+
     def test_initialize_uses_cups_default_when_config_missing(self):
         cfg = {
             "PRINTER": {"USE_CUPS": True, "SERVER": "localhost", "PRINTER": ""},
@@ -46,14 +50,16 @@ class TestPrinterDefaults(unittest.TestCase):
             "LABEL": {"DEFAULT_SIZE": "62", "DEFAULT_ORIENTATION": "standard", "DEFAULT_FONTS": []},
         }
 
-        with patch("implementation_cups.cups.Connection", return_value=FakeConn()) as _conn, \
+        with patch("implementation_cups.cups.Connection", return_value=FakeConn()) as mock_conn, \
              patch("implementation_cups.cups.setServer", create=True) as mock_set_server, \
              patch("implementation_cups.cups.setPort", create=True) as mock_set_port:
             impl = implementation()
             impl.initialize(cfg)
 
-        mock_set_server.assert_called_with("cups.local")
-        mock_set_port.assert_called_with(8631)
+        # The server is passed to the connection instead of changing process-global state
+        mock_conn.assert_called_with(host="cups.local", port=8631)
+        mock_set_server.assert_not_called()
+        mock_set_port.assert_not_called()
         self.assertEqual(impl.server_ip, "cups.local:8631")
         self.assertEqual(impl.server_host, "cups.local")
         self.assertEqual(impl.server_port, 8631)
@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from PIL import Image
+
+import elements
+from elements import ElementBase, FrozenDict
+
+
+class RecordingElement(ElementBase):
+    """Test plugin that records the element definitions it is asked to render"""
+    rendered = []
+
+    @staticmethod
+    def can_process(element):
+        return element.get('type') == 'record_render_plan'
+
+    def process_element(self, element, im, margins, dimensions, payload, **kwargs):
+        RecordingElement.rendered.append(dict(element))
+        return im
+
+
+class TestCompileTemplate(unittest.TestCase):
+    """Test compiling templates into read-only render plans"""
+
+    def test_compiled_template_is_read_only(self):
+        plan = ElementBase.compile_template({'elements': [{'type': 'text', 'position': [0, 0, 10, 10]}]})
+
+        self.assertIsInstance(plan, FrozenDict)
+        self.assertIsInstance(plan['elements'], tuple)
+        self.assertIsInstance(plan['elements'][0]['position'], tuple)
+        with self.assertRaises(TypeError):
+            plan['elements'][0]['data'] = 'x'
+        with self.assertRaises(TypeError):
+            plan.update({'width': 10})
+
+    def test_compiled_template_behaves_like_dict(self):
+        plan = ElementBase.compile_template({'width': 100, 'headers': {'a': 'b'}})
+
+        self.assertIsInstance(plan, dict)
+        self.assertEqual(plan.get('width'), 100)
+        self.assertEqual(plan['headers'] | {'c': 'd'}, {'a': 'b', 'c': 'd'})
+
+    def test_derive_element_leaves_original_untouched(self):
+        element = ElementBase.compile_template({'type': 'text', 'key': 'name'})
+        derived = ElementBase.derive_element(element, data='value')
+
+        self.assertEqual(derived, {'type': 'text', 'key': 'name', 'data': 'value'})
+        self.assertNotIn('data', element)
+
+
+class TestPluginsDoNotMutateTemplates(unittest.TestCase):
+    """Render compiled templates through the container plugins and check the plan is reused safely"""
+
+    def setUp(self):
+        RecordingElement.rendered = []
+        self.im = Image.new('RGB', (10, 10))
+
+    def render(self, plan, payload):
+        for element in plan['elements']:
+            ElementBase.process_with_plugins(element, self.im, [0, 0, 0, 0], (10, 10), payload)
+
+    def test_payload_containers_render_shared_plan_twice(self):
+        plan = ElementBase.compile_template({'elements': [
+            {'type': 'from_json_payload', 'elements': [
+                {'type': 'data_dict_item', 'key': 'product', 'elements': [
+                    {'type': 'record_render_plan'},
+                ]},
+                {'type': 'record_render_plan', 'key': 'name'},
+            ]},
+            {'type': 'data_array_index', 'data': ['first', 'second'], 'index': 1, 'elements': [
+                {'type': 'record_render_plan'},
+            ]},
+        ]})
+
+        self.render(plan, {'name': 'A', 'product': {'product': 'P1'}})
+        self.render(plan, {'name': 'B', 'product': {'product': 'P2'}})
+
+        self.assertEqual([item['data'] for item in RecordingElement.rendered],
+                         ['P1', 'A', 'second', 'P2', 'B', 'second'])
+
+    def test_grocy_entry_and_json_api_render_shared_plan(self):
+        plan = ElementBase.compile_template({'elements': [
+            {'type': 'grocy_entry', 'endpoint': 'http://grocy', 'api_key': 'secret',
+             'data': {'extra': 1}, 'datakey': 'grocycode', 'elements': [
+                 {'type': 'record_render_plan', 'key': 'name'},
+             ]},
+        ]})
+        api_response = MagicMock(content=b'{"name": "Milk"}')
+
+        with patch('requests.Session.request', return_value=api_response) as mock_get:
+            self.render(plan, {'grocycode': 'grcy:p:1'})
+
+        self.assertEqual(mock_get.call_args.args, ('GET', 'http://grocy/api/stock/products/1'))
+        self.assertEqual(mock_get.call_args.kwargs['headers']['GROCY-API-KEY'], 'secret')
+        self.assertEqual(RecordingElement.rendered[0]['data'], 'Milk')
+        self.assertEqual(plan['elements'][0]['type'], 'grocy_entry')
+        self.assertEqual(plan['elements'][0]['data'], {'extra': 1})
+
+    def test_json_api_sends_data_of_parent_that_is_not_a_dict(self):
+        plan = ElementBase.compile_template({'elements': [
+            {'type': 'data_array_index', 'data': ['first', 7, ['a', 'b']], 'index': index, 'elements': [
+                {'type': 'json_api', 'endpoint': 'http://api', 'method': 'post'},
+            ]} for index in range(3)
+        ]})
+
+        with patch('requests.Session.request', return_value=MagicMock(content=b'{}')) as request:
+            self.render(plan, {})
+
+        self.assertEqual([call.kwargs['data'] for call in request.call_args_list], ['"first"', '7', '["a", "b"]'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+
+from cache_helpers import LRUCache
+from elements import ElementBase
+from elements.Fetch import response_cache
+from elements.Fetch.response_cache import cached_request
+
+
+def http_response(content=b'{}', status_code=200, headers=None):
+    return MagicMock(content=content, status_code=status_code, headers=headers or {})
+
+
+class TestCachedRequest(unittest.TestCase):
+    """Test caching and revalidating API responses"""
+
+    def setUp(self):
+        self.cache = LRUCache(None, maxsize=4096, sizeof=lambda entry: entry.size)
+        self.send = MagicMock(return_value=http_response(b'{"v": 1}', headers={'ETag': '"v1"'}))
+
+    def request(self, method='get', headers=None, ttl=60, **kwargs):
+        return cached_request(self.send, method, 'http://api/item', headers=headers or {'key': 'a'}, ttl=ttl,
+                              cache=self.cache, **kwargs)
+
+    def test_fresh_response_is_reused(self):
+        self.assertEqual(self.request(), b'{"v": 1}')
+        self.assertEqual(self.request(), b'{"v": 1}')
+
+        self.send.assert_called_once()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_requests_without_ttl_or_with_side_effects_are_not_cached(self):
+        self.request(ttl=0)
+        self.request(ttl=0)
+        self.request(method='post')
+        self.request(method='post')
+
+        self.assertEqual(self.send.call_count, 4)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_headers_select_the_response(self):
+        self.request(headers={'key': 'a'})
+        self.request(headers={'key': 'b'})
+        self.request(headers={'key': 'c', 'trace': '1'}, vary=['Key'])
+        self.request(headers={'key': 'c', 'trace': '2'}, vary=['Key'])
+
+        self.assertEqual(self.send.call_count, 3)
+
+    def test_stale_response_is_revalidated(self):
+        self.request(ttl=0.05)
+        time.sleep(0.06)
+        self.send.return_value = http_response(b'', status_code=304)
+
+        self.assertEqual(self.request(ttl=0.05), b'{"v": 1}')
+
+        self.assertEqual(self.send.call_args.kwargs['headers'], {'key': 'a', 'If-None-Match': '"v1"'})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # Revalidation makes the response fresh again
+        self.request(ttl=0.05)
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_changed_response_replaces_stale_one(self):
+        self.request(ttl=0.05)
+        time.sleep(0.06)
+        self.send.return_value = http_response(b'{"v": 2}', headers={'Last-Modified': 'Mon, 19 Oct 2026 10:00:00 GMT'})
+
+        self.assertEqual(self.request(ttl=0.05), b'{"v": 2}')
+        time.sleep(0.06)
+        self.request(ttl=0.05)
+
+        self.assertEqual(self.send.call_args.kwargs['headers']['If-Modified-Since'], 'Mon, 19 Oct 2026 10:00:00 GMT')
+
+    def test_errors_and_no_store_responses_are_not_cached(self):
+        self.send.return_value = http_response(b'{"error": 1}', status_code=500)
+        self.request()
+        self.send.return_value = http_response(b'{}', headers={'Cache-Control': 'private, no-store'})
+        self.request()
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_cache_is_bounded_by_size(self):
+        self.cache.resize(3 * response_cache.ENTRY_OVERHEAD)
+        for i in range(5):
+            cached_request(self.send, 'get', f'http://api/item/{i}', ttl=60, cache=self.cache)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.evictions, 3)
+
+
+class TestJsonApiCache(unittest.TestCase):
+    """Test json_api elements opting in to the response cache"""
+
+    def setUp(self):
+        response_cache.RESPONSE_CACHE.invalidate()
+
+    def render(self, element):
+        im = Image.new('RGBA', (10, 10), 'white')
+        ElementBase.process_with_plugins(element, im, [0, 0, 0, 0], (10, 10), {})
+
+    def test_cache_ttl_reuses_response_across_labels(self):
+        element = ElementBase.compile_template({'type': 'json_api', 'endpoint': 'http://api/cached', 'cache_ttl': 60})
+
+        with patch('requests.Session.request', return_value=http_response(b'{"name": "Milk"}')) as request:
+            for _ in range(3):
+                self.render(element)
+
+        request.assert_called_once()
+        self.assertGreaterEqual(response_cache.RESPONSE_CACHE.stats()['hits'], 2)
+
+    def test_without_cache_ttl_every_label_requests(self):
+        element = ElementBase.compile_template({'type': 'json_api', 'endpoint': 'http://api/uncached'})
+
+        with patch('requests.Session.request', return_value=http_response(b'{}')) as request:
+            self.render(element)
+            self.render(element)
+
+        self.assertEqual(request.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+import urllib.request
+
+import server_helpers
+from server_helpers import ThreadPoolWSGIServer, get_server_settings
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def blocking_app(barrier):
+    """WSGI app whose requests only complete once barrier.parties requests are running at the same time."""
+    def app(environ, start_response):
+        barrier.wait(timeout=5)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+    return app
+
+
+class TestServerSettings(unittest.TestCase):
+    """Test reading the server backend settings from the SERVER section"""
+
+    def test_defaults(self):
+        self.assertEqual(get_server_settings({}), server_helpers.DEFAULT_SERVER_SETTINGS)
+
+    def test_configured_values(self):
+        settings = get_server_settings({'SERVER': {'BACKEND': 'prefork', 'WORKERS': 3, 'THREADS': 2,
+                                                   'REQUEST_TIMEOUT': 5, 'SHUTDOWN_TIMEOUT': 1.5}})
+
+        self.assertEqual(settings['BACKEND'], 'prefork')
+        self.assertEqual((settings['WORKERS'], settings['THREADS']), (3, 2))
+        self.assertEqual((settings['REQUEST_TIMEOUT'], settings['SHUTDOWN_TIMEOUT']), (5, 1.5))
+
+    def test_invalid_values_fall_back_to_defaults(self):
+        with self.assertLogs('server_helpers', level='WARNING'):
+            settings = get_server_settings({'SERVER': {'BACKEND': 'tornado', 'WORKERS': 0, 'REQUEST_TIMEOUT': 'x'}})
+
+        self.assertEqual(settings['BACKEND'], 'threaded')
+        self.assertEqual(settings['WORKERS'], 8)
+        self.assertEqual(settings['REQUEST_TIMEOUT'], 30)
+
+
+class TestThreadPoolWSGIServer(unittest.TestCase):
+    """Test the threaded backend with a real socket"""
+
+    def start_server(self, app, threads):
+        server = ThreadPoolWSGIServer(('127.0.0.1', 0), app, threads=threads, request_timeout=5)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def get(self, server, results):
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/', timeout=10) as reply:
+            results.append(reply.read())
+
+    def test_requests_are_handled_concurrently(self):
+        barrier = threading.Barrier(3)
+        server = self.start_server(blocking_app(barrier), threads=3)
+        results = []
+
+        clients = [threading.Thread(target=self.get, args=(server, results)) for _ in range(3)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join(10)
+
+        # With a single thread the barrier would time out and the app would fail
+        self.assertEqual(results, [b'ok'] * 3)
+
+    def test_wait_for_requests_waits_for_requests_in_flight(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_app(environ, start_response):
+            started.set()
+            release.wait(5)
+            start_response('200 OK', [])
+            return [b'done']
+
+        server = self.start_server(slow_app, threads=1)
+        results = []
+        client = threading.Thread(target=self.get, args=(server, results))
+        client.start()
+        self.assertTrue(started.wait(5))
+
+        self.assertFalse(server.wait_for_requests(0.1))
+        release.set()
+        self.assertTrue(server.wait_for_requests(5))
+        client.join(5)
+        self.assertEqual(results, [b'done'])
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'prefork backend needs os.fork')
+class TestPreforkBackend(unittest.TestCase):
+    """Run the prefork backend in a subprocess and stop it with SIGTERM"""
+
+    def test_serves_from_worker_processes_and_stops_on_sigterm(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        script = textwrap.dedent(f"""
+            import os
+            import server_helpers
+
+            def app(environ, start_response):
+                start_response('200 OK', [])
+                return [str(os.getpid()).encode()]
+
+            server_helpers.run_prefork(app, '127.0.0.1', {port}, processes=2, threads=2, request_timeout=5,
+                                       shutdown_timeout=5)
+        """)
+        process = subprocess.Popen([sys.executable, '-c', script], cwd=REPO_DIR)
+        try:
+            pids = set()
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not pids:
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as reply:
+                        pids.add(int(reply.read()))
+                except OSError:
+                    time.sleep(0.1)
+
+            self.assertTrue(pids)
+            self.assertNotIn(process.pid, pids)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(process.wait(10), 0)
+
+
+class TestShutdownHooks(unittest.TestCase):
+    """Run the threaded backend in a subprocess and check queued work is finished after SIGTERM"""
+
+    def test_queued_print_jobs_are_finished_on_sigterm(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            printed = os.path.join(temp_dir, 'printed')
+            script = textwrap.dedent(f"""
+                import time
+                import print_jobs
+                import server_helpers
+
+                jobs = print_jobs.PrintJobQueue()
+
+                def print_image(im):
+                    time.sleep(0.5)
+                    with open({printed!r}, 'w') as fh:
+                        fh.write(im)
+                    return {{'success': True}}
+
+                def app(environ, start_response):
+                    jobs.submit(lambda: 'label', print_image)
+                    start_response('202 Accepted', [])
+                    return [b'queued']
+
+                server_helpers.run_threaded(app, '127.0.0.1', {port}, threads=2, request_timeout=5,
+                                            shutdown_timeout=5, on_shutdown=[jobs.close])
+            """)
+            process = subprocess.Popen([sys.executable, '-c', script], cwd=REPO_DIR)
+            try:
+                deadline = time.monotonic() + 10
+                while True:
+                    try:
+                        with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as reply:
+                            self.assertEqual(reply.read(), b'queued')
+                        break
+                    except OSError:
+                        if time.monotonic() > deadline:
+                            raise
+                        time.sleep(0.1)
+            finally:
+                process.send_signal(signal.SIGTERM)
+                self.assertEqual(process.wait(10), 0)
+
+            with open(printed) as fh:
+                self.assertEqual(fh.read(), 'label')
+
+
+if __name__ == '__main__':
+    unittest.main()
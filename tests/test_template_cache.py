@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import brother_ql_web
+from cache_helpers import LRUCache
+
+
+class TestTemplateCache(unittest.TestCase):
+    """Test caching of parsed template files in get_template_data"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.folder_patch = patch.object(brother_ql_web, 'TEMPLATE_FOLDER', self.tmpdir.name)
+        self.folder_patch.start()
+        brother_ql_web.TEMPLATE_CACHE.invalidate()
+        brother_ql_web.TEMPLATE_FORMATS.clear()
+
+    def tearDown(self):
+        self.folder_patch.stop()
+        self.tmpdir.cleanup()
+
+    def write_template(self, name, content, mtime_ns=None):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_second_read_is_served_from_cache(self):
+        self.write_template('a.lbl', '{"name": "A", "elements": []}')
+        stats_before = brother_ql_web.TEMPLATE_CACHE.stats()
+
+        first = brother_ql_web.get_template_data('a.lbl')
+        second = brother_ql_web.get_template_data('a.lbl')
+
+        stats_after = brother_ql_web.TEMPLATE_CACHE.stats()
+        self.assertEqual(first, {'name': 'A', 'elements': ()})
+        self.assertEqual(first, second)
+        self.assertEqual(stats_after['misses'] - stats_before['misses'], 1)
+        self.assertEqual(stats_after['hits'] - stats_before['hits'], 1)
+
+    def test_cached_template_is_read_only(self):
+        self.write_template('a.lbl', '{"elements": [{"type": "text"}]}')
+
+        first = brother_ql_web.get_template_data('a.lbl')
+        with self.assertRaises(TypeError):
+            first['elements'][0]['data'] = 'mutated'
+        second = brother_ql_web.get_template_data('a.lbl')
+
+        self.assertIs(first, second)
+        self.assertNotIn('data', second['elements'][0])
+
+    def test_changed_file_is_parsed_again(self):
+        self.write_template('a.lbl', '{"name": "A"}', mtime_ns=1_000_000_000)
+        self.assertEqual(brother_ql_web.get_template_data('a.lbl'), {'name': 'A'})
+
+        self.write_template('a.lbl', '{"name": "B"}', mtime_ns=2_000_000_000)
+        self.assertEqual(brother_ql_web.get_template_data('a.lbl'), {'name': 'B'})
+
+    def test_yaml_template_skips_json_after_first_parse(self):
+        path = self.write_template('y.lbl', 'name: Y\nelements: []\n', mtime_ns=1_000_000_000)
+        self.assertEqual(brother_ql_web.get_template_data('y.lbl'), {'name': 'Y', 'elements': ()})
+        self.assertEqual(brother_ql_web.TEMPLATE_FORMATS[path], 'yaml')
+
+        self.write_template('y.lbl', 'name: Z\nelements: []\n', mtime_ns=2_000_000_000)
+        with patch.object(brother_ql_web.json, 'load', side_effect=AssertionError('JSON parser used')):
+            self.assertEqual(brother_ql_web.get_template_data('y.lbl'), {'name': 'Z', 'elements': ()})
+
+    def test_missing_template_returns_none(self):
+        self.assertIsNone(brother_ql_web.get_template_data('missing.lbl'))
+
+    def test_metrics_report_template_cache(self):
+        stats = brother_ql_web.metrics()
+        self.assertIn('templates', stats['caches'])
+
+
+class TestLRUCache(unittest.TestCase):
+    """Test the shared LRUCache helper"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache('test-lru', maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_sizeof_bounds_total_size(self):
+        cache = LRUCache('test-lru-sized', maxsize=10, sizeof=len)
+        cache.put('a', 'x' * 6)
+        cache.put('b', 'y' * 6)
+        cache.put('too-big', 'z' * 11)
+
+        self.assertNotIn('a', cache)
+        self.assertIn('b', cache)
+        self.assertNotIn('too-big', cache)
+
+    def test_expired_entries_are_misses(self):
+        cache = LRUCache('test-lru-ttl', maxsize=2, ttl=5)
+        with patch('cache_helpers.time.monotonic', return_value=100):
+            cache.put('a', 1)
+        with patch('cache_helpers.time.monotonic', return_value=106):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()